@@ -99,6 +99,26 @@ export class DevOpsClient {
     )
       pipelineParameters["semgrepSupplyChain"] =
         repository.overrideConfig.semgrepConfig.semgrepSupplyChain;
+    if (repository.overrideConfig.semgrepConfig?.incremental !== undefined)
+      pipelineParameters["incremental"] =
+        repository.overrideConfig.semgrepConfig.incremental;
+    if (repository.overrideConfig.semgrepConfig?.fetchDepth)
+      pipelineParameters["fetchDepth"] =
+        repository.overrideConfig.semgrepConfig.fetchDepth;
+    if (repository.overrideConfig.semgrepConfig?.shards)
+      pipelineParameters["shards"] =
+        repository.overrideConfig.semgrepConfig.shards;
+    if (repository.overrideConfig.semgrepConfig?.shardMemoryLimit)
+      pipelineParameters["shardMemoryLimit"] =
+        repository.overrideConfig.semgrepConfig.shardMemoryLimit;
+    if (
+      repository.overrideConfig.semgrepConfig?.shardWithoutUpload !== undefined
+    )
+      pipelineParameters["shardWithoutUpload"] =
+        repository.overrideConfig.semgrepConfig.shardWithoutUpload;
+    if (repository.overrideConfig.semgrepConfig?.profile !== undefined)
+      pipelineParameters["profile"] =
+        repository.overrideConfig.semgrepConfig.profile;
 
     return pipelineParameters;
   }
@@ -22,6 +22,12 @@ export interface OverrideConfig {
     semgrepCode?: boolean;
     semgrepSecrets?: boolean;
     semgrepSupplyChain?: boolean;
+    incremental?: boolean;
+    fetchDepth?: number;
+    shards?: number;
+    shardMemoryLimit?: number;
+    shardWithoutUpload?: boolean;
+    profile?: boolean;
   };
 }
 
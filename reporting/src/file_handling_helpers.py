@@ -1,16 +1,12 @@
+import io
 import json
 import os
 from datetime import datetime
 import logging
-import pdfkit
-import time
-from PyPDF2 import PdfMerger
-import plotly.express as px
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.offline import plot
-
-EPOCH_TIME = str(int(time.time()))
+import findings_counts
+import pdf_rendering
+import report_templates
 
 def assign_security_grade(high, medium, low):
     """
@@ -37,62 +33,48 @@ def assign_security_grade(high, medium, low):
     else:
         return 'F'
 
-def generate_table_rows(df):
+# headers of the combined report's summary table, and the columns whose cells are centered
+SUMMARY_HEADERS = [
+    "Project", " ", "Security Grade", "  ", 
+    "Open-HIGH", "Open-MEDIUM", "Open-LOW", "   ", 
+    "Fixed-HIGH", "Fixed-MEDIUM", "Fixed-LOW"
+]
+SUMMARY_CENTER_COLUMNS = ["Security Grade", "Open-HIGH", "Open-MEDIUM", "Open-LOW", "Fixed-HIGH", "Fixed-MEDIUM", "Fixed-LOW"]
+SUMMARY_HEADER_ROW = "<tr>" + "".join([report_templates.SUMMARY_HEADER_CELL.format(cell_class="center-text" if header in SUMMARY_CENTER_COLUMNS else "", header=header) for header in SUMMARY_HEADERS]) + "</tr>"
+
+def write_table_rows(out, df):
     """
-    Generates HTML table rows (<tr>) for a DataFrame, including a header row.
+    Writes HTML table rows (<tr>) for a DataFrame, including a header row, to the file object `out`.
     Each 'Security Grade' cell gets colored based on its value, and certain columns are centered.
     
     :param df: DataFrame with columns including 'Project Name', 'Security Grade', etc.
-    :return: String with HTML content for table rows.
     """
-    # Define headers
-    headers = [
-        "Project", " ", "Security Grade", "  ", 
-        "Open-HIGH", "Open-MEDIUM", "Open-LOW", "   ", 
-        "Fixed-HIGH", "Fixed-MEDIUM", "Fixed-LOW"
-    ]
-    
-    # Columns to center
-    center_columns = ["Security Grade", "Open-HIGH", "Open-MEDIUM", "Open-LOW", "Fixed-HIGH", "Fixed-MEDIUM", "Fixed-LOW"]
-
-    # Generate HTML for the header row with center-text class for specific headers
-    header_html = "<tr>" + "".join([f'<th class="{"center-text" if header in center_columns else ""}">{header}</th>' for header in headers]) + "</tr>"
-    
-    # Initialize HTML rows string with the header
-    html_rows = header_html
-    
-    for index, row in df.iterrows():
-        security_grade = row['Security Grade']
-        
+    out.write(SUMMARY_HEADER_ROW)
+
+    # only the grade cell's class changes between rows, so each row is written with a single format call
+    cells = []
+    for position, header in enumerate(SUMMARY_HEADERS[:len(df.columns)]):
+        cell_class = "{grade_cell_class}" if header == "Security Grade" else "center-text" if header in SUMMARY_CENTER_COLUMNS else ""
+        cells.append(report_templates.SUMMARY_CELL.format(cell_class=cell_class, value=f"{{{position}}}"))
+    row_template = "<tr>" + "".join(cells) + "</tr>"
+    grade_position = SUMMARY_HEADERS.index("Security Grade")
+
+    for row in df.itertuples(index=False):
+        security_grade = row[grade_position]
         # Determine class based on 'Security Grade'
-        class_name = ""
-        if security_grade == "A":
-            class_name = "grade-A"
-        elif security_grade == "B":
-            class_name = "grade-B"
-        elif security_grade == "C":
-            class_name = "grade-C"
-        elif security_grade == "D":
-            class_name = "grade-D"
-        elif security_grade == "F":
-            class_name = "grade-F"
-        
-        # Generate HTML for one row
-        row_html = "<tr>"
-        for col, header in zip(df.columns, headers):
-            cell_class = "center-text" if header in center_columns else ""
-            if header == "Security Grade":
-                cell_class += f" {class_name}"  # Add security grade class if applicable
-            row_html += f'<td class="{cell_class.strip()}">{row[col]}</td>'
-        row_html += "</tr>"
-        
-        html_rows += row_html
-    return html_rows
-
-def create_heatmap_vulnerability_classes(vulnerability_counts_all_repos, image_folder):
+        grade_class = f"grade-{security_grade}" if security_grade in ("A", "B", "C", "D", "F") else ""
+        out.write(row_template.format(*row, grade_cell_class=f"center-text {grade_class}".strip()))
+
+def generate_table_rows(df):
+    out = io.StringIO()
+    write_table_rows(out, df)
+    return out.getvalue()
+
+def create_heatmap_vulnerability_classes(counts, image_folder):
+    import plotly.graph_objects as go
     
-    # Convert the list of dictionaries to a DataFrame
-    df = pd.DataFrame({list(d.keys())[0]: list(d.values())[0] for d in vulnerability_counts_all_repos}).T.fillna(0)
+    # Open high severity findings per repository and vulnerability class
+    df = findings_counts.category_counts(counts, findings_counts.VULNERABILITY_CLASS)
 
     # Calculate the total number of vulnerabilities for each repository
     df['Total'] = df.sum(axis=1)
@@ -137,10 +119,11 @@ def create_heatmap_vulnerability_classes(vulnerability_counts_all_repos, image_f
     # Save the figure as an image file
     fig.write_image(f"{image_folder}/heatmap_vulnerability_classes.png")
 
-def create_heatmap_owasp_top10_categories(owasp_top10_counts_all_repos, image_folder):
+def create_heatmap_owasp_top10_categories(counts, image_folder):
+    import plotly.graph_objects as go
     
-    # Convert the list of dictionaries to a DataFrame
-    df = pd.DataFrame({list(d.keys())[0]: list(d.values())[0] for d in owasp_top10_counts_all_repos}).T.fillna(0)
+    # Open high severity findings per repository and OWASP Top 10 category
+    df = findings_counts.category_counts(counts, findings_counts.OWASP_TOP10)
 
     # Calculate the total number of vulnerabilities for each repository
     df['Total'] = df.sum(axis=1)
@@ -187,121 +170,23 @@ def create_heatmap_owasp_top10_categories(owasp_top10_counts_all_repos, image_fo
 
 
 
-def create_bar_graph_open_vulns(data, image_folder):
-    rows = []
-    for entry in data:
-        for project_name, severities in entry.items():
-            row = {}
-            row ['Project'] = project_name
-            for severity, states in severities.items():
-                if (severity== 'high'):
-                    row ['high'] = states['unresolved']
-                if (severity== 'medium'):
-                    row ['medium'] = states['unresolved']
-                if (severity== 'low'):
-                    row ['low'] = states['unresolved']
-            print(row)
-            rows.append(row)
-
-    transformed_json = {
-        'Project': [],
-        'high': [],
-        'medium': [],
-        'low': [],
-    }
-
-    logging.debug(f"rows is {rows}")
-    # Populate the new structure
-    for item in rows:
-        for key in transformed_json:
-            logging.debug(f"item is {item}")
-            logging.debug(f"key is {key}")
-            logging.debug(f"item[key] is {item[key]}")
-            transformed_json[key].append(item[key])
+def create_bar_graph_open_vulns(counts, image_folder):
+    return create_bar_graph_by_severity(counts, 'unresolved', 'Top 15 Repos by High Severity Open Vulnerabilities count', f"{image_folder}/open.png")
 
-    logging.debug(transformed_json)
-    
-    # Create a DataFrame from the rows
-    df = pd.DataFrame(rows)
+def create_bar_graph_fixed_vulns(counts, image_folder):
+    return create_bar_graph_by_severity(counts, 'fixed', 'Top 15 Repos by High Severity Fixed Vulnerabilities count', f"{image_folder}/fixed.png")
 
-    logging.debug(df)
+def create_bar_graph_by_severity(counts, state, title, image_path):
+    # plotly is only imported by runs that draw the combined report's charts, it's slow to import
+    import plotly.express as px
+    from plotly.offline import plot
 
-    # Sorting the DataFrame by 'Subcolumn1' in descending order and selecting the top 10
-    df = df.sort_values(by='high', ascending=False).head(15)
-
-    # Melting the DataFrame to long format, which Plotly can use to differentiate subcolumns
-    df_long = pd.melt(df, id_vars='Project', value_vars=['high', 'medium', 'low'], 
-                    var_name='Severity', value_name='Value')
-
-    # Adding a column for text to display the value on all bars
-    df_long['Text'] = df_long['Value'].apply(lambda x: f'{x}')
-
-    color_map = {
-        'high': 'darkred',          # Dark Red
-        'medium': 'darkorange',     # Dark Orange
-        'low': 'darkgoldenrod'      # Dark Yellow
-    }
-
-    # Create a bar graph with subcolumns for the top 10 objects
-    fig = px.bar(df_long, x='Project', y='Value', color='Severity', barmode='group',
-                color_discrete_map=color_map, text='Text', 
-                title='Top 15 Repos by High Severity Open Vulnerabilities count')
-
-    fig.update_traces(texttemplate='%{text}', textposition='outside')
-
-    # Update the layout for axis titles
-    fig.update_layout(
-        xaxis_title='Project Name',
-        yaxis_title='Number of Vulnerabilities'
-    )
-    
-    graph_div = plot(fig, output_type='div', include_plotlyjs=False)
-
-    # Show the plot
-    # fig.show()
-    fig.write_image(f"{image_folder}/open.png")
-    return(graph_div)
-
-def create_bar_graph_fixed_vulns(data, image_folder):
-    rows = []
-    for entry in data:
-        for project_name, severities in entry.items():
-            row = {}
-            row ['Project'] = project_name
-            for severity, states in severities.items():
-                if (severity== 'high'):
-                    row ['high'] = states['fixed']
-                if (severity== 'medium'):
-                    row ['medium'] = states['fixed']
-                if (severity== 'low'):
-                    row ['low'] = states['fixed']
-            print(row)
-            rows.append(row)
-
-    transformed_json = {
-        'Project': [],
-        'high': [],
-        'medium': [],
-        'low': [],
-    }
-
-    logging.debug(f"rows is {rows}")
-    # Populate the new structure
-    for item in rows:
-        for key in transformed_json:
-            logging.debug(f"item is {item}")
-            logging.debug(f"key is {key}")
-            logging.debug(f"item[key] is {item[key]}")
-            transformed_json[key].append(item[key])
-
-    logging.debug(transformed_json)
-    
-    # Create a DataFrame from the rows
-    df = pd.DataFrame(rows)
+    # Findings in `state` per repository and severity
+    df = findings_counts.severity_counts(counts, state).rename_axis('Project').reset_index()
 
     logging.debug(df)
 
-    # Sorting the DataFrame by 'high' in descending order and selecting the top 10
+    # Sorting the DataFrame by 'high' in descending order and selecting the top 15
     df = df.sort_values(by='high', ascending=False).head(15)
 
     # Melting the DataFrame to long format, which Plotly can use to differentiate subcolumns
@@ -317,10 +202,10 @@ def create_bar_graph_fixed_vulns(data, image_folder):
         'low': 'darkgoldenrod'      # Dark Yellow
     }
 
-    # Create a bar graph with subcolumns for the top 10 objects
+    # Create a bar graph with subcolumns for the top 15 objects
     fig = px.bar(df_long, x='Project', y='Value', color='Severity', barmode='group',
                 color_discrete_map=color_map, text='Text', 
-                title='Top 15 Repos by High Severity Fixed Vulnerabilities count')
+                title=title)
 
     fig.update_traces(texttemplate='%{text}', textposition='outside')
 
@@ -334,76 +219,59 @@ def create_bar_graph_fixed_vulns(data, image_folder):
 
     # Show the plot
     # fig.show()
-    fig.write_image(f"{image_folder}/fixed.png")
+    fig.write_image(image_path)
 
     return(graph_div)
 
-def combine_json_files(output_file):
-    combined_data = []
-    # create folder reports/EPOCH_TIME
-    output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
-    logging.debug(f"output_folder when combining JSON files: {output_folder}")
-    
-    # Loop through each file in the folder
-    for filename in os.listdir(output_folder):
-        if filename.endswith("-" + EPOCH_TIME + ".json"):
-            print("Opening " + filename)
-            with open(os.path.join(output_folder, filename), 'r') as file:
-                data = json.load(file)
-                
-                # Append data from current file to combined data
-                if isinstance(data, list):
-                    combined_data.extend(data)
-                else:
-                    combined_data.append(data)
-
-    # Write combined data to output file
-    with open(output_file, 'w') as outfile:
-        json.dump(combined_data, outfile, indent=4)
-
-def combine_pdf_files(output_filename):
-    # Create a PDF merger object
-    merger = PdfMerger()
-
-    # create folder reports/EPOCH_TIME
-    output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
-    logging.debug(f"output_folder when combining PDF files: {output_folder}")
-
-    # Loop through all the files in the folder
-    for item in os.listdir(output_folder):
-        # Construct the full path of the file
-        file_path = os.path.join(output_folder, item)
-        
-        # Check if the file is a PDF to be combined
-        if item.endswith(EPOCH_TIME +".pdf"):
-            # Append the PDF to the merger
-            logging.debug(f"appending PDF file: {item}")
-            with open(os.path.join(output_folder, file_path), 'rb') as f:
-                merger.append(f)
-
-    # Write out the combined PDF to the output file
-    with open(output_filename, 'wb') as f_out:
-        merger.write(f_out)
-    merger.close()
-
-def add_summary_table_and_save_as_html(data, output_filename):
-    # Transform the JSON data into a list of dictionaries, each representing a row in the DataFrame
-    rows = []
-    for entry in data:
-        for project_name, severities in entry.items():
-            for severity, states in severities.items():
-                row = {
-                    'Project Name': project_name,
-                    'Severity': severity,
-                    'Muted': states['muted'],
-                    'Fixed': states['fixed'],
-                    'Removed': states['removed'],
-                    'Unresolved': states['unresolved']
-                }
-                rows.append(row)
-
-    # Create a DataFrame from the rows
-    df = pd.DataFrame(rows)
+class JsonArrayWriter:
+    """
+    Writes a JSON array to a file one item at a time, so the items never have to be held in memory together.
+    The output is the same as json.dump(items, file, indent=indent).
+    """
+    def __init__(self, path, indent=None):
+        self.file = open(path, 'w')
+        self.indent = indent
+        self.count = 0
+
+    def write(self, item):
+        if self.indent is None:
+            self.file.write(("[" if self.count == 0 else ", ") + json.dumps(item))
+        else:
+            # indent the item's lines one level, the way they'd be nested inside the array
+            prefix = " " * self.indent
+            item_json = prefix + json.dumps(item, indent=self.indent).replace("\n", "\n" + prefix)
+            self.file.write(("[\n" if self.count == 0 else ",\n") + item_json)
+        self.count += 1
+
+    def extend(self, items):
+        for item in items:
+            self.write(item)
+
+    def close(self):
+        if self.count == 0:
+            self.file.write("[]")
+        else:
+            self.file.write("]" if self.indent is None else "\n]")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_json_array(path, items, indent=None):
+    with JsonArrayWriter(path, indent) as writer:
+        writer.extend(items)
+
+def repo_pdf_files(output_folder, epoch_time):
+    # the per-repo PDFs of this run, in the same order their sections appear in the combined HTML
+    return [os.path.join(output_folder, item) for item in sorted(os.listdir(output_folder)) if item.endswith("-" + epoch_time + ".pdf")]
+
+def add_summary_table_and_save_as_html(counts, output_filename):
+    # One row per repository and severity with the number of findings in each state
+    df = findings_counts.state_counts(counts).reset_index()
+    df = df.rename(columns={'repo': 'Project Name', 'severity': 'Severity', 'muted': 'Muted', 'fixed': 'Fixed', 'removed': 'Removed', 'unresolved': 'Unresolved'})
 
     # Convert the DataFrame to an HTML table string
     html_table = df.to_html(index=False)
@@ -413,49 +281,35 @@ def add_summary_table_and_save_as_html(data, output_filename):
         file.write(html_table)
     logging.debug(f"HTML table saved to {output_filename}")
 
-def combine_html_files(severity_and_state_counts_all_repos, vulnerability_counts_all_repos, owasp_top10_counts_all_repos, output_filename, output_pdf_filename, interesting_tag):
-
-    # Transform the JSON data into a list of dictionaries, each representing a row in the DataFrame
-    rows = []
-    for entry in severity_and_state_counts_all_repos:
-        for project_name, severities in entry.items():
-            row = {
-                    'Project Name': project_name,
-                    ' ': '   ',
-                    'Security Grade': '',
-                    '  ': '    ',
-                    'Open/High': 0,
-                    'Open/Medium': 0,
-                    'Open/Low': 0,
-                    '   ': '   ',
-                    'Fixed/High': 0,
-                    'Fixed/Medium': 0,
-                    'Fixed/Low': 0,
-            }
-            for severity, states in severities.items():
-                if severity == 'high':
-                    row['Fixed/High'] = states['fixed']
-                    row['Open/High'] = states['unresolved']               
-                if severity == 'medium':
-                    row['Fixed/Medium'] = states['fixed']
-                    row['Open/Medium'] = states['unresolved']
-                if severity == 'low':
-                    row['Fixed/Low'] = states['fixed']
-                    row['Open/Low'] = states['unresolved']
-            row['Security Grade'] = assign_security_grade(row['Open/High'], row['Open/Medium'], row['Open/Low'])
-            rows.append(row)
-
-    # Create a DataFrame from the rows
-    df = pd.DataFrame(rows)
+def combine_html_files(counts, repo_sections, output_filename, output_pdf_filename, interesting_tag, output_folder, epoch_time, pdf_cache=None):
+    """
+    Writes the combined HTML report, the summary followed by every repo's section, and the combined PDF, to the
+    run's `output_folder`.
+    `repo_sections` maps each repo's HTML report file name to the body of that report, sections are written in file name order.
+    Either output is skipped when its file name is None.
+    """
+
+    # One row per repository with its open and fixed findings per severity
+    open_counts = findings_counts.severity_counts(counts, 'unresolved')
+    fixed_counts = findings_counts.severity_counts(counts, 'fixed')
+    df = pd.DataFrame({
+        'Project Name': list(open_counts.index),
+        ' ': '   ',
+        'Security Grade': [assign_security_grade(high, medium, low) for high, medium, low in open_counts[['high', 'medium', 'low']].itertuples(index=False)],
+        '  ': '    ',
+        'Open/High': open_counts['high'].values,
+        'Open/Medium': open_counts['medium'].values,
+        'Open/Low': open_counts['low'].values,
+        '   ': '   ',
+        'Fixed/High': fixed_counts['high'].values,
+        'Fixed/Medium': fixed_counts['medium'].values,
+        'Fixed/Low': fixed_counts['low'].values,
+    })
 
     # Sorting the DataFrame by 'Open/High' in descending order and selecting the top 10
     df = df.sort_values(by='Open/High', ascending=False)
 
-    html_summary_table_content = generate_table_rows(df)
-    html_summary_table = f"<table id='myDataTable' class='my_table'>{html_summary_table_content}</table>"
-
-    # create folder reports/EPOCH_TIME
-    folder_path = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
+    folder_path = output_folder
     logging.debug(f"output_folder when combining PDF files: {folder_path}")
 
     # Get the current date and time
@@ -464,220 +318,64 @@ def combine_html_files(severity_and_state_counts_all_repos, vulnerability_counts
     # Format the date and time
     formatted_now = now.strftime("%Y-%m-%d %H:%M")
 
-    graph_div_open_vulns = create_bar_graph_open_vulns(severity_and_state_counts_all_repos, folder_path)
+    graph_div_open_vulns = create_bar_graph_open_vulns(counts, folder_path)
 
-    graph_div_fixed_vulns = create_bar_graph_fixed_vulns(severity_and_state_counts_all_repos, folder_path)
+    graph_div_fixed_vulns = create_bar_graph_fixed_vulns(counts, folder_path)
 
-    create_heatmap_vulnerability_classes(vulnerability_counts_all_repos, folder_path)
+    create_heatmap_vulnerability_classes(counts, folder_path)
 
-    create_heatmap_owasp_top10_categories(owasp_top10_counts_all_repos, folder_path)
+    create_heatmap_owasp_top10_categories(counts, folder_path)
 
     relative_path_open = 'open.png'  # This is your relative path
-    absolute_path_open = os.path.join(os.getcwd(), "reports", EPOCH_TIME, relative_path_open) 
+    absolute_path_open = os.path.join(folder_path, relative_path_open) 
 
     relative_path_fixed = 'fixed.png'  # This is your relative path
-    absolute_path_fixed = os.path.join(os.getcwd(), "reports", EPOCH_TIME, relative_path_fixed) 
+    absolute_path_fixed = os.path.join(folder_path, relative_path_fixed) 
 
     relative_path_heatmap_vuln_classes = 'heatmap_vulnerability_classes.png'  # This is your relative path
-    absolute_path_heatmap_vuln_classes = os.path.join(os.getcwd(), "reports", EPOCH_TIME, relative_path_heatmap_vuln_classes) 
+    absolute_path_heatmap_vuln_classes = os.path.join(folder_path, relative_path_heatmap_vuln_classes) 
 
     relative_path_heatmap_owasp_top10_categories = 'heatmap_owasp_top10_categories.png'  # This is your relative path
-    absolute_path_heatmap_owasp_top10_categories = os.path.join(os.getcwd(), "reports", EPOCH_TIME, relative_path_heatmap_owasp_top10_categories) 
+    absolute_path_heatmap_owasp_top10_categories = os.path.join(folder_path, relative_path_heatmap_owasp_top10_categories) 
 
     logging.debug(f"absolute_path_open= {absolute_path_open}")
     logging.debug(f"absolute_path_fixed= {absolute_path_fixed}")
     logging.debug(f"absolute_path_heatmap_vuln_classes= {absolute_path_heatmap_vuln_classes}")
     logging.debug(f"absolute_path_heatmap_owasp_top10_categories= {absolute_path_heatmap_owasp_top10_categories}")
 
-    combined_html = f"""
-    <html>
-    <head>
-    <title> Semgrep SAST Scan Report for All Repository with tag {interesting_tag} </title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    <style>
-    .container-table {{
-        display: grid; /* Use CSS Grid */
-        place-items: center; /* Center both horizontally and vertically */
-    }}
-    </style>
-    <style>
-    .center-text {{
-        text-align: center; 
-    }}
-    </style>
-    <style>
-    .my_table {{
-        width: 100%;
-        border-collapse: collapse;
-    }}
-    .my_table th, .my_table td {{
-        border: 1px solid black;
-        text-align: left;
-        padding: 8px;
-    }}
-    .my_table th {{
-        background-color: #f2f2f2;
-    }}
-    </style>
-    <style>
-        #myImage {{
-            display: block;
-            margin-left: auto;
-            margin-right: auto;
-            width: 75%; /* or any desired width */
-            height: auto; /* to maintain the aspect ratio */
-        }}
-    </style>
-    <style>
-        .centered-table {{
-            margin-left: auto;
-            margin-right: auto;
-        }}
-    </style>
-    <style>
-        table {{
-            border-collapse: collapse;
-            width: 50%;
-        }}
-        th, td {{
-            border: 1px solid black;
-            text-align: left;
-            padding: 8px;
-        }}
-        th {{
-            background-color: #f2f2f2;
-        }}
-        tr:nth-child(even) {{
-            background-color: #f2f2f2;
-        }}
-    </style>
-    <style>
-        .grade-A {{
-            background-color: green;
-            color: white; /* For better readability */
-        }}
-        .grade-B {{
-            background-color: yellow;
-            color: black; /* Adjust color for readability */
-        }}
-        .grade-C {{
-            background-color: orange;
-            color: white;
-        }}
-        .grade-D {{
-            background-color: red;
-            color: white;
-        }}
-        .grade-F {{
-            background-color: darkred;
-            color: white;
-        }}
-        /* Add more classes if needed */
-    </style>
-
-
-    </head>
-    <header>
-        <link href="https://cdn.datatables.net/1.11.5/css/jquery.dataTables.min.css" rel="stylesheet">
-        <script type="text/javascript" src="https://code.jquery.com/jquery-3.5.1.js"></script>
-        <script type="text/javascript" src="https://cdn.datatables.net/1.11.5/js/jquery.dataTables.min.js"></script>
-    </header>
-    <body>
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-    <img src="https://i.ibb.co/8xyV6WJ/Semgrep-logo.png" alt="logo" id="myImage">
-    </div>
-    <div class="container">
-    <h1> <p style="text-align: center;" id="sast"> Semgrep SAST Scan Report for All Repositories with tag {interesting_tag} </p> </h1>
-    <h2> <p style="text-align: center;" id="reporttime"> Report Generated at {formatted_now}</p> </h2>
-    </div>
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p style="text-align: center;" id="html_summary_table"> SAST Findings Summary </p> </h2>
-    </div>
-    <div class="container-table centered-table">
-        <table id="myTable" class="my_table">
-            {html_summary_table}
-        </table>
-    </div>
-
-    <script>
-    $(document).ready(function () {{
-        $('#myTable').DataTable({{
-        }});
-    }});
-    </script>
-
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="bar_graph_open_vulns"> Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-        <img src="{absolute_path_open}" alt="open_vulns" id="myImage">
-    </div>
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="bar_graph_fixed_vulns"> Top 15 Projects with High Severity Fixed Vulnerability Count  </p> </h2>
-    </div>
-
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-        <img src="{absolute_path_fixed}" alt="fixed_vulns" id="myImage">
-    </div>
-
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="heatmap_vuln_classes"> Vulnerability Classes for Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-        <img src="{absolute_path_heatmap_vuln_classes}" alt="heatmap_vuln_classes" id="myImage">
-    </div>
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="heatmap_owasp_top10_categories"> OWASP Top 10 mapping for Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-        <img src="{absolute_path_heatmap_owasp_top10_categories}" alt="heatmap_owasp_top10_categories" id="myImage">
-    </div>
-    <div style="page-break-after: always;"></div>
-
-    <div style="page-break-after: always;"></div>"""
-
-    # Loop through all the files in the folder
-    for item in sorted(os.listdir(folder_path)):
-        # Check if the file is an HTML file to be combined
-        if item.endswith(".html"):
-            # Construct the full path of the file
-            file_path = os.path.join(folder_path, item)
-            # Open and read the HTML file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Extract body content (simple approach, could be improved with an HTML parser for robustness)
-                body_content = content.split('<body>', 1)[-1].rsplit('</body>', 1)[0]
-                combined_html += body_content + """\n <div style="page-break-after: always;"></div>"""
-
-    # End of the HTML document
-    combined_html += "</body>\n</html>"
-
-    # Write the combined HTML to the output file
-    with open(os.path.join(folder_path, output_filename), 'w', encoding='utf-8') as f_out:
-        f_out.write(combined_html)
-
-    # convert from HTML to PDF
-    options = {
-        'orientation': 'Landscape',
-        'enable-local-file-access': None
+    template_values = {
+        'interesting_tag': interesting_tag,
+        'formatted_now': formatted_now,
+        'absolute_path_open': absolute_path_open,
+        'absolute_path_fixed': absolute_path_fixed,
+        'absolute_path_heatmap_vuln_classes': absolute_path_heatmap_vuln_classes,
+        'absolute_path_heatmap_owasp_top10_categories': absolute_path_heatmap_owasp_top10_categories,
     }
-    pdfkit.from_string(combined_html, os.path.join(folder_path, output_pdf_filename), options=options)
-
-def generate_html_sast(df_high: pd.DataFrame, df_med: pd.DataFrame, df_low: pd.DataFrame, repo_name):
-    # get the Overview table HTML from the dataframe
-    # overview_table_html = df_overview.to_html(table_id="table")
+    summary = io.StringIO()
+    summary.write(report_templates.COMBINED_REPORT_HEAD.format(**template_values))
+    summary.write(report_templates.SUMMARY_TABLE_START)
+    write_table_rows(summary, df)
+    summary.write(report_templates.SUMMARY_TABLE_END)
+    summary.write(report_templates.COMBINED_REPORT_CHARTS.format(**template_values))
+    summary_html = summary.getvalue()
+
+    if output_pdf_filename is not None:
+        # only the summary section is rendered here, the per-repo PDFs are already rendered and get merged in after it
+        summary_pdf_path = os.path.join(folder_path, "summary.pdf")
+        pdf_rendering.render_pdf(summary_html + report_templates.COMBINED_REPORT_END, summary_pdf_path, pdf_cache)
+        pdf_rendering.merge_pdfs([summary_pdf_path] + repo_pdf_files(folder_path, epoch_time), os.path.join(folder_path, output_pdf_filename))
+
+    if output_filename is not None:
+        # Write the combined HTML to the output file, one repo section at a time
+        with open(os.path.join(folder_path, output_filename), 'w', encoding='utf-8') as f_out:
+            f_out.write(summary_html)
+            for name in sorted(repo_sections):
+                f_out.write(repo_sections[name])
+                f_out.write(report_templates.COMBINED_REPORT_SECTION_BREAK)
+            f_out.write(report_templates.COMBINED_REPORT_END)
+
+def generate_html_sast_body(df_high: pd.DataFrame, df_med: pd.DataFrame, df_low: pd.DataFrame, repo_name):
+    """Returns the body of a repo's HTML report, the part that's also embedded in the combined report."""
     # get the Findings table HTML from the dataframe
     high_findings_table_html = df_high.to_html(index=False, table_id="tableHigh", render_links=True, escape=False, classes='my_table')
     med_findings_table_html = df_med.to_html(index=False, table_id="tableMedium", render_links=True, escape=False, classes='my_table')
@@ -689,153 +387,20 @@ def generate_html_sast(df_high: pd.DataFrame, df_med: pd.DataFrame, df_low: pd.D
     # Format the date and time
     formatted_now = now.strftime("%Y-%m-%d %H:%M")
 
-    # Print the formatted date and time
-    # logging.debug("Current date and time:", str(formatted_now))
-
-    html = f"""
-    <html>
-    <head>
-    <title> Semgrep SAST Scan Report for Repository: {repo_name} </title>
-    <style>
-    .my_table {{
-        width: 100%;
-        border-collapse: collapse;
-    }}
-    .my_table th, .my_table td {{
-        border: 1px solid black;
-        text-align: left;
-        padding: 8px;
-    }}
-    .my_table th {{
-        background-color: #f2f2f2;
-    }}
-    /* Example of setting specific column widths */
-    .my_table td:nth-of-type(1) {{ /* Targeting first column */
-        width: 20% !important;
-    }}
-    .my_table td:nth-of-type(2) {{ /* Targeting second column */
-        width: 30% !important;
-    }}
-    .my_table td:nth-of-type(3) {{ /* Targeting third column */
-        width: 10% !important;
-    }}
-    .my_table td:nth-of-type(4) {{ /* Targeting fourth column */
-        width: 10% !important;
-    }}
-    .my_table td:nth-of-type(5) {{ /* Targeting fifth column */
-        width: 15% !important;
-    }}
-    .my_table td:nth-of-type(6) {{ /* Targeting sixth column */
-        width: 15% !important;
-    }}
-    </style>
-    <style>
-        #myImage {{
-            display: block;
-            margin-left: auto;
-            margin-right: auto;
-            width: 75%; /* or any desired width */
-            height: auto; /* to maintain the aspect ratio */
-        }}
-    </style>
-    <style>
-        .centered-table {{
-            margin-left: auto;
-            margin-right: auto;
-        }}
-    </style>
-    <style>
-        table {{
-            border-collapse: collapse;
-            width: 50%;
-        }}
-        th, td {{
-            border: 1px solid black;
-            text-align: left;
-            padding: 8px;
-        }}
-        th {{
-            background-color: #f2f2f2;
-        }}
-        tr:nth-child(even) {{
-            background-color: #f2f2f2;
-        }}
-    </style>
-
-    </head>
-    <header>
-        <link href="https://cdn.datatables.net/1.11.5/css/jquery.dataTables.min.css" rel="stylesheet">
-    </header>
-    <body>
-    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
-    <div class="container">
-    <img src="https://i.ibb.co/8xyV6WJ/Semgrep-logo.png" alt="logo" id="myImage">
-    </div>
-    <div class="container">
-    <h1> <p style="text-align: center;" id="sast"> Semgrep SAST Scan Report for Repository: {repo_name} </p> </h1>
-    <h2> <p style="text-align: center;" id="reporttime"> Report Generated at {formatted_now} </p> </h2>
-    </div>
-    <div style="height: 40px;"></div> <!-- Creates 50px of vertical space -->
-    <div class="topnav">
-    <h2> <p style="text-align: center;" id="sast-summary"> SAST Scan Summary </p> </h2>
-
-    <table border="1" class="centered-table"> <!-- Added border for visibility -->
-        <!-- Table Header -->
-        <tr>
-            <th>Vulnerability Severity</th>
-            <th>Vulnerability Count</th>
-        </tr>
-
-        <!-- Table Rows and Data Cells -->
-        <tr>
-            <td><a href="#sast-high"> Findings- SAST High Severity </a> </td>
-            <td> {len(df_high)} </td>
-        </tr>
-        <tr>
-            <td> <a href="#sast-med"> Findings- SAST Medium Severity </a> </td>
-            <td> {len(df_med)} </td>
-        </tr>
-        <tr>
-            <td> <a href="#sast-low"> Findings- SAST Low Severity </a> </td>
-            <td> {len(df_low)} </td>
-        </tr>
-    </table>
-
-    </div>
-
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="sast-high"> Findings Summary- HIGH Severity </p> </h2>
-    </div>
-    <div class="container">
-        {high_findings_table_html}
-    </div>
-
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="sast-med"> Findings Summary- MEDIUM Severity </p> </h2>
-    </div>
-    <div class="container">
-    <table style="width: 100%;">
-    {med_findings_table_html}
-    </table>
-    </div>
-
-    <div style="page-break-after: always;"></div>
-
-    <div class="heading">
-    <h2> <p id="sast-low"> Findings Summary- LOW Severity </p> </h2>
-    </div>
-    <div class="container">
-    <table style="width: 100%;">
-    {low_findings_table_html}
-    </table>
-    </div>
-
-    </body>
-    </html>
-    """
-    # return the html
-    return html
\ No newline at end of file
+    return report_templates.SAST_REPORT_BODY.format(
+        repo_name=repo_name,
+        formatted_now=formatted_now,
+        high_count=len(df_high),
+        medium_count=len(df_med),
+        low_count=len(df_low),
+        high_findings_table_html=high_findings_table_html,
+        med_findings_table_html=med_findings_table_html,
+        low_findings_table_html=low_findings_table_html
+    )
+
+def wrap_html_sast(body, repo_name):
+    # the complete HTML document for a repo's report body
+    return report_templates.SAST_REPORT_HEAD.format(repo_name=repo_name) + body + report_templates.SAST_REPORT_END
+
+def generate_html_sast(df_high: pd.DataFrame, df_med: pd.DataFrame, df_low: pd.DataFrame, repo_name):
+    return wrap_html_sast(generate_html_sast_body(df_high, df_med, df_low, repo_name), repo_name)
@@ -0,0 +1,101 @@
+"""
+On-disk SQLite cache of semgrep.dev findings, keyed by repo and finding id.
+
+Each repo records when it was last synced, so a refresh only asks the API for findings updated since then and
+upserts them. Reports are then built from the cache, which also allows re-rendering without any API calls.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# findings updated while a sync is running could be missed, so each refresh overlaps the previous one a little
+SYNC_OVERLAP_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    repo TEXT NOT NULL,
+    finding_id TEXT NOT NULL,
+    state_updated_at TEXT,
+    relevant_since TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (repo, finding_id)
+);
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    tags TEXT NOT NULL DEFAULT '[]',
+    synced_at INTEGER
+);
+"""
+
+class FindingsCache:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        # sqlite connections can't be shared between threads, so each fetch thread gets its own
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60)
+            self.local.conn = conn
+        return conn
+
+    def save_projects(self, projects):
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT INTO repos (repo, tags) VALUES (?, ?) ON CONFLICT(repo) DO UPDATE SET tags = excluded.tags",
+                [(project["name"], json.dumps(project.get("tags", []))) for project in projects]
+            )
+
+    def repos_with_tag(self, tag):
+        rows = self.connection().execute("SELECT repo, tags FROM repos ORDER BY rowid").fetchall()
+        return [repo for repo, tags in rows if tag in json.loads(tags)]
+
+    def synced_at(self, repo):
+        row = self.connection().execute("SELECT synced_at FROM repos WHERE repo = ?", (repo,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, client, slug_name, repo):
+        """Fetches the repo's findings updated since its last sync and upserts them. Returns the number fetched."""
+        last_synced_at = self.synced_at(repo)
+        started_at = int(time.time())
+        params = {}
+        if last_synced_at is not None:
+            params["since"] = max(0, last_synced_at - SYNC_OVERLAP_SECONDS)
+
+        count = 0
+        conn = self.connection()
+        # each page is committed on its own so concurrent refreshes don't hold the write lock for a whole repo.
+        # synced_at only moves once every page is stored, so an interrupted refresh is simply repeated
+        for page in client.iter_finding_pages(slug_name, repo, **params):
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO findings (repo, finding_id, state_updated_at, relevant_since, data) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(repo, finding_id) DO UPDATE SET
+                        state_updated_at = excluded.state_updated_at,
+                        relevant_since = excluded.relevant_since,
+                        data = excluded.data
+                    """,
+                    [(repo, str(finding["id"]), finding.get("state_updated_at"), finding.get("relevant_since"), json.dumps(finding)) for finding in page]
+                )
+            count += len(page)
+
+        with conn:
+            conn.execute(
+                "INSERT INTO repos (repo, synced_at) VALUES (?, ?) ON CONFLICT(repo) DO UPDATE SET synced_at = excluded.synced_at",
+                (repo, started_at)
+            )
+
+        mode = "incremental" if last_synced_at is not None else "full"
+        logging.info(f"{mode} refresh of {repo} fetched {count} updated findings")
+        return count
+
+    def findings(self, repo):
+        rows = self.connection().execute("SELECT data FROM findings WHERE repo = ? ORDER BY rowid", (repo,))
+        return [json.loads(data) for (data,) in rows]
@@ -0,0 +1,69 @@
+"""
+Counts of findings in a long-format table with one row per (repo, metric, severity, state, category).
+
+Each repo's findings are walked once to count their severity/state, vulnerability classes and OWASP Top 10
+categories. Per-repo tables are merged by concatenation, and the summary tables, bar graphs and heatmaps are all
+pivoted out of the merged table.
+"""
+from collections import Counter
+
+import pandas as pd
+
+COLUMNS = ['repo', 'metric', 'severity', 'state', 'category', 'count']
+SEVERITIES = ['high', 'medium', 'low']
+STATES = ['muted', 'fixed', 'removed', 'unresolved']
+
+SEVERITY_AND_STATE = 'severity_and_state'
+VULNERABILITY_CLASS = 'vulnerability_class'
+OWASP_TOP10 = 'owasp_top10'
+
+def count_findings(repo, findings):
+    counts = Counter()
+    for finding in findings:
+        severity = finding.get('severity')
+        state = finding.get('state')
+        rule = finding.get('rule') or {}
+
+        counts[(SEVERITY_AND_STATE, severity, state, '')] += 1
+        for v_class in rule.get('vulnerability_classes') or []:
+            counts[(VULNERABILITY_CLASS, severity, state, v_class)] += 1
+        for owasp_cat in rule.get('owasp_names') or []:
+            counts[(OWASP_TOP10, severity, state, owasp_cat)] += 1
+
+    # every severity/state pair gets a row, so a repo shows up in the summaries even where all its counts are 0
+    for severity in SEVERITIES:
+        for state in STATES:
+            counts.setdefault((SEVERITY_AND_STATE, severity, state, ''), 0)
+
+    return pd.DataFrame([(repo, *key, count) for key, count in counts.items()], columns=COLUMNS)
+
+def merge_counts(tables):
+    """Merges per-repo count tables, keeping repos and categories in the order they were first counted."""
+    if not tables:
+        return pd.DataFrame(columns=COLUMNS)
+    merged = pd.concat(tables, ignore_index=True)
+    return merged.groupby(COLUMNS[:-1], sort=False, dropna=False, as_index=False)['count'].sum()
+
+def repos(counts):
+    return list(counts['repo'].unique())
+
+def severity_counts(counts, state):
+    """Repos x severity counts of the findings in `state`."""
+    rows = counts[(counts['metric'] == SEVERITY_AND_STATE) & (counts['state'] == state)]
+    return pivot(rows, ['repo'], 'severity', repos(counts), SEVERITIES)
+
+def state_counts(counts):
+    """(repo, severity) x state counts."""
+    rows = counts[counts['metric'] == SEVERITY_AND_STATE]
+    index = pd.MultiIndex.from_product([repos(counts), SEVERITIES], names=['repo', 'severity'])
+    return pivot(rows, ['repo', 'severity'], 'state', index, STATES)
+
+def category_counts(counts, metric, severity='high', state='unresolved'):
+    """Repos x category counts of `metric` for the findings with the given severity and state."""
+    rows = counts[(counts['metric'] == metric) & (counts['severity'] == severity) & (counts['state'] == state)]
+    return pivot(rows, ['repo'], 'category', repos(counts), list(rows['category'].unique()))
+
+def pivot(rows, index, column, index_values, column_values):
+    wide = rows.pivot_table(index=index, columns=column, values='count', aggfunc='sum')
+    wide = wide.reindex(index=index_values, columns=column_values).fillna(0).astype(int)
+    return wide.rename_axis(columns=None)
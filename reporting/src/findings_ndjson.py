@@ -0,0 +1,101 @@
+"""
+Combined findings of a run as newline-delimited JSON, one finding per line, appended one repo at a time.
+
+With compression each repo's findings are their own gzip member or zstd frame, and both formats allow members to be
+concatenated into one file. An index file next to the findings records the byte offset and length of every repo's
+part, so a reader can seek straight to one repo and decompress only that part.
+
+zstd needs the optional zstandard package.
+"""
+import gzip
+import json
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+INDEX_SUFFIX = ".index.json"
+
+class CompressionUnavailableError(Exception):
+    pass
+
+def check_compression(compression):
+    if compression not in COMPRESSIONS:
+        raise CompressionUnavailableError(f"unknown compression {compression}, choose from gzip or zstd")
+    if compression == "zstd" and zstandard is None:
+        raise CompressionUnavailableError("zstd compression needs zstandard, install it with `pipenv install --categories compression`")
+
+def findings_path(base_path, compression=None):
+    """`base_path` without an extension, e.g. reports/<epoch>/combined-<epoch>."""
+    return base_path + ".ndjson" + COMPRESSIONS[compression]
+
+class NdjsonWriter:
+    def __init__(self, path, compression=None):
+        check_compression(compression)
+        self.path = path
+        self.compression = compression
+        self.file = open(path, 'wb')
+        self.index = {}
+
+    def add_repo(self, repo, findings):
+        """Appends the repo's findings as its own part of the file. Each repo can be added once."""
+        if repo in self.index:
+            # the index has one entry per repo, a second part would be left in the file without one
+            raise ValueError(f"findings for {repo} were already written to {self.path}")
+        offset = self.file.tell()
+        if self.compression == "gzip":
+            # mtime=0 keeps the output the same from run to run
+            stream = gzip.GzipFile(fileobj=self.file, mode='wb', mtime=0)
+        elif self.compression == "zstd":
+            stream = zstandard.ZstdCompressor().stream_writer(self.file, closefd=False)
+        else:
+            stream = None
+
+        count = 0
+        for finding in findings:
+            line = json.dumps(finding).encode('utf-8') + b"\n"
+            (stream or self.file).write(line)
+            count += 1
+        if stream is not None:
+            # ends the repo's member/frame without closing the file
+            stream.close()
+
+        self.index[repo] = {"offset": offset, "length": self.file.tell() - offset, "count": count}
+
+    def close(self):
+        self.file.close()
+        with open(self.path + INDEX_SUFFIX, 'w') as f:
+            json.dump({"compression": self.compression, "repos": self.index}, f, indent=4)
+        logging.info(f"Findings for {len(self.index)} repos written to NDJSON file: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def load_index(path):
+    with open(path + INDEX_SUFFIX) as f:
+        return json.load(f)
+
+def read_repo_findings(path, repo, index=None):
+    """Reads one repo's findings from the NDJSON file at `path`, without reading or decompressing the other repos."""
+    index = index or load_index(path)
+    entry = index["repos"].get(repo)
+    if entry is None:
+        return []
+
+    with open(path, 'rb') as f:
+        f.seek(entry["offset"])
+        data = f.read(entry["length"])
+
+    if index["compression"] == "gzip":
+        data = gzip.decompress(data)
+    elif index["compression"] == "zstd":
+        check_compression("zstd")
+        # frames are streamed, so their header has no content size for a one-shot decompress
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return [json.loads(line) for line in data.splitlines() if line]
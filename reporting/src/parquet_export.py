@@ -0,0 +1,96 @@
+"""
+Columnar export of the normalized findings as a Parquet dataset, partitioned by run and repo.
+
+Each repo's findings are written to `<root>/run=<epoch>/repo=<repo>/findings.parquet`, with the repo name
+URI-encoded since it usually contains a slash. Low-cardinality columns are stored dictionary encoded and come back
+as pandas categoricals, and loaders read only the columns (and partitions) they ask for.
+
+pyarrow is optional, this module is only imported by runs that ask for the parquet format.
+"""
+import logging
+import os
+import urllib.parse
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FINDINGS_FILE = "findings.parquet"
+
+# severity, state, confidence, repository and rule repeat across most findings
+CATEGORICAL_COLUMNS = ['severity', 'state', 'confidence', 'triage_state', 'repository.name', 'repository.url', 'Finding Title']
+
+# the type of every categorical column, in every partition
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string()) if pa is not None else None
+
+# parsed as timestamps when the repo has any, see DATE_COLUMNS in the report script
+TIMESTAMP_COLUMNS = ['triaged_at', 'state_updated_at']
+
+# flattened into repository.* and location.* columns already
+DROPPED_COLUMNS = ['repository', 'location']
+
+class ParquetUnavailableError(Exception):
+    pass
+
+def check_available():
+    if pa is None:
+        raise ParquetUnavailableError("the parquet format needs pyarrow, install it with `pipenv install --categories parquet`")
+
+def partition_path(root, run, repo):
+    return os.path.join(root, f"run={run}", f"repo={urllib.parse.quote(repo, safe='')}")
+
+def findings_table(df: pd.DataFrame):
+    df = df.drop(columns=[column for column in DROPPED_COLUMNS if column in df])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # columns that are empty in this repo would be typed null, give them the type they'd have elsewhere
+    # so every partition of the dataset shares one schema. pandas sizes category codes to the repo's number of
+    # categories (int8 up to 127), so dictionary columns get one index type too
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(DICTIONARY_TYPE))
+        elif pa.types.is_null(field.type):
+            column_type = pa.timestamp('ns', tz='UTC') if field.name in TIMESTAMP_COLUMNS else pa.string()
+            table = table.set_column(i, field.name, table.column(i).cast(column_type))
+        elif pa.types.is_list(field.type) and pa.types.is_null(field.type.value_type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.list_(pa.string())))
+    return table
+
+def write_repo_findings(df: pd.DataFrame, root, run, repo):
+    """Writes the repo's normalized findings DataFrame to its partition of the dataset, replacing any earlier write."""
+    check_available()
+    output_folder = partition_path(root, run, repo)
+    os.makedirs(output_folder, exist_ok=True)
+    path = os.path.join(output_folder, FINDINGS_FILE)
+    pq.write_table(findings_table(df), path, compression='zstd')
+    logging.info(f"Findings for {repo} written to Parquet file: {path}")
+    return path
+
+def read_findings(root, columns=None, repos=None, runs=None):
+    """
+    Reads findings back from the dataset under `root` as a DataFrame. Only `columns` are read (every column when None),
+    and `repos`/`runs` limit which partitions are read at all. `run` and `repo` can be selected like any other column.
+    """
+    check_available()
+    partitioning = ds.partitioning(
+        pa.schema([('run', pa.dictionary(pa.int32(), pa.string())), ('repo', pa.dictionary(pa.int32(), pa.string()))]),
+        flavor='hive',
+        dictionaries='infer'
+    )
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning)
+
+    expression = None
+    for field, values in (('run', runs), ('repo', repos)):
+        if values is not None:
+            condition = ds.field(field).isin([str(value) for value in values])
+            expression = condition if expression is None else expression & condition
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
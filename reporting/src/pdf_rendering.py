@@ -0,0 +1,94 @@
+"""
+Renders report HTML to PDF with wkhtmltopdf and merges rendered PDFs into combined reports.
+
+Every render is its own wkhtmltopdf process, so jobs are run from a bounded pool of threads that each wait on one
+process. Rendered PDFs can be cached by a hash of their HTML, and combined reports are assembled by merging PDFs that
+were already rendered rather than rendering the whole document again.
+
+pdfkit and PyPDF2 are imported when they're first used, so runs that don't produce PDFs never load them.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PDF_OPTIONS = {
+    'orientation': 'Landscape',
+    'enable-local-file-access': None
+}
+
+def cache_key(html, options=PDF_OPTIONS):
+    digest = hashlib.sha256(html.encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def render_pdf(html, pdf_path, cache_dir=None, options=PDF_OPTIONS):
+    """Renders `html` to `pdf_path`, copying a cached PDF of the same HTML instead if there is one. Returns True on a cache hit."""
+    import pdfkit
+
+    if cache_dir is None:
+        pdfkit.from_string(html, pdf_path, options=options)
+        return False
+
+    cached_path = os.path.join(cache_dir, cache_key(html, options) + '.pdf')
+    if os.path.exists(cached_path):
+        shutil.copyfile(cached_path, pdf_path)
+        logging.debug(f"using cached PDF {cached_path} for {pdf_path}")
+        return True
+
+    pdfkit.from_string(html, pdf_path, options=options)
+
+    # copy then rename so a concurrent render never reads a partly written cache entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(pdf_path, tmp_path)
+    os.replace(tmp_path, cached_path)
+    return False
+
+class PdfRenderPool:
+    """Renders PDFs in the background, running at most `workers` wkhtmltopdf processes at once."""
+    def __init__(self, workers=1, cache_dir=None):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pdf-render")
+        self.cache_dir = cache_dir
+        self.futures = []
+
+    def submit(self, html, pdf_path):
+        future = self.executor.submit(render_pdf, html, pdf_path, self.cache_dir)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """Waits for every submitted render, raising the first failure."""
+        cached = sum(future.result() for future in self.futures)
+        logging.info(f"rendered {len(self.futures) - cached} PDFs, {cached} reused from the PDF cache")
+        self.futures = []
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+def merge_pdfs(pdf_paths, output_path):
+    """
+    Merges the PDFs in order into `output_path`. Parts are passed to the merger by path so their pages are read
+    from the files on disk as the output is written, rather than every part being loaded into memory first.
+    """
+    from PyPDF2 import PdfMerger
+
+    merger = PdfMerger()
+    try:
+        for pdf_path in pdf_paths:
+            logging.debug(f"appending PDF file: {pdf_path}")
+            merger.append(pdf_path)
+
+        with open(output_path, 'wb') as f_out:
+            merger.write(f_out)
+    finally:
+        merger.close()
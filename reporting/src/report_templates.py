@@ -0,0 +1,332 @@
+"""
+Templates for the HTML reports.
+
+Templates are str.format strings, so literal braces are doubled. The combined report is split around its summary
+table and the per-repo report around its body, so the table rows and each repo's section can be written straight to
+the output file between the pieces.
+"""
+
+# combined report up to the summary table, then from the summary table to the end of the charts
+COMBINED_REPORT_HEAD = """
+    <html>
+    <head>
+    <title> Semgrep SAST Scan Report for All Repository with tag {interesting_tag} </title>
+    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <style>
+    .container-table {{
+        display: grid; /* Use CSS Grid */
+        place-items: center; /* Center both horizontally and vertically */
+    }}
+    </style>
+    <style>
+    .center-text {{
+        text-align: center; 
+    }}
+    </style>
+    <style>
+    .my_table {{
+        width: 100%;
+        border-collapse: collapse;
+    }}
+    .my_table th, .my_table td {{
+        border: 1px solid black;
+        text-align: left;
+        padding: 8px;
+    }}
+    .my_table th {{
+        background-color: #f2f2f2;
+    }}
+    </style>
+    <style>
+        #myImage {{
+            display: block;
+            margin-left: auto;
+            margin-right: auto;
+            width: 75%; /* or any desired width */
+            height: auto; /* to maintain the aspect ratio */
+        }}
+    </style>
+    <style>
+        .centered-table {{
+            margin-left: auto;
+            margin-right: auto;
+        }}
+    </style>
+    <style>
+        table {{
+            border-collapse: collapse;
+            width: 50%;
+        }}
+        th, td {{
+            border: 1px solid black;
+            text-align: left;
+            padding: 8px;
+        }}
+        th {{
+            background-color: #f2f2f2;
+        }}
+        tr:nth-child(even) {{
+            background-color: #f2f2f2;
+        }}
+    </style>
+    <style>
+        .grade-A {{
+            background-color: green;
+            color: white; /* For better readability */
+        }}
+        .grade-B {{
+            background-color: yellow;
+            color: black; /* Adjust color for readability */
+        }}
+        .grade-C {{
+            background-color: orange;
+            color: white;
+        }}
+        .grade-D {{
+            background-color: red;
+            color: white;
+        }}
+        .grade-F {{
+            background-color: darkred;
+            color: white;
+        }}
+        /* Add more classes if needed */
+    </style>
+
+
+    </head>
+    <header>
+        <link href="https://cdn.datatables.net/1.11.5/css/jquery.dataTables.min.css" rel="stylesheet">
+        <script type="text/javascript" src="https://code.jquery.com/jquery-3.5.1.js"></script>
+        <script type="text/javascript" src="https://cdn.datatables.net/1.11.5/js/jquery.dataTables.min.js"></script>
+    </header>
+    <body>
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+    <img src="https://i.ibb.co/8xyV6WJ/Semgrep-logo.png" alt="logo" id="myImage">
+    </div>
+    <div class="container">
+    <h1> <p style="text-align: center;" id="sast"> Semgrep SAST Scan Report for All Repositories with tag {interesting_tag} </p> </h1>
+    <h2> <p style="text-align: center;" id="reporttime"> Report Generated at {formatted_now}</p> </h2>
+    </div>
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p style="text-align: center;" id="html_summary_table"> SAST Findings Summary </p> </h2>
+    </div>
+    <div class="container-table centered-table">
+        <table id="myTable" class="my_table">
+            """
+
+COMBINED_REPORT_CHARTS = """
+        </table>
+    </div>
+
+    <script>
+    $(document).ready(function () {{
+        $('#myTable').DataTable({{
+        }});
+    }});
+    </script>
+
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="bar_graph_open_vulns"> Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+        <img src="{absolute_path_open}" alt="open_vulns" id="myImage">
+    </div>
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="bar_graph_fixed_vulns"> Top 15 Projects with High Severity Fixed Vulnerability Count  </p> </h2>
+    </div>
+
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+        <img src="{absolute_path_fixed}" alt="fixed_vulns" id="myImage">
+    </div>
+
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="heatmap_vuln_classes"> Vulnerability Classes for Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+        <img src="{absolute_path_heatmap_vuln_classes}" alt="heatmap_vuln_classes" id="myImage">
+    </div>
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="heatmap_owasp_top10_categories"> OWASP Top 10 mapping for Top 15 Projects with High Severity Open Vulnerability Count  </p> </h2>
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+        <img src="{absolute_path_heatmap_owasp_top10_categories}" alt="heatmap_owasp_top10_categories" id="myImage">
+    </div>
+    <div style="page-break-after: always;"></div>
+
+    <div style="page-break-after: always;"></div>"""
+
+COMBINED_REPORT_SECTION_BREAK = """\n <div style="page-break-after: always;"></div>"""
+
+COMBINED_REPORT_END = "</body>\n</html>"
+
+SUMMARY_TABLE_START = "<table id='myDataTable' class='my_table'>"
+
+SUMMARY_TABLE_END = "</table>"
+
+SUMMARY_HEADER_CELL = '<th class="{cell_class}">{header}</th>'
+
+SUMMARY_CELL = '<td class="{cell_class}">{value}</td>'
+
+# per-repo report, the body is what gets embedded in the combined report
+SAST_REPORT_HEAD = """
+    <html>
+    <head>
+    <title> Semgrep SAST Scan Report for Repository: {repo_name} </title>
+    <style>
+    .my_table {{
+        width: 100%;
+        border-collapse: collapse;
+    }}
+    .my_table th, .my_table td {{
+        border: 1px solid black;
+        text-align: left;
+        padding: 8px;
+    }}
+    .my_table th {{
+        background-color: #f2f2f2;
+    }}
+    /* Example of setting specific column widths */
+    .my_table td:nth-of-type(1) {{ /* Targeting first column */
+        width: 20% !important;
+    }}
+    .my_table td:nth-of-type(2) {{ /* Targeting second column */
+        width: 30% !important;
+    }}
+    .my_table td:nth-of-type(3) {{ /* Targeting third column */
+        width: 10% !important;
+    }}
+    .my_table td:nth-of-type(4) {{ /* Targeting fourth column */
+        width: 10% !important;
+    }}
+    .my_table td:nth-of-type(5) {{ /* Targeting fifth column */
+        width: 15% !important;
+    }}
+    .my_table td:nth-of-type(6) {{ /* Targeting sixth column */
+        width: 15% !important;
+    }}
+    </style>
+    <style>
+        #myImage {{
+            display: block;
+            margin-left: auto;
+            margin-right: auto;
+            width: 75%; /* or any desired width */
+            height: auto; /* to maintain the aspect ratio */
+        }}
+    </style>
+    <style>
+        .centered-table {{
+            margin-left: auto;
+            margin-right: auto;
+        }}
+    </style>
+    <style>
+        table {{
+            border-collapse: collapse;
+            width: 50%;
+        }}
+        th, td {{
+            border: 1px solid black;
+            text-align: left;
+            padding: 8px;
+        }}
+        th {{
+            background-color: #f2f2f2;
+        }}
+        tr:nth-child(even) {{
+            background-color: #f2f2f2;
+        }}
+    </style>
+
+    </head>
+    <header>
+        <link href="https://cdn.datatables.net/1.11.5/css/jquery.dataTables.min.css" rel="stylesheet">
+    </header>
+    <body>"""
+
+SAST_REPORT_BODY = """
+    <div style="height: 75px;"></div> <!-- Creates 75px of vertical space -->
+    <div class="container">
+    <img src="https://i.ibb.co/8xyV6WJ/Semgrep-logo.png" alt="logo" id="myImage">
+    </div>
+    <div class="container">
+    <h1> <p style="text-align: center;" id="sast"> Semgrep SAST Scan Report for Repository: {repo_name} </p> </h1>
+    <h2> <p style="text-align: center;" id="reporttime"> Report Generated at {formatted_now} </p> </h2>
+    </div>
+    <div style="height: 40px;"></div> <!-- Creates 50px of vertical space -->
+    <div class="topnav">
+    <h2> <p style="text-align: center;" id="sast-summary"> SAST Scan Summary </p> </h2>
+
+    <table border="1" class="centered-table"> <!-- Added border for visibility -->
+        <!-- Table Header -->
+        <tr>
+            <th>Vulnerability Severity</th>
+            <th>Vulnerability Count</th>
+        </tr>
+
+        <!-- Table Rows and Data Cells -->
+        <tr>
+            <td><a href="#sast-high"> Findings- SAST High Severity </a> </td>
+            <td> {high_count} </td>
+        </tr>
+        <tr>
+            <td> <a href="#sast-med"> Findings- SAST Medium Severity </a> </td>
+            <td> {medium_count} </td>
+        </tr>
+        <tr>
+            <td> <a href="#sast-low"> Findings- SAST Low Severity </a> </td>
+            <td> {low_count} </td>
+        </tr>
+    </table>
+
+    </div>
+
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="sast-high"> Findings Summary- HIGH Severity </p> </h2>
+    </div>
+    <div class="container">
+        {high_findings_table_html}
+    </div>
+
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="sast-med"> Findings Summary- MEDIUM Severity </p> </h2>
+    </div>
+    <div class="container">
+    <table style="width: 100%;">
+    {med_findings_table_html}
+    </table>
+    </div>
+
+    <div style="page-break-after: always;"></div>
+
+    <div class="heading">
+    <h2> <p id="sast-low"> Findings Summary- LOW Severity </p> </h2>
+    </div>
+    <div class="container">
+    <table style="width: 100%;">
+    {low_findings_table_html}
+    </table>
+    </div>
+
+    """
+
+SAST_REPORT_END = """</body>
+    </html>
+    """
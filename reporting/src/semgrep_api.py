@@ -0,0 +1,76 @@
+"""
+Client for the semgrep.dev web API endpoints used by the reporting tool.
+
+A single pooled session is shared by every request (and every thread), failed requests are retried with backoff,
+and list endpoints are followed page by page until they're exhausted instead of stopping at the first page.
+The base URL can be pointed at a local stub server with the SEMGREP_API_URL environment variable.
+"""
+import logging
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "https://semgrep.dev/api/v1"
+DEFAULT_PAGE_SIZE = 3000
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class SemgrepApiError(Exception):
+    def __init__(self, url, status_code, text):
+        super().__init__(f"{url} returned {status_code}: {text}")
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+class SemgrepApiClient:
+    def __init__(self, token, base_url=None, page_size=DEFAULT_PAGE_SIZE, pool_size=10, retries=5, backoff_factor=1.0, timeout=120):
+        self.base_url = (base_url or os.environ.get("SEMGREP_API_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.page_size = page_size
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Authorization": "Bearer " + token})
+
+    def get(self, path, params=None):
+        url = f"{self.base_url}/{path}"
+        r = self.session.get(url, params=params, timeout=self.timeout)
+        if r.status_code != 200:
+            raise SemgrepApiError(url, r.status_code, r.text)
+        return r.json()
+
+    def iter_pages(self, path, key, params=None):
+        """Yields the `key` list of each page of a paginated endpoint, stopping at the first short page."""
+        page = 0
+        while True:
+            items = self.get(path, {**(params or {}), "page": page, "page_size": self.page_size}).get(key) or []
+            logging.debug(f"{path}: page {page} returned {len(items)} {key}")
+            yield items
+            if len(items) < self.page_size:
+                return
+            page += 1
+
+    def get_deployments(self):
+        return self.get("deployments")["deployments"]
+
+    def iter_projects(self, slug_name):
+        for page in self.iter_pages(f"deployments/{slug_name}/projects", "projects"):
+            yield from page
+
+    def iter_finding_pages(self, slug_name, repo, **params):
+        yield from self.iter_pages(f"deployments/{slug_name}/findings", "findings", {"repos": repo, **params})
+
+    def iter_findings(self, slug_name, repo, **params):
+        for page in self.iter_finding_pages(slug_name, repo, **params):
+            yield from page
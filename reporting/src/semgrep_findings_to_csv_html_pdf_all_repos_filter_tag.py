@@ -8,9 +8,7 @@
 # 7. Create a HTML report from the dataframe
 
 import getopt
-import requests
 import sys
-import json
 import re
 import os
 import pandas as pd
@@ -18,9 +16,19 @@ from pandas import json_normalize
 from datetime import datetime
 import logging
 import html
-import pdfkit
 import time
+import multiprocessing
+from collections import deque, namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import file_handling_helpers
+import findings_ndjson
+import findings_counts
+import pdf_rendering
+import report_templates
+import xlsx_export
+import semgrep_api
+from findings_cache import FindingsCache
 
 
 
@@ -33,246 +41,318 @@ FILTER_IMPORTANT_FINDINGS = False
 
 EPOCH_TIME = str(int(time.time()))
 
-severity_and_state_counts_all_repos = []
-vulnerability_counts_all_repos = []
-owasp_top10_counts_all_repos = []
-
-
-def get_deployments():
-    headers = {"Accept": "application/json", "Authorization": "Bearer " + SEMGREP_API_WEB_TOKEN}
-
-    r = requests.get('https://semgrep.dev/api/v1/deployments',headers=headers)
-    if r.status_code != 200:
-        sys.exit(f'Getting org details failed: {r.text}')
-    data = json.loads(r.text)
-    slug_name = data['deployments'][0].get('slug')
+# per-repo findings_counts tables, merged once every repo has been counted
+findings_counts_all_repos = []
+
+DATE_COLUMNS = ['triaged_at', 'state_updated_at']
+
+# every output the script can produce, html and pdf each include the combined report as well as the per-repo ones
+REPORT_FORMATS = ('json', 'csv', 'xlsx', 'html', 'pdf', 'parquet')
+# parquet needs pyarrow, which isn't installed by default, so it's only written when asked for
+DEFAULT_FORMATS = ('json', 'csv', 'xlsx', 'html', 'pdf')
+
+# the Parquet dataset of the findings, under reports/ next to the runs' folders. Every run adds its own run=EPOCH_TIME
+# partition, so the dataset grows into the findings history across runs
+PARQUET_DATASET = "findings_parquet"
+
+# what write_repo_reports hands back for the run-wide outputs, `findings` is the DataFrame the reports show
+RepoReport = namedtuple('RepoReport', ['repo', 'html_file', 'html_body', 'pdf_file_path', 'findings'])
+
+class RunOutputs:
+    """
+    The run-wide outputs every repo is added to as soon as it's processed: the combined JSON, the PDF render pool,
+    the XLSX workbook and the repo sections of the combined HTML report. Outputs that weren't requested are None.
+    `repo_formats` are the formats each repo's own reports are written in.
+    """
+    def __init__(self, combined_json, pdf_pool, xlsx, repo_formats=DEFAULT_FORMATS):
+        self.combined_json = combined_json
+        self.pdf_pool = pdf_pool
+        self.xlsx = xlsx
+        self.repo_formats = repo_formats
+        # body of each repo's HTML report by report file name
+        self.html_sections = {}
+
+    def add_findings(self, repo, data):
+        if self.combined_json is not None:
+            self.combined_json.add_repo(repo, data)
+
+    def add_report(self, report):
+        if 'html' in self.repo_formats:
+            self.html_sections[report.html_file] = report.html_body
+        if self.pdf_pool is not None:
+            self.pdf_pool.submit(file_handling_helpers.wrap_html_sast(report.html_body, report.repo), report.pdf_file_path)
+        if self.xlsx is not None:
+            self.xlsx.add_repo(report.repo, report.findings)
+
+
+def get_deployments(client):
+    try:
+        deployments = client.get_deployments()
+    except semgrep_api.SemgrepApiError as e:
+        sys.exit(f'Getting org details failed: {e.text}')
+    slug_name = deployments[0].get('slug')
     logging.info("Accessing org: " + slug_name)
     return slug_name
 
-def get_projects(slug_name, interesting_tag):
-    logging.info("Getting list of projects in org: " + slug_name)
+def get_projects(client, slug_name, interesting_tag, workers=1, cache=None, write_json=True, pdf_cache=None, formats=DEFAULT_FORMATS, json_compression=None):
+    """
+    `client` is None for an offline run, which reads the repos and their findings from `cache` only.
+    Only the outputs in `formats` are produced, and only the stages they need are run.
+    """
+    if client is None:
+        repos = cache.repos_with_tag(interesting_tag)
+        logging.info(f"Offline run, {len(repos)} cached projects/repos have the tag {interesting_tag}")
+    else:
+        repos = get_tagged_repos(client, slug_name, interesting_tag, cache)
+
+    # every repo's findings and reports are added to the run's outputs as they're produced,
+    # and each repo's PDF is rendered in the background while the next repos are processed
+    output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)
+    os.makedirs(output_folder, exist_ok=True)
+    output_file = findings_ndjson.findings_path(os.path.join(output_folder, "combined" + "-" + EPOCH_TIME), json_compression)
+    xlsx_file_path = os.path.join(output_folder, f"semgrep_sast_findings_{interesting_tag}_{EPOCH_TIME}.xlsx")
+    # --no-repo-json only drops the per-repo JSON files, the combined JSON file is still written
+    repo_formats = tuple(f for f in formats if write_json or f != 'json')
+    with (
+        findings_ndjson.NdjsonWriter(output_file, json_compression) if 'json' in formats else nullcontext() as combined_json,
+        pdf_rendering.PdfRenderPool(workers, pdf_cache) if 'pdf' in formats else nullcontext() as pdf_pool,
+        xlsx_export.XlsxExporter(xlsx_file_path) if 'xlsx' in formats else nullcontext() as xlsx
+    ):
+        outputs = RunOutputs(combined_json, pdf_pool, xlsx, repo_formats)
+        if workers > 1:
+            get_findings_for_repos_concurrently(client, slug_name, repos, workers, cache, outputs)
+        else:
+            for repo in repos:
+                get_findings_per_repo(client, slug_name, repo, cache, outputs)
+        if pdf_pool is not None:
+            pdf_pool.wait()
+
+    if 'html' not in formats and 'pdf' not in formats:
+        return
+
+    counts = findings_counts.merge_counts(findings_counts_all_repos)
+    logging.debug(f"findings counts for all repos:\n{counts}")
+
+    # the combined PDF is the summary followed by the per-repo PDFs, merged once by combine_html_files
+    output_pdf_filename = f'combined_output_{interesting_tag}.pdf' if 'pdf' in formats else None
 
-    headers = {"Accept": "application/json", "Authorization": "Bearer " + SEMGREP_API_WEB_TOKEN}
-    params =  {"page_size": 3000}
-
-    r = requests.get('https://semgrep.dev/api/v1/deployments/' + slug_name + '/projects?page=0',params=params,headers=headers)
-    if r.status_code != 200:
-        sys.exit(f'Getting list of projects failed: {r.text}')
-
-    data = json.loads(r.text)
-    for project in data['projects']:
-        project_name = project['name']
-        logging.debug(f"Currently processing project/repo: {project_name}  with the following tags {project['tags']}")
-        if interesting_tag in project.get("tags", []):
-            logging.debug(f"Currently processing project/repo: {project_name} and has the tag {interesting_tag} ")
-            get_findings_per_repo(slug_name, project_name)
-
-    print(f"vulnerability_counts_all_repos: {vulnerability_counts_all_repos}")
-
-    output_file = "combined" + "-" + EPOCH_TIME +  ".json"
-    logging.info (f"starting process to combine JSON files")
-    file_handling_helpers.combine_json_files(output_file)
-    logging.info (f"finished process to combine JSON files")
-    logging.info (f"starting process to combine PDF files")
-    output_pdf_filename = f'combined_output_{interesting_tag}.pdf'
-    file_handling_helpers.combine_pdf_files(output_pdf_filename)
-    logging.info (f"finished process to combine PDF files")
-
-    folder_path = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
     summary_file = "summary-" + EPOCH_TIME +  ".html"
-    summary_file_path = os.path.join(folder_path, summary_file)
+    summary_file_path = os.path.join(output_folder, summary_file)
 
     logging.info (f"starting process to combine HTML files")
-    output_filename = f'combined_output_{interesting_tag}.html'  # The name of the output file
-    file_handling_helpers.combine_html_files(severity_and_state_counts_all_repos, vulnerability_counts_all_repos, owasp_top10_counts_all_repos, output_filename, output_pdf_filename, interesting_tag)
+    output_filename = f'combined_output_{interesting_tag}.html' if 'html' in formats else None  # The name of the output file
+    file_handling_helpers.combine_html_files(counts, outputs.html_sections, output_filename, output_pdf_filename, interesting_tag, output_folder, EPOCH_TIME, pdf_cache)
     logging.info (f"finished process to combine HTML files")
 
-def get_findings_per_repo(slug_name, repo):
-      
-    headers = {"Accept": "application/json", "Authorization": "Bearer " + SEMGREP_API_WEB_TOKEN}
-    params =  {"page_size": 3000, "repos": repo}
-    # r = requests.get('https://semgrep.dev/api/v1/deployments/' + slug_name + '/findings?repos='+repo,params=params, headers=headers)
-    r = requests.get('https://semgrep.dev/api/v1/deployments/' + slug_name + '/findings',params=params, headers=headers)
-    if r.status_code != 200:
-        sys.exit(f'Getting findings for project failed: {r.text}')
-    data = json.loads(r.text)
-
-    # create folder reports/EPOCH_TIME
-    output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
-    os.makedirs(output_folder, exist_ok=True)
+def get_tagged_repos(client, slug_name, interesting_tag, cache=None):
+    logging.info("Getting list of projects in org: " + slug_name)
 
-    # Construct the full path for the output file
-    output_filename = re.sub(r"[^\w\s]", "_", repo) + "-" + EPOCH_TIME + ".json"
-    file_path = os.path.join(output_folder, output_filename)
+    projects = []
+    repos = []
+    try:
+        for project in client.iter_projects(slug_name):
+            project_name = project['name']
+            projects.append(project)
+            logging.debug(f"Currently processing project/repo: {project_name}  with the following tags {project['tags']}")
+            if interesting_tag in project.get("tags", []):
+                logging.debug(f"Currently processing project/repo: {project_name} and has the tag {interesting_tag} ")
+                repos.append(project_name)
+    except semgrep_api.SemgrepApiError as e:
+        sys.exit(f'Getting list of projects failed: {e.text}')
+
+    if cache is not None:
+        cache.save_projects(projects)
+    return repos
+
+def get_findings_for_repos_concurrently(client, slug_name, repos, workers, cache, outputs):
+    """
+    Fetches findings for up to `workers` repos at once and renders each repo's reports in a process pool.
+    Fetches and rendered reports are consumed in project order, so the run's outputs come out the same as a serial run.
+    """
+    output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)
+    # spawn rather than fork since the fetch threads are already running. spawned workers re-import this
+    # module, so the run's EPOCH_TIME is passed along instead of being recomputed
+    render_pool = ProcessPoolExecutor(
+        max_workers=min(workers, os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_render_worker,
+        initargs=(logging.getLogger().level,)
+    )
+    with ThreadPoolExecutor(max_workers=workers) as fetch_pool, render_pool:
+        fetches = [fetch_pool.submit(fetch_findings, client, slug_name, repo, cache) for repo in repos]
+        renders = deque()
+        for repo, fetch in zip(repos, fetches):
+            data = fetch.result()
+            if record_repo_counts(repo, data):
+                outputs.add_findings(repo, data)
+                renders.append(render_pool.submit(write_repo_reports, repo, data, output_folder, EPOCH_TIME, outputs.repo_formats))
+
+            # hand over reports that are already done so they don't pile up in memory
+            while renders and renders[0].done():
+                outputs.add_report(renders.popleft().result())
+
+        while renders:
+            outputs.add_report(renders.popleft().result())
+
+def init_render_worker(log_level):
+    logging.basicConfig(level=log_level)
+
+def fetch_findings(client, slug_name, repo, cache=None):
+    """
+    Returns the repo's findings. With a cache only findings updated since the repo's last sync are requested and the
+    report is built from the cached findings, without a client (offline) the cache isn't refreshed at all.
+    """
+    try:
+        if cache is not None:
+            if client is not None:
+                cache.refresh(client, slug_name, repo)
+            pages = [cache.findings(repo)]
+        else:
+            # findings are requested page by page until the repo's findings are exhausted
+            pages = client.iter_finding_pages(slug_name, repo)
+
+        findings = []
+        for page in pages:
+            if FILTER_IMPORTANT_FINDINGS == True:
+                findings.extend(obj for obj in page if obj["severity"] == "high" and obj["confidence"] == "high" or obj["confidence"] == "medium")
+            else:
+                findings.extend(page)
+    except semgrep_api.SemgrepApiError as e:
+        sys.exit(f'Getting findings for project failed: {e.text}')
 
     if FILTER_IMPORTANT_FINDINGS == True:
-        logging.info("Filtering Important findings for requested project/repo: " + project_name)
-        data = [obj for obj in data['findings'] if obj["severity"] == "high" and obj["confidence"] == "high" or obj["confidence"] == "medium"]
+        logging.info("Filtering Important findings for requested project/repo: " + repo)
     else:
         logging.info("All findings for requested project/repo: " + repo)
-        data = [obj for obj in data['findings'] ]
+    return findings
 
+def record_repo_counts(repo, data):
     if len(data) == 0:
         logging.info(f"No SAST findings in repo - {repo}")
-    else:
-        # calculate severity data
-        severity_and_state_counts = count_severity_and_state(data)
-        severity_and_state_counts_all_repos.append({repo : severity_and_state_counts})
-
-        # Call the function with the example JSON object
-        (vulnerability_counts, owasp_top10_counts) = count_vulnerability_classes_and_owasp_top_10(data)
-        vulnerability_counts_all_repos.append({repo : vulnerability_counts})
-        owasp_top10_counts_all_repos.append({repo : owasp_top10_counts})
-
-        # Print the results
-        logging.debug(f"severity_and_state_counts in repo: {repo} - {severity_and_state_counts}")
-        logging.debug(f" {severity_and_state_counts_all_repos} ")
- 
-        with open(file_path, "w") as file:
-            json.dump(data, file)
-            logging.info("Findings for requested project/repo: " + repo + "written to: " + file_path)
-    
-        logging.info (f"starting process to convert JSON file to csv & xlsx for repo {repo}")
-        
-        output_name = re.sub(r"[^\w\s]", "_", repo)
-        logging.debug ("output_name: " + output_name)
-        json_file = output_name + "-" + EPOCH_TIME +  ".json"
-        json_file_path = os.path.join(output_folder, json_file)        
-        csv_file = output_name + "-" + EPOCH_TIME + ".csv"
-        csv_file_path = os.path.join(output_folder, csv_file)        
-        xlsx_file = output_name + "-" + EPOCH_TIME + ".xlsx"
-        xlsx_file_path = os.path.join(output_folder, xlsx_file)        
-        html_file = output_name + "-" + EPOCH_TIME +  ".html"
-        html_file_path = os.path.join(output_folder, html_file)        
-        pdf_file = output_name + "-" + EPOCH_TIME +  ".pdf"
-        pdf_file_path = os.path.join(output_folder, pdf_file)
-
-        logging.info(f"file names: {output_name}, {json_file_path},{csv_file_path}, {xlsx_file_path},{html_file_path}, {pdf_file_path}")
-        json_to_csv_pandas(json_file_path, csv_file_path)
-        # json_to_xlsx_pandas(json_file, xlsx_file)
-        # convert_json_to_pdf(json_file)
-        json_to_html_pandas(json_file_path, html_file_path, pdf_file_path, repo)
-
-        logging.info (f"completed conversion process for repo: {repo}")
-
-def count_severity_and_state(data):
-    # Initialize counters for each severity level and each state within that level
-    counts = {
-        'high': {'muted': 0, 'fixed': 0, 'removed': 0, 'unresolved': 0},
-        'medium': {'muted': 0, 'fixed': 0, 'removed': 0, 'unresolved': 0},
-        'low': {'muted': 0, 'fixed': 0, 'removed': 0, 'unresolved': 0}
-    }
-
-    # Iterate through each item in the data
-    for item in data:
-        severity = item.get('severity')  # Get the severity of the current item
-        state = item.get('state')  # Get the state of the current item
-
-        # Check if the severity and state are recognized, then increment the appropriate counter
-        if severity in counts and state in counts[severity]:
-            counts[severity][state] += 1
-
-    return counts
-
-def count_vulnerability_classes_and_owasp_top_10(data):
-    # Initialize a dictionary to keep count of each vulnerability class
-    vulnerability_counts = {}
-    owasp_top10_counts = {}
-    
-    # Iterate over each finding in the JSON object
-    for finding in data:
-        # Extract the vulnerability classes for the current finding
-        vulnerability_classes = finding['rule']['vulnerability_classes']
-        owasp_top10_categories = finding['rule']['owasp_names']
-        severity = finding['severity']
-        state = finding['state']
-        
-        # Iterate over each vulnerability class in the current finding
-        #  we are only interested in open findings with high severity
-        if (severity=="high" and state=="unresolved"):
-            for v_class in vulnerability_classes:
-                # If the class is already in the dictionary, increment its count
-                if v_class in vulnerability_counts:
-                    vulnerability_counts[v_class] += 1
-                # Otherwise, add the class to the dictionary with a count of 1
-                else:
-                    vulnerability_counts[v_class] = 1
-
-            for owasp_cat in owasp_top10_categories:
-                # If the class is already in the dictionary, increment its count
-                if owasp_cat in owasp_top10_counts:
-                    owasp_top10_counts[owasp_cat] += 1
-                # Otherwise, add the class to the dictionary with a count of 1
-                else:
-                    owasp_top10_counts[owasp_cat] = 1
-
-    # Return the dictionary containing counts of each vulnerability class
-    return (vulnerability_counts, owasp_top10_counts)
-
-def json_to_df(json_file):
-    # Read the JSON file into a DataFrame
-    df = pd.read_json(json_file)
-
-    df = df.rename(columns={'rule_name' : 'Finding Title' , 'rule_message'  : 'Finding Description & Remediation', 'relevant_since' : 'First Seen'})
-
-
-    # filter out only specific columns
-    df = df.loc[:, [ 'Finding Title', 'Finding Description & Remediation', 'state', 'First Seen', 'severity', 'confidence',  'triage_state', 'triaged_at', 'triage_comment', 'state_updated_at', 'repository',  'location' ]] 
-    logging.info("Findings converted to DF from JSON file : " + json_file)
-
-    return df
-
-def json_to_df_html(json_file):
-    with open(json_file) as json_file_data:
-        data = json.load(json_file_data)
-        logging.debug(data)
+        return False
+
+    # count severity/state, vulnerability classes and OWASP Top 10 categories in one pass
+    counts = findings_counts.count_findings(repo, data)
+    findings_counts_all_repos.append(counts)
+
+    logging.debug(f"findings counts in repo: {repo}\n{counts}")
+    return True
+
+def get_findings_per_repo(client, slug_name, repo, cache, outputs):
+    data = fetch_findings(client, slug_name, repo, cache)
+    if record_repo_counts(repo, data):
+        outputs.add_findings(repo, data)
+        # create folder reports/EPOCH_TIME
+        output_folder = os.path.join(os.getcwd(), "reports", EPOCH_TIME)  # Define the output path
+        outputs.add_report(write_repo_reports(repo, data, output_folder, EPOCH_TIME, outputs.repo_formats))
+
+def write_repo_reports(repo, data, output_folder, epoch_time=EPOCH_TIME, formats=DEFAULT_FORMATS):
+    """
+    Normalizes the repo's findings once and writes the per-repo reports in `formats` from that DataFrame.
+    Returns a RepoReport for the run-wide outputs, the PDF is rendered and the XLSX sheet written by the caller.
+    The DataFrames and the HTML body are only built when a requested format needs them, otherwise they're None.
+    """
+    os.makedirs(output_folder, exist_ok=True)
 
+    logging.info (f"starting process to convert findings to {', '.join(formats)} for repo {repo}")
+    
+    output_name = re.sub(r"[^\w\s]", "_", repo)
+    logging.debug ("output_name: " + output_name)
+    json_file = output_name + "-" + epoch_time +  ".json"
+    json_file_path = os.path.join(output_folder, json_file)        
+    csv_file = output_name + "-" + epoch_time + ".csv"
+    csv_file_path = os.path.join(output_folder, csv_file)        
+    html_file = output_name + "-" + epoch_time +  ".html"
+    html_file_path = os.path.join(output_folder, html_file)        
+    pdf_file = output_name + "-" + epoch_time +  ".pdf"
+    pdf_file_path = os.path.join(output_folder, pdf_file)
+
+    logging.info(f"file names: {output_name}, {json_file_path},{csv_file_path}, {html_file_path}, {pdf_file_path}")
+    if 'json' in formats:
+        file_handling_helpers.write_json_array(json_file_path, data)
+        logging.info("Findings for requested project/repo: " + repo + " written to: " + json_file_path)
+
+    df_report = None
+    html_body = None
+    if any(f in formats for f in ('csv', 'xlsx', 'html', 'pdf', 'parquet')):
+        df = findings_to_df(data)
+        if 'csv' in formats:
+            df_to_csv(df, csv_file_path)
+        if 'parquet' in formats:
+            import parquet_export
+            parquet_export.write_repo_findings(df, os.path.join(os.path.dirname(output_folder), PARQUET_DATASET), epoch_time, repo)
+        if any(f in formats for f in ('xlsx', 'html', 'pdf')):
+            df_report = report_findings_df(df)
+        if 'html' in formats or 'pdf' in formats:
+            # a PDF-only run still needs the report body, but not the HTML file
+            html_body = df_to_html(df_report, html_file_path if 'html' in formats else None, repo)
+
+    logging.info (f"completed conversion process for repo: {repo}")
+    return RepoReport(repo, html_file, html_body, pdf_file_path, df_report)
+
+def findings_to_df(data):
+    """
+    Builds the one DataFrame all of a repo's reports are written from. Nested fields are flattened into columns
+    like `repository.url` and `location.line`, while `repository` and `location` are also kept whole for the CSV.
+    """
     df = json_normalize(data)
-    return df
+    for column in ('repository', 'location'):
+        df[column] = [finding.get(column) for finding in data]
 
-def json_to_csv_pandas(json_file, csv_file):
+    # parse the timestamps the way pd.read_json did when the CSV was built from the JSON file
+    for column in DATE_COLUMNS:
+        if column in df and not df[column].isna().all():
+            try:
+                df[column] = pd.to_datetime(df[column], format="ISO8601")
+            except (ValueError, TypeError, OverflowError):
+                pass
 
-    df = json_to_df(json_file)
-    
     df = df.rename(columns={'rule_name' : 'Finding Title' , 'rule_message'  : 'Finding Description & Remediation', 'relevant_since' : 'First Seen'})
+    logging.info(f"Normalized {len(df)} findings")
+    return df
+
+def df_to_csv(df, csv_file):
+    # filter out only specific columns
+    df = df.loc[:, [ 'Finding Title', 'Finding Description & Remediation', 'state', 'First Seen', 'severity', 'confidence',  'triage_state', 'triaged_at', 'triage_comment', 'state_updated_at', 'repository',  'location' ]]
 
     # Write the DataFrame to CSV
     df.to_csv(csv_file, index=False)
 
-    logging.info("Findings converted from JSON file : " + json_file + " to CSV File: " + csv_file)
+    logging.info("Findings written to CSV File: " + csv_file)
+
+# the report columns below are built a whole column at a time rather than with a row-wise apply per column
 
-def escape_html_description(row):
-    s = row['Finding Description & Remediation']
-    return (s.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-            .replace("'", "&#39;"))
+def escape_html_description(df):
+    s = df['Finding Description & Remediation']
+    return (s.str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False)
+            .str.replace('"', "&quot;", regex=False)
+            .str.replace("'", "&#39;", regex=False))
 
-def add_short_ref(row):
-    match = re.search(r'\b\w+$', row['ref'])
-    # Return the found word or None if no match
-    return match.group(0) if match else None
+def add_short_ref(df):
+    # the last word of the ref. a ref that doesn't end in a word (e.g. refs/heads/feat-) is linked as it is, the
+    # code host resolves the full ref as well
+    return df['ref'].str.extract(r'\b(\w+)$', expand=False).fillna(df['ref'])
 
-def add_short_rule_name(row):
-    # Split the string by period
-    items = row['Finding Title'].split('.')
-    last_item = items[-1]
-    link_to_rule = f"https://semgrep.dev/r?q={row['Finding Title']}"
+def add_short_rule_name(df):
+    # the last item of the dotted rule name, linked to the rule
+    last_item = df['Finding Title'].str.rsplit('.', n=1).str[-1]
+    link_to_rule = "https://semgrep.dev/r?q=" + df['Finding Title']
 
-    # return the last item
-    return (html.unescape("<a href='" + link_to_rule + "'>" + last_item + "</a>"))
+    return ("<a href='" + link_to_rule + "'>" + last_item + "</a>").map(html.unescape, na_action='ignore')
 
-def add_hyperlink_to_code(row):
-    return row['repository.url'] + '/blob/' + row['short_ref'] + '/' + row['location.file_path'] + '#L' + str(row['location.line'])
+def add_hyperlink_to_code(df):
+    return df['repository.url'] + '/blob/' + df['short_ref'] + '/' + df['location.file_path'] + '#L' + df['location.line'].astype(str)
 
-def add_repo_details(row):
-    return (html.unescape("<a href='" + row['repository.url'] + "'>" + row['repository.name'] + "</a>"))
+def add_repo_details(df):
+    return ("<a href='" + df['repository.url'] + "'>" + df['repository.name'] + "</a>").map(html.unescape, na_action='ignore')
 
-def add_location_details_hyperlink(row):
-    return (html.unescape("<a href='" + row['link_to_code'] + "'>" + row['location.file_path'] + '#L' + str(row['location.line']) + "</a>"))
+def add_location_details_hyperlink(df):
+    return ("<a href='" + df['link_to_code'] + "'>" + df['location.file_path'] + '#L' + df['location.line'].astype(str) + "</a>").map(html.unescape, na_action='ignore')
 
-def process_sast_findings(df: pd.DataFrame, html_filename, pdf_filename, repo_name):
+def report_findings_df(df: pd.DataFrame):
+    """The columns shown in the HTML and XLSX reports, with the links and escaping they need."""
     # Create new DF with SAST findings only
     # df_sast = df.loc[(df['check_id'].str.contains('ssc')==False)]
 
@@ -307,102 +387,57 @@ def process_sast_findings(df: pd.DataFrame, html_filename, pdf_filename, repo_na
         # 'extra.metadata.cwe2022-top25', 
     ]
 
-    START_ROW = 0
-    df_red = df[interesting_columns_sast]
+    # a copy, the derived columns are assigned to it below
+    df_red = df[interesting_columns_sast].copy()
 
-    # Apply the function and create a new column
-    df_red['Finding Description & Remediation'] = df_red.apply(escape_html_description, axis=1)
-    df_red['Finding Title'] = df_red.apply(add_short_rule_name, axis=1)
-    df_red['short_ref'] = df_red.apply(add_short_ref, axis=1)
-    df_red['link_to_code'] = df_red.apply(add_hyperlink_to_code, axis=1)
-    # df_red['repository'] = df_red.apply(add_repo_details, axis=1)
-    df_red['location'] = df_red.apply(add_location_details_hyperlink, axis=1)
+    # Build the derived columns
+    df_red['Finding Description & Remediation'] = escape_html_description(df_red)
+    df_red['Finding Title'] = add_short_rule_name(df_red)
+    df_red['short_ref'] = add_short_ref(df_red)
+    df_red['link_to_code'] = add_hyperlink_to_code(df_red)
+    # df_red['repository'] = add_repo_details(df_red)
+    df_red['location'] = add_location_details_hyperlink(df_red)
 
     df_red.drop(['repository.name', 'repository.url', 'location.file_path', 'location.line', 'link_to_code', 'short_ref'], axis=1, inplace=True)
+    return df_red
 
-    # create filename for XLSX report
-    dir_name = os.path.basename(os.getcwd())
-    logging.debug(dir_name)
-    current_time = datetime.now().strftime("%Y%m%d-%H%M")
-    reportname = f"semgrep_sast_findings_{dir_name}_{current_time}"
-    xlsx_filename = f"{reportname}.xlsx"
-
-    # Create a Pandas Excel writer using XlsxWriter as the engine.
-    writer = pd.ExcelWriter(xlsx_filename, engine="xlsxwriter")
-
-    # Write the dataframe data to XlsxWriter. Turn off the default header and
-    # index and skip one row to allow us to insert a user defined header.
-    df_red.to_excel(writer, sheet_name="findings", startrow=START_ROW, header=True, index=False)
-
-    # Get the xlsxwriter workbook and worksheet objects.
-    workbook = writer.book
-    worksheet = writer.sheets["findings"]
-
-    # Get the dimensions of the dataframe.
-    (max_row, max_col) = df_red.shape
-
-    # Create a list of column headers, to use in add_table().
-    column_settings = [{"header": column.split(".")[-1]} for column in df_red.columns]
-
-    # Add the Excel table structure. Pandas will add the data.
-    # we start from row = 4 to allow us to insert a title and summary of findings
-    worksheet.add_table(START_ROW, 0, max_row+START_ROW, max_col - 1, {"columns": column_settings})
-
-    # Add a format.
-    text_format = workbook.add_format({'text_wrap' : True})
-
-    # Make the text columns width = 48 & add text wrap for clarity
-    worksheet.set_column(0, max_col - 1, 48, text_format) 
-
-    # Make the message columns width = 96 & add text wrap for clarity
-    worksheet.set_column(1, 1, 96, text_format) 
-
-    # Make the severity, confidence, likelyhood & impact columns width = 12 
-    worksheet.set_column(4, 7, 12)
-
+def process_sast_findings(df_red: pd.DataFrame, html_filename, repo_name):
     # #  create new df_high by filtering df_red for HIGH severity
     df_high = df_red.loc[(df_red['severity'] == 'high')]
-    # Create a list of column headers, to use in add_table().
-    column_settings = [{"header": column.split(".")[-1]} for column in df_high.columns]
 
     # #  create new df_med by filtering df_red for MED severity
     df_med = df_red.loc[(df_red['severity'] == 'medium')]
-    # Create a list of column headers, to use in add_table().
-    column_settings = [{"header": column.split(".")[-1]} for column in df_med.columns]
 
     # #  create new df_low by filtering df_red for LOW severity
     df_low = df_red.loc[(df_red['severity'] == 'low')]
-    # Create a list of column headers, to use in add_table().
-    column_settings = [{"header": column.split(".")[-1]} for column in df_low.columns]
 
-    # Close the Pandas Excel writer and output the Excel file.
-    writer.close()
-
-    # generate the HTML from the dataframe
-    html = file_handling_helpers.generate_html_sast(df_high, df_med, df_low, repo_name)
+    # generate the HTML report body from the dataframe
+    html_body = file_handling_helpers.generate_html_sast_body(df_high, df_med, df_low, repo_name)
     
     # write the HTML content to an HTML file
-    open(html_filename, "w").write(html)
-
-    # convert from HTML to PDF
-    options = {
-        'orientation': 'Landscape',
-        'enable-local-file-access': None
-    }
-    pdfkit.from_string(html, pdf_filename, options=options)
-
-def json_to_html_pandas(json_file, html_file, pdf_file, repo_name):
-
-    df = json_to_df_html(json_file)
-    # logging.debug("data in JSON file is: ")
-    # logging.debug(data)
-
-    df = df.rename(columns={'rule_name' : 'Finding Title' , 'rule_message'  : 'Finding Description & Remediation', 'relevant_since' : 'First Seen'})
-
-    # Write the DataFrame to HTML
-    process_sast_findings(df, html_file, pdf_file, repo_name)
-
-    logging.info("Findings converted from JSON file : " + json_file + " to HTML File: " + html_file)
+    if html_filename is not None:
+        with open(html_filename, "w") as html_file:
+            html_file.write(report_templates.SAST_REPORT_HEAD.format(repo_name=repo_name))
+            html_file.write(html_body)
+            html_file.write(report_templates.SAST_REPORT_END)
+
+    return html_body
+
+def df_to_html(df, html_file, repo_name):
+    # Write the DataFrame to HTML, the report body is returned for the PDF and combined report
+    html_body = process_sast_findings(df, html_file, repo_name)
+
+    if html_file is not None:
+        logging.info("Findings written to HTML File: " + html_file)
+    return html_body
+
+def parse_formats(arg):
+    # a comma separated list like "csv,json", kept in REPORT_FORMATS order
+    formats = {f.strip().lower() for f in arg.split(",") if f.strip()}
+    unknown = formats.difference(REPORT_FORMATS)
+    if unknown or not formats:
+        sys.exit(f"--formats takes a comma separated list of {', '.join(REPORT_FORMATS)}, got: {arg}")
+    return tuple(f for f in REPORT_FORMATS if f in formats)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
@@ -412,23 +447,63 @@ if __name__ == "__main__":
 
     # get option and value pair from getopt
     try:
-        opts, args = getopt.getopt(user_inputs, "t:h", ["tag=", "help"])
+        opts, args = getopt.getopt(user_inputs, "t:w:c:f:h", ["tag=", "workers=", "cache=", "offline", "no-repo-json", "pdf-cache=", "formats=", "json-compression=", "help"])
         #lets's check out how getopt parse the arguments
         logging.debug(opts)
         logging.debug(args)
     except getopt.GetoptError:
-        logging.debug('pass the arguments like -t <tag> -h <help> or --tag <tag> and --help <help>')
+        logging.debug('pass the arguments like -t <tag> -w <workers> -c <cache> -f <formats> -h <help> or --tag <tag> --workers <workers> --cache <cache> --offline --no-repo-json --pdf-cache <dir> --formats <json,csv,xlsx,html,pdf,parquet> --json-compression <gzip|zstd> and --help <help>')
         sys.exit(2)
 
+    workers = 1
+    cache_path = None
+    offline = False
+    write_json = True
+    pdf_cache = None
+    formats = DEFAULT_FORMATS
+    json_compression = None
+
     for opt, arg in opts:
         if opt in ("-h", "--help"):
-            logging.info('pass the arguments like -t <tag> -h <help> or --tag <tag> and --help <help>')
+            logging.info('pass the arguments like -t <tag> -w <workers> -c <cache> -f <formats> -h <help> or --tag <tag> --workers <workers> --cache <cache> --offline --no-repo-json --pdf-cache <dir> --formats <json,csv,xlsx,html,pdf,parquet> --json-compression <gzip|zstd> and --help <help>')
             sys.exit()
         elif opt in ("-t", "--tag"):
             logging.debug(opt)
             logging.debug(arg)
             interesting_tag = arg
-
-    slug_name = get_deployments()
-    get_projects(slug_name, interesting_tag)
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-c", "--cache"):
+            cache_path = arg
+        elif opt == "--offline":
+            offline = True
+        elif opt == "--no-repo-json":
+            write_json = False
+        elif opt == "--pdf-cache":
+            pdf_cache = arg
+        elif opt in ("-f", "--formats"):
+            formats = parse_formats(arg)
+            if 'parquet' in formats:
+                import parquet_export
+                try:
+                    parquet_export.check_available()
+                except parquet_export.ParquetUnavailableError as e:
+                    sys.exit(str(e))
+        elif opt == "--json-compression":
+            json_compression = None if arg == "none" else arg
+            try:
+                findings_ndjson.check_compression(json_compression)
+            except findings_ndjson.CompressionUnavailableError as e:
+                sys.exit(str(e))
+
+    if offline and cache_path is None:
+        sys.exit("--offline needs a findings cache, pass it with -c <cache>")
+
+    cache = FindingsCache(cache_path) if cache_path else None
+    if offline:
+        client, slug_name = None, None
+    else:
+        client = semgrep_api.SemgrepApiClient(SEMGREP_API_WEB_TOKEN, pool_size=workers)
+        slug_name = get_deployments(client)
+    get_projects(client, slug_name, interesting_tag, workers, cache, write_json, pdf_cache, formats, json_compression)
     logging.info ("completed conversion process")
\ No newline at end of file
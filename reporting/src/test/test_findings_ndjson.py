@@ -0,0 +1,68 @@
+"""
+Round trip of the combined NDJSON findings, reading single repos back through the index with every compression.
+
+    cd reporting && python -m pytest src/test
+"""
+import gzip
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import findings_ndjson
+
+REPOS = {
+    "org/one": [{"id": 1, "rule": "a"}, {"id": 2, "rule": "b", "message": "café ✓"}],
+    "org/empty": [],
+    "org/two": [{"id": 3, "rule": "a", "nested": {"line": 10}}],
+}
+
+@pytest.fixture(params=[None, "gzip", "zstd"])
+def compression(request):
+    if request.param == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+def write(tmp_path, compression):
+    path = findings_ndjson.findings_path(str(tmp_path / "combined-1"), compression)
+    with findings_ndjson.NdjsonWriter(path, compression) as writer:
+        for repo, findings in REPOS.items():
+            writer.add_repo(repo, iter(findings))
+    return path
+
+def test_every_repo_reads_back_on_its_own(tmp_path, compression):
+    path = write(tmp_path, compression)
+
+    index = findings_ndjson.load_index(path)
+    assert index["compression"] == compression
+    assert {repo: entry["count"] for repo, entry in index["repos"].items()} == {repo: len(findings) for repo, findings in REPOS.items()}
+    for repo, findings in REPOS.items():
+        assert findings_ndjson.read_repo_findings(path, repo, index) == findings
+    assert findings_ndjson.read_repo_findings(path, "org/missing") == []
+
+def test_whole_file_is_one_stream(tmp_path, compression):
+    path = write(tmp_path, compression)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if compression == "gzip":
+        data = gzip.decompress(data)
+    elif compression == "zstd":
+        import zstandard
+        # like `zstd -d`, reads every repo's frame rather than stopping after the first
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+
+    assert [json.loads(line) for line in data.splitlines()] == [finding for findings in REPOS.values() for finding in findings]
+
+def test_repo_added_twice_is_refused(tmp_path):
+    path = str(tmp_path / "combined-1.ndjson")
+    with findings_ndjson.NdjsonWriter(path) as writer:
+        writer.add_repo("org/one", REPOS["org/one"])
+        with pytest.raises(ValueError):
+            writer.add_repo("org/one", REPOS["org/two"])
+
+    assert findings_ndjson.read_repo_findings(path, "org/one") == REPOS["org/one"]
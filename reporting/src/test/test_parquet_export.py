@@ -0,0 +1,46 @@
+"""
+Round trip of the Parquet export, with repos whose categorical columns have very different numbers of categories.
+
+    cd reporting && python -m pytest src/test
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pyarrow")
+import parquet_export
+
+def findings(repo, titles):
+    return pd.DataFrame({
+        'Finding Title': [f"rule-{i}" for i in range(titles)],
+        'severity': ['high', 'low'] * (titles // 2) + ['medium'] * (titles % 2),
+        'state': ['unresolved'] * titles,
+        'repository.name': [repo] * titles,
+        'triaged_at': [None] * titles,
+        'line': list(range(titles)),
+    })
+
+def test_partitions_with_mixed_category_counts_read_back_together(tmp_path):
+    # pandas stores up to 127 categories with int8 codes and more with int16, and the dataset takes its schema
+    # from the first partition, which is the narrow repo
+    parquet_export.write_repo_findings(findings("org/wide", 300), tmp_path, "1", "org/wide")
+    parquet_export.write_repo_findings(findings("org/narrow", 3), tmp_path, "1", "org/narrow")
+    parquet_export.write_repo_findings(findings("org/narrow", 5), tmp_path, "2", "org/narrow")
+
+    df = parquet_export.read_findings(tmp_path)
+    assert len(df) == 308
+    assert df['Finding Title'].dtype == 'category'
+    assert sorted(df['repo'].unique()) == ["org/narrow", "org/wide"]
+    assert set(df[df['repo'] == "org/wide"]['Finding Title']) == {f"rule-{i}" for i in range(300)}
+
+def test_read_only_requested_columns_and_partitions(tmp_path):
+    parquet_export.write_repo_findings(findings("org/wide", 300), tmp_path, "1", "org/wide")
+    parquet_export.write_repo_findings(findings("org/narrow", 3), tmp_path, "1", "org/narrow")
+
+    df = parquet_export.read_findings(tmp_path, columns=['severity', 'repo'], repos=["org/narrow"])
+    assert list(df.columns) == ['severity', 'repo']
+    assert list(df['severity']) == ['high', 'low', 'medium']
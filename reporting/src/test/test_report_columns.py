@@ -0,0 +1,146 @@
+"""
+The report's derived columns, built a column at a time, against the row-wise functions they replaced.
+
+    cd reporting && python -m pytest src/test
+"""
+import html
+import json
+import os
+import re
+import sys
+import warnings
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_handling_helpers
+import semgrep_findings_to_csv_html_pdf_all_repos_filter_tag as report
+
+# the row-wise versions, as they were before the columns were vectorized
+
+def escape_html_description(row):
+    s = row['Finding Description & Remediation']
+    return (s.replace("&", "&amp;")
+            .replace("<", "&lt;")
+            .replace(">", "&gt;")
+            .replace('"', "&quot;")
+            .replace("'", "&#39;"))
+
+def add_short_ref(row):
+    match = re.search(r'\b\w+$', row['ref'])
+    return match.group(0) if match else None
+
+def add_short_rule_name(row):
+    items = row['Finding Title'].split('.')
+    last_item = items[-1]
+    link_to_rule = f"https://semgrep.dev/r?q={row['Finding Title']}"
+    return (html.unescape("<a href='" + link_to_rule + "'>" + last_item + "</a>"))
+
+def add_hyperlink_to_code(row):
+    return row['repository.url'] + '/blob/' + row['short_ref'] + '/' + row['location.file_path'] + '#L' + str(row['location.line'])
+
+def add_location_details_hyperlink(row):
+    return (html.unescape("<a href='" + row['link_to_code'] + "'>" + row['location.file_path'] + '#L' + str(row['location.line']) + "</a>"))
+
+def row_wise_report_findings_df(df):
+    df_red = df[[
+        'Finding Title', 'Finding Description & Remediation', 'severity', 'state', 'repository.name',
+        'repository.url', 'location.file_path', 'location.line', 'ref',
+    ]].copy()
+    df_red['Finding Description & Remediation'] = df_red.apply(escape_html_description, axis=1)
+    df_red['Finding Title'] = df_red.apply(add_short_rule_name, axis=1)
+    df_red['short_ref'] = df_red.apply(add_short_ref, axis=1)
+    df_red['link_to_code'] = df_red.apply(add_hyperlink_to_code, axis=1)
+    df_red['location'] = df_red.apply(add_location_details_hyperlink, axis=1)
+    df_red.drop(['repository.name', 'repository.url', 'location.file_path', 'location.line', 'link_to_code', 'short_ref'], axis=1, inplace=True)
+    return df_red
+
+# semgrep cli output of a scan of OWASP Juice Shop, at the root of the repo
+JUICE_SHOP_FINDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data", "juice_shop_findings.json")
+CLI_SEVERITIES = {'INFO': 'low', 'WARNING': 'medium', 'ERROR': 'high'}
+
+def juice_shop_findings():
+    """The sample's findings in the shape the semgrep.dev findings API returns them."""
+    with open(JUICE_SHOP_FINDINGS, encoding='utf-8') as f:
+        results = json.load(f)['results']
+    return [
+        {
+            'rule_name': result['check_id'],
+            'rule_message': result['extra']['message'],
+            'severity': CLI_SEVERITIES[result['extra']['severity']],
+            'state': 'unresolved',
+            'confidence': result['extra']['metadata'].get('confidence', 'LOW').lower(),
+            'relevant_since': '2024-07-17T10:00:00.000000Z',
+            'triaged_at': None,
+            'ref': 'refs/heads/master',
+            'repository': {'name': 'juice-shop/juice-shop', 'url': 'https://github.com/juice-shop/juice-shop'},
+            'location': {'file_path': result['path'], 'line': result['start']['line'], 'column': result['start']['col']},
+        }
+        for result in results
+    ]
+
+def synthetic_findings(count):
+    titles = ["python.lang.security.audit.eval-detected", "no-dots", "js.express.xss&amp;injection", "java.sql.&lt;sqli&gt;"]
+    descriptions = [
+        "Use of <eval> is \"dangerous\" & shouldn't be used.",
+        "Plain description",
+        "Already escaped &amp; &lt;tag&gt; 'quoted'",
+        "",
+    ]
+    refs = ["refs/heads/main", "main", "refs/pull/42/merge", "v1.2.3", "refs/heads/feature/some-fix"]
+    paths = ["src/app.py", "lib/a b/c&d.js", "deep/nested/dir/File.java"]
+    return pd.DataFrame({
+        'Finding Title': [titles[i % len(titles)] for i in range(count)],
+        'Finding Description & Remediation': [descriptions[i % len(descriptions)] for i in range(count)],
+        'severity': [("high", "medium", "low")[i % 3] for i in range(count)],
+        'state': ["unresolved"] * count,
+        'repository.name': [f"org/repo-{i % 2}" for i in range(count)],
+        'repository.url': [f"https://github.com/org/repo-{i % 2}" for i in range(count)],
+        'location.file_path': [paths[i % len(paths)] for i in range(count)],
+        'location.line': [i * 7 + 1 for i in range(count)],
+        'ref': [refs[i % len(refs)] for i in range(count)],
+    })
+
+def test_vectorized_columns_match_row_wise_columns():
+    df = synthetic_findings(200)
+    expected = row_wise_report_findings_df(df)
+    actual = report.report_findings_df(df.copy())
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True))
+
+def test_vectorized_columns_render_the_same_html():
+    df = synthetic_findings(60)
+    expected = row_wise_report_findings_df(df)
+    actual = report.report_findings_df(df.copy())
+    for severity in ("high", "medium", "low"):
+        assert (
+            actual[actual['severity'] == severity].to_html(index=False, render_links=True, escape=False)
+            == expected[expected['severity'] == severity].to_html(index=False, render_links=True, escape=False)
+        )
+    assert (
+        file_handling_helpers.generate_html_sast_body(*(actual[actual['severity'] == s] for s in ("high", "medium", "low")), "org/repo")
+        == file_handling_helpers.generate_html_sast_body(*(expected[expected['severity'] == s] for s in ("high", "medium", "low")), "org/repo")
+    )
+
+def test_sample_findings_from_findings_to_df():
+    df = report.findings_to_df(juice_shop_findings())
+
+    assert len(df) == 170
+    assert {'Finding Title', 'Finding Description & Remediation', 'First Seen', 'repository.url', 'location.line'} <= set(df.columns)
+    expected = row_wise_report_findings_df(df)
+    with warnings.catch_warnings():
+        # the derived columns are assigned to a copy, not to a slice of the normalized DataFrame
+        warnings.simplefilter("error", pd.errors.SettingWithCopyWarning)
+        actual = report.report_findings_df(df)
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True))
+
+def test_ref_without_a_trailing_word_links_the_whole_ref():
+    df = synthetic_findings(1).assign(ref="refs/heads/feat-")
+
+    # the row-wise version failed on these, concatenating None into the link
+    with pytest.raises(TypeError):
+        row_wise_report_findings_df(df)
+    location = report.report_findings_df(df)['location'].iloc[0]
+
+    assert location == "<a href='https://github.com/org/repo-0/blob/refs/heads/feat-/src/app.py#L1'>src/app.py#L1</a>"
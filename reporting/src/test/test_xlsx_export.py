@@ -0,0 +1,40 @@
+"""
+The XLSX export's findings sheets, whose column widths follow the columns actually written.
+
+    cd reporting && python -m pytest src/test
+"""
+import os
+import re
+import sys
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xlsx_export
+
+# the columns report_findings_df hands to the export, in its order
+REPORT_COLUMNS = ['Finding Title', 'Finding Description & Remediation', 'severity', 'state', 'ref', 'location']
+
+def findings(columns=REPORT_COLUMNS):
+    return pd.DataFrame({column: [f"{column} {i}" if column != 'severity' else ('high', 'low')[i % 2] for i in range(3)] for column in columns})
+
+def column_widths(path, sheet):
+    # xlsxwriter stores a width of w characters as w + 0.71 (the cell padding), adjacent columns of the same width
+    # as one range
+    with zipfile.ZipFile(path) as xlsx:
+        xml = xlsx.read(f"xl/worksheets/sheet{sheet}.xml").decode()
+    widths = []
+    for first, last, width in re.findall(r'<col min="(\d+)" max="(\d+)" width="([\d.]+)"', xml):
+        widths += [round(float(width) - 0.71)] * (int(last) - int(first) + 1)
+    return widths
+
+def test_widths_follow_the_written_columns(tmp_path):
+    path = str(tmp_path / "findings.xlsx")
+    with xlsx_export.XlsxExporter(path) as xlsx:
+        xlsx.add_repo("org/repo", findings())
+        xlsx.add_repo("org/other", findings(['extra.metadata.impact', 'Finding Description & Remediation', 'path']))
+
+    assert column_widths(path, 2) == [48, 96, 12, 12, 48, 48]
+    assert column_widths(path, 3) == [12, 96, 48]
@@ -0,0 +1,92 @@
+"""
+XLSX export of a run's findings, one workbook per run with a summary sheet and a sheet per repo.
+
+The workbook is written in xlsxwriter's constant_memory mode: each row is flushed to disk as soon as the next row
+is started, so memory stays flat however many findings are exported. Rows therefore have to be written in order,
+which is why the summary sheet gets one row per repo as each repo is added, and why excel tables (which
+constant_memory doesn't support) are replaced with an autofilter over the header row.
+"""
+import logging
+import re
+
+import pandas as pd
+import xlsxwriter
+
+SUMMARY_SHEET = "summary"
+SUMMARY_HEADERS = ["Project", "Findings", "High", "Medium", "Low"]
+MAX_SHEET_NAME_LENGTH = 31
+INVALID_SHEET_NAME_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+# widths of the findings columns by header, any other column is DEFAULT_COLUMN_WIDTH wide
+DEFAULT_COLUMN_WIDTH = 48
+COLUMN_WIDTHS = {
+    'Finding Description & Remediation': 96,
+    'severity': 12,
+    'state': 12,
+    'confidence': 12,
+    'likelihood': 12,
+    'impact': 12,
+}
+
+class XlsxExporter:
+    def __init__(self, path):
+        self.path = path
+        # findings text isn't meant as formulas or links, and excel caps a sheet at 65530 links
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False})
+        self.header_format = self.workbook.add_format({'bold': True})
+        self.text_format = self.workbook.add_format({'text_wrap': True})
+        self.sheet_names = set()
+
+        self.summary = self.add_sheet(SUMMARY_SHEET)
+        self.summary.write_row(0, 0, SUMMARY_HEADERS, self.header_format)
+        self.summary.set_column(0, 0, 48)
+        self.summary.set_column(1, len(SUMMARY_HEADERS) - 1, 12)
+        self.summary_rows = 0
+
+    def add_sheet(self, name):
+        # excel sheet names are at most 31 characters, can't contain []:*?/\ and are unique ignoring case
+        name = INVALID_SHEET_NAME_CHARS.sub("_", name)[:MAX_SHEET_NAME_LENGTH]
+        unique_name = name
+        suffix = 1
+        while unique_name.lower() in self.sheet_names:
+            suffix += 1
+            unique_name = f"{name[:MAX_SHEET_NAME_LENGTH - len(str(suffix)) - 1]}~{suffix}"
+        self.sheet_names.add(unique_name.lower())
+        return self.workbook.add_worksheet(unique_name)
+
+    def add_repo(self, repo, df: pd.DataFrame):
+        """Writes the repo's findings to a new sheet, streaming them row by row, and adds the repo to the summary sheet."""
+        worksheet = self.add_sheet(repo)
+        (max_row, max_col) = df.shape
+
+        headers = [column.split(".")[-1] for column in df.columns]
+
+        # each column is sized by its header, wherever it is in the DataFrame, with text wrap for clarity
+        for index, header in enumerate(headers):
+            worksheet.set_column(index, index, COLUMN_WIDTHS.get(header, DEFAULT_COLUMN_WIDTH), self.text_format)
+
+        worksheet.write_row(0, 0, headers, self.header_format)
+        worksheet.freeze_panes(1, 0)
+        worksheet.autofilter(0, 0, max_row, max_col - 1)
+
+        # missing values are written as blank cells, as pandas' to_excel does
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        for row_number, row in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, row)
+
+        severities = df['severity'].value_counts() if 'severity' in df else {}
+        self.summary_rows += 1
+        self.summary.write_url(self.summary_rows, 0, f"internal:'{worksheet.get_name()}'!A1", string=repo)
+        self.summary.write_row(self.summary_rows, 1, [max_row] + [int(severities.get(severity, 0)) for severity in ('high', 'medium', 'low')])
+        logging.debug(f"wrote {max_row} findings for {repo} to sheet {worksheet.get_name()} of {self.path}")
+
+    def close(self):
+        self.summary.autofilter(0, 0, self.summary_rows, len(SUMMARY_HEADERS) - 1)
+        self.workbook.close()
+        logging.info(f"Findings for {self.summary_rows} repos written to XLSX file: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,3 +1,4 @@
+import functools
 from typing import Optional
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
@@ -12,7 +13,7 @@ class BaseConfig(BaseSettings):
     build_repository_name: str = Field(validation_alias=AliasChoices('BUILD_REPOSITORY_NAME'))
     repository_display_Name: str
     scan_type: str
-    build_buildid: int = Field(validation_alias=AliasChoices('BUILD_BUILDID'))
+    build_buildid: str = Field(validation_alias=AliasChoices('BUILD_BUILDID'))
     enable_pr_comments: bool = True
 
 class AzureDevOpsConfig(BaseConfig):
@@ -21,17 +22,26 @@ class AzureDevOpsConfig(BaseConfig):
     repository_project_name: str
     build_repository_id: str = Field(validation_alias=AliasChoices('BUILD_REPOSITORY_ID'))
     build_pipeline_project_name: str = Field(validation_alias=AliasChoices('SYSTEM_TEAMPROJECT'))
+    pr_comment_concurrency: int = 4
+    pr_comment_rate_limit: float = 5.0
+    pr_comment_max_retries: int = 5
 
 class SemgrepScanConfig(BaseConfig):
     semgrep_app_token: str
     scan_target_path: str
     repository_web_url: str
     output_directory: str
+    scan_timeout: int = 0
+    scan_idle_timeout: int = 0
 
 class SemgrepDiffScanConfig(SemgrepScanConfig):
     source_ref_name: Optional[str] = None
     last_merge_commit_id: Optional[str] = None
     last_merge_target_commit_id: Optional[str] = None
+    scan_cache_directory: Optional[str] = None
+    scan_cache_max_size_mb: int = 512
+    scan_cache_ttl: int = 86400
+    scan_cache_rules_version: str = ""
 
 class SemgrepFullScanConfig(SemgrepScanConfig):
     jobs: int = DEFAULT_JOB_COUNT
@@ -41,4 +51,36 @@ class SemgrepFullScanConfig(SemgrepScanConfig):
     semgrep_code: bool = True
     semgrep_secrets: bool = True
     semgrep_supply_chain: bool = True
-    
\ No newline at end of file
+    incremental: bool = False
+    incremental_state_directory: Optional[str] = None
+    incremental_full_scan_interval: int = 7
+    incremental_max_changed_ratio: float = 0.5
+    shards: int = 1
+    shard_memory_limit: int = 0
+    shard_without_upload: bool = False
+    scan_history_directory: Optional[str] = None
+    # the cores and MB of memory the scan may use, the whole machine's when 0
+    scan_cores: int = 0
+    scan_memory_mb: int = 0
+    profile: bool = False
+    profile_ignore_min_seconds: float = 5.0
+    profile_ignore_min_bytes: int = 1024 * 1024
+
+# each settings class is parsed from the environment the first time it's asked for and shared for the rest of the run,
+# so a scan only parses (and only requires the variables of) the settings its scan type uses
+
+@functools.cache
+def get_base_config() -> BaseConfig:
+    return BaseConfig()
+
+@functools.cache
+def get_azure_devops_config() -> AzureDevOpsConfig:
+    return AzureDevOpsConfig()
+
+@functools.cache
+def get_diff_scan_config() -> SemgrepDiffScanConfig:
+    return SemgrepDiffScanConfig()
+
+@functools.cache
+def get_full_scan_config() -> SemgrepFullScanConfig:
+    return SemgrepFullScanConfig()
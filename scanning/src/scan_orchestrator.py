@@ -0,0 +1,217 @@
+"""
+Runs full scans of several repositories at once on one machine, from a persistent job queue.
+
+Each repository config in the batch file is a JSON object of the scanner's settings (the lower case names of the
+environment variables it reads, e.g. `repository_id`, `scan_target_path`, `jobs`), and every job runs
+`semgrep_scan.py` with SCAN_TYPE=full and those settings on top of this process's environment. A job only starts when
+the cores and memory it needs are free: its cores are its `jobs` setting (or --job-cores), its memory
+the peak its repository's containers reached together in its recent scans plus --memory-headroom (or --job-memory when
+the repository has never been measured). Every job records its scan in the scan history under --history (see
+util/scan_history.py), which is where those peaks are read from. The reserved cores and memory are passed on to the
+scan (SCAN_CORES and SCAN_MEMORY_MB), which picks its jobs and max memory within them from the history. A repository
+without a measured scan runs with the reserved cores as JOBS and the reserved memory split over them as MAX_MEMORY.
+
+Jobs and their progress are kept in an SQLite queue (--queue), so running the same batch again after an interruption
+only runs the jobs that didn't finish. Jobs that had started are run again from the beginning.
+
+    python src/scan_orchestrator.py --batch repos.json --queue scan-queue.db --output-root ./scans
+"""
+import argparse
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+from util.scan_history import ScanHistory, available_memory_mb
+from util.scan_queue import ScanQueue
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+JOB_LOG_FILE = "semgrep-scan-job.log"
+
+@dataclass
+class RunningJob:
+    job: object
+    process: subprocess.Popen
+    cores: int
+    memory_mb: float
+    container_prefix: str
+    log_file: object
+    started_at: float
+    started_at_time: float
+
+def load_batch(path):
+    with open(path) as f:
+        configs = json.load(f)
+    missing = [index for index, config in enumerate(configs) if not config.get("repository_id")]
+    if missing:
+        raise ValueError(f"Repository configs {missing} in {path} have no repository_id.")
+    return configs
+
+def batch_name(path):
+    # the same batch file always resumes the same batch
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def job_cores(job, args):
+    jobs = int(job.config.get("jobs", -1))
+    return jobs if jobs > 0 else args.job_cores
+
+def measured_peaks(job, history):
+    return [record.peak_memory_mb for record in history.recent(job.repository_id) if record.peak_memory_mb]
+
+def job_memory_mb(job, history, args):
+    peaks = measured_peaks(job, history)
+    if not peaks:
+        return args.job_memory
+    return max(peaks) * (1 + args.memory_headroom)
+
+def config_flag(config, name):
+    return str(config.get(name, False)).strip().lower() in ("1", "true", "yes", "on")
+
+def job_containers(job):
+    # the most containers the scan runs at once, see _get_container_count in util/semgrep_scan.py
+    config = job.config
+    if config_flag(config, "incremental") or not config_flag(config, "shard_without_upload"):
+        return 1
+    return max(1, int(config.get("shards", 1)))
+
+def build_id(job, args):
+    # job ids restart in every queue file, and real build ids may run on the same machine
+    queue_id = hashlib.sha256(os.path.abspath(args.queue).encode()).hexdigest()[:8]
+    return f"queue-{queue_id}-{job.id}"
+
+def job_env(job, args, cores, memory_mb, measured):
+    config = job.config
+    env = dict(os.environ)
+    env.update({name.upper(): str(value) for name, value in config.items()})
+    env["SCAN_TYPE"] = "full"
+    # the build id names the job's containers, which is how their memory is attributed to it
+    env["BUILD_BUILDID"] = build_id(job, args)
+    env.setdefault("BUILD_REPOSITORY_NAME", str(config.get("repository_name", job.repository_id)))
+    env["SCAN_HISTORY_DIRECTORY"] = os.path.abspath(args.history)
+    env["SCAN_CORES"] = str(cores)
+    env["SCAN_MEMORY_MB"] = str(int(memory_mb))
+    if not measured:
+        # without a measured scan the scan has nothing to pick its jobs and max memory from
+        if "jobs" not in config:
+            env["JOBS"] = str(cores)
+        if "max_memory" not in config:
+            env["MAX_MEMORY"] = str(max(1, int(memory_mb // (job_containers(job) * cores))))
+    if "output_directory" not in config:
+        env["OUTPUT_DIRECTORY"] = os.path.abspath(os.path.join(args.output_root, str(config.get("repository_name", job.repository_id))))
+    return env
+
+def start_job(job, queue, history, args, cores, memory_mb):
+    env = job_env(job, args, cores, memory_mb, measured=bool(measured_peaks(job, history)))
+    os.makedirs(env["OUTPUT_DIRECTORY"], exist_ok=True)
+    log_file = open(os.path.join(env["OUTPUT_DIRECTORY"], JOB_LOG_FILE), "wb")
+    queue.start(job)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SRC_DIR, "semgrep_scan.py")],
+        stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT, env=env, cwd=env["OUTPUT_DIRECTORY"]
+    )
+    print(f"Started job {job.id} for {job.repository_id} with {cores} cores and {memory_mb:.0f} MB reserved.")
+    return RunningJob(job, process, cores, memory_mb, f"semgrep-{env['BUILD_BUILDID']}-", log_file, time.monotonic(), time.time())
+
+def finish_job(running_job, queue, history):
+    running_job.log_file.close()
+    exit_code = running_job.process.returncode
+    duration = time.monotonic() - running_job.started_at
+    # the scan recorded itself in the history, unless it failed before it could
+    records = [record for record in history.recent(running_job.job.repository_id, limit=1) if record.started_at >= running_job.started_at_time]
+    peak_memory_mb = records[0].peak_memory_mb if records else None
+    # 1 means the scan finished with blocking findings
+    succeeded = exit_code in (0, 1)
+    queue.finish(running_job.job, exit_code, succeeded, peak_memory_mb)
+    peak = f"{peak_memory_mb:.0f} MB" if peak_memory_mb is not None else "not measured"
+    print(f"Job {running_job.job.id} for {running_job.job.repository_id} {'finished' if succeeded else 'failed'} "
+          f"with exit code {exit_code} after {duration:.0f}s (peak memory {peak}).")
+
+def stop_job(running_job, queue):
+    names = subprocess.run(
+        ["docker", "ps", "--filter", f"name=^{running_job.container_prefix}", "--format", "{{.Names}}"],
+        capture_output=True, text=True
+    ).stdout.split()
+    if names:
+        subprocess.run(["docker", "stop", *names], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    running_job.process.terminate()
+    running_job.process.wait()
+    running_job.log_file.close()
+    queue.requeue(running_job.job)
+
+def run_batch(queue, history, batch, args):
+    cores = args.cores or os.cpu_count() or 1
+    memory_mb = (args.memory or available_memory_mb()) - args.reserve_memory
+    print(f"Scheduling on {cores} cores and {memory_mb:.0f} MB of memory.")
+
+    running = []
+    try:
+        while True:
+            for running_job in [running_job for running_job in running if running_job.process.poll() is not None]:
+                running.remove(running_job)
+                finish_job(running_job, queue, history)
+
+            pending = queue.pending(batch)
+            if not pending and not running:
+                break
+
+            # largest first, then whatever still fits next to them
+            estimates = [(job, job_cores(job, args), job_memory_mb(job, history, args)) for job in pending]
+            for job, job_cores_needed, job_memory_needed in sorted(estimates, key=lambda estimate: estimate[2], reverse=True):
+                free_cores = cores - sum(running_job.cores for running_job in running)
+                free_memory_mb = memory_mb - sum(running_job.memory_mb for running_job in running)
+                fits = job_cores_needed <= free_cores and job_memory_needed <= free_memory_mb
+                # a job bigger than the whole machine still runs, on its own
+                if fits or not running:
+                    if not fits:
+                        print(f"Job {job.id} for {job.repository_id} needs more than this machine has, running it alone.")
+                    running.append(start_job(job, queue, history, args, job_cores_needed, job_memory_needed))
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        print(f"Interrupted, stopping {len(running)} running jobs. They will run again when the batch is resumed.")
+        for running_job in running:
+            stop_job(running_job, queue)
+        raise
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", required=True, help="JSON file with a list of repository configs")
+    parser.add_argument("--batch-name", help="name of the batch in the queue, defaults to a hash of the batch file")
+    parser.add_argument("--queue", default="scan-queue.db", help="SQLite file the job queue is kept in")
+    parser.add_argument("--history", default="scan-history", help="scan history directory all jobs record their scans in")
+    parser.add_argument("--output-root", default="scans", help="parent of each job's output directory, when its config doesn't set output_directory")
+    parser.add_argument("--cores", type=int, default=0, help="cores to schedule on, defaults to all of them")
+    parser.add_argument("--memory", type=float, default=0, help="MB of memory to schedule on, defaults to the memory available at start")
+    parser.add_argument("--reserve-memory", type=float, default=1024, help="MB of memory left for everything else")
+    parser.add_argument("--job-cores", type=int, default=2, help="cores of a job whose config doesn't set jobs")
+    parser.add_argument("--job-memory", type=float, default=4096, help="MB of memory reserved for a repository that was never measured")
+    parser.add_argument("--memory-headroom", type=float, default=0.25, help="share added to a repository's peak memory in its recent scans")
+    parser.add_argument("--poll-interval", type=float, default=2, help="seconds between scheduling passes")
+    args = parser.parse_args()
+
+    # stop the running jobs the same way on a pipeline cancel as on ctrl-c
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    batch = args.batch_name or batch_name(args.batch)
+    queue = ScanQueue(args.queue)
+    history = ScanHistory(args.history)
+    try:
+        added = queue.enqueue(batch, load_batch(args.batch))
+        resumed = queue.resume(batch)
+        print(f"Batch {batch}: {added} jobs queued, {resumed} interrupted jobs resumed, {len(queue.pending(batch))} to run.")
+        run_batch(queue, history, batch, args)
+        summary = queue.summary(batch)
+        print(f"Batch {batch} complete: " + ", ".join(f"{count} {state}" for state, count in sorted(summary.items())))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        queue.close()
+        history.close()
+    sys.exit(1 if summary.get("failed") else 0)
+
+if __name__ == "__main__":
+    main()
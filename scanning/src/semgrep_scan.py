@@ -1,25 +1,26 @@
 import sys
-import json
 
-from config.settings import BaseConfig
+from config.settings import get_base_config
 import util.azure as azure
 import util.semgrep_scan as semgrep
-import util.semgrep_finding as futil
+import util.semgrep_results as semgrep_results
 
-config = BaseConfig()
 def log_start():
+    config = get_base_config()
     print(f"------------------------------------------------------------------------------")
     print(f"Running semgrep on {config.repository_name} from {config.build_repository_name}")
     print(f"Repository Display Name: {config.repository_display_Name}")
     print(f"------------------------------------------------------------------------------")
 
 def main():
+    config = get_base_config()
     log_start()
     semgrep_exit_code = 0
 
     # check if there's still an active PR at the time of firing. there's a chance that the PR was closed before the pipeline runs
-    # an edge case exists if someone opens a PR, the pipeline runs, and then the PR is closed before the pipeline finishes
-    pull_request = azure.get_pr(config.pull_request_id)
+    # an edge case exists if someone opens a PR, the pipeline runs, and then the PR is closed before the pipeline finishes.
+    # full scans never look up a PR, so they don't need the Azure DevOps client or its settings
+    pull_request = azure.get_pr(config.pull_request_id) if config.scan_type == "diff" else None
     if pull_request is not None and config.scan_type == "diff":
         pr_pending_status = azure.add_pr_status(config.pull_request_id, "pending")
         semgrep_exit_code = semgrep.diff_scan()
@@ -30,12 +31,8 @@ def main():
 
         if (config.enable_pr_comments):
             try:
-                with open('./semgrep-results.json') as f:
-                    semgrep_results = json.load(f)
-                    for finding in semgrep_results['results']:
-                        if futil.is_commentable(finding) and not azure.has_existing_comment(config.pull_request_id, finding):
-                            print(f"Posting to PR #{config.pull_request_id} comment for new finding: {finding}")
-                            azure.add_inline_comment(config.pull_request_id, finding)   
+                findings = (finding for finding in semgrep_results.iter_findings('./semgrep-results.json') if finding.commentable)
+                azure.publish_inline_comments(config.pull_request_id, findings)
             except FileNotFoundError:
                 print(f"Semgrep results file not found. No comments will be posted to the PR.")
     elif config.scan_type == "full":
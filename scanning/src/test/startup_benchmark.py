@@ -0,0 +1,158 @@
+"""
+Startup time of the scanner for each scan_type, from the first import until the scan could start.
+
+`baseline` imports the scanner as it was at the `--baseline` git revision (the repository's first commit by default),
+exported to a temporary folder. Importing it parsed every settings class and built the Azure DevOps client.
+`current` is the working tree, which only builds what the scan type uses: diff scans still need the client, full
+scans need neither it nor its settings. Every run is a fresh interpreter with an empty azure-devops cache, like a new
+pipeline agent, and the organization is a local stub that answers the client's lookups after `--latency` ms.
+
+    python src/test/startup_benchmark.py --runs 5 --latency 150 --baseline <revision>
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the location the client asks for to find the organization's resource areas
+RESOURCE_AREAS_LOCATION = {
+    "id": "e81700f7-3be2-46de-8624-2eb35882fcaa",
+    "area": "Location",
+    "resourceName": "ResourceAreas",
+    "routeTemplate": "_apis/{resource}/{areaId}",
+    "resourceVersion": 1,
+    "minVersion": "3.2",
+    "maxVersion": "7.1",
+    "releasedVersion": "0.0",
+}
+
+# importing the baseline's scanner was all of its startup, whatever the scan type
+BASELINE_CHILD = """
+import time
+started = time.perf_counter()
+import sys
+sys.path.insert(0, {src_dir!r})
+import semgrep_scan
+print(time.perf_counter() - started)
+"""
+
+CURRENT_CHILD = """
+import time
+started = time.perf_counter()
+import sys
+sys.path.insert(0, {src_dir!r})
+import semgrep_scan
+import util.azure as azure
+from config import settings
+
+if {scan_type!r} == "diff":
+    settings.get_base_config(), settings.get_diff_scan_config()
+    azure.get_git_client()
+else:
+    settings.get_base_config(), settings.get_full_scan_config()
+print(time.perf_counter() - started)
+"""
+
+def export_baseline(revision, directory):
+    """Writes the scanner's source at `revision` to `directory`."""
+    top_level = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    path = os.path.relpath(SRC_DIR, top_level).replace(os.sep, "/")
+    archive = subprocess.run(["git", "archive", "--format=tar", f"{revision}:{path}"], cwd=top_level, capture_output=True, check=True).stdout
+    archive_path = os.path.join(directory, "baseline.tar")
+    with open(archive_path, "wb") as f:
+        f.write(archive)
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(os.path.join(directory, "src"), filter="data")
+    return os.path.join(directory, "src")
+
+def first_commit():
+    return subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.split()[0]
+
+def stub_handler(latency):
+    class StubOrganization(BaseHTTPRequestHandler):
+        def respond(self, body):
+            time.sleep(latency)
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_OPTIONS(self):
+            self.respond({"count": 1, "value": [RESOURCE_AREAS_LOCATION]})
+
+        def do_GET(self):
+            self.respond({"count": 0, "value": []})
+
+        def log_message(self, *args):
+            pass
+
+    return StubOrganization
+
+def scan_env(organization_url, scan_type, cache_dir):
+    env = dict(os.environ)
+    env.update({
+        "REPOSITORY_ID": "00000000-0000-0000-0000-000000000000",
+        "REPOSITORY_NAME": "benchmark",
+        "REPOSITORY_DISPLAY_NAME": "project/benchmark",
+        "BUILD_REPOSITORY_NAME": "benchmark",
+        "BUILD_REPOSITORY_ID": "00000000-0000-0000-0000-000000000000",
+        "BUILD_BUILDID": "1",
+        "SCAN_TYPE": scan_type,
+        "PULL_REQUEST_ID": "1",
+        "AZURE_TOKEN": "token",
+        "SYSTEM_TEAMFOUNDATIONSERVERURI": organization_url,
+        "SYSTEM_TEAMPROJECT": "project",
+        "REPOSITORY_PROJECT_NAME": "project",
+        "SEMGREP_APP_TOKEN": "token",
+        "SCAN_TARGET_PATH": "/tmp",
+        "REPOSITORY_WEB_URL": "https://example.com/benchmark",
+        "OUTPUT_DIRECTORY": "/tmp",
+        "AZURE_DEVOPS_CACHE_DIR": cache_dir,
+    })
+    return env
+
+def time_startup(organization_url, scan_type, child, src_dir):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        child = child.format(src_dir=src_dir, scan_type=scan_type)
+        result = subprocess.run(
+            [sys.executable, "-c", child],
+            env=scan_env(organization_url, scan_type, cache_dir),
+            capture_output=True, text=True, check=True
+        )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=150, help="ms the stub organization takes to answer each request")
+    parser.add_argument("--baseline", help="git revision to compare the working tree with, the first commit by default")
+    args = parser.parse_args()
+    baseline = args.baseline or first_commit()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(args.latency / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    organization_url = f"http://127.0.0.1:{server.server_port}/organization"
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline_dir = export_baseline(baseline, directory)
+        print(f"baseline: {baseline}")
+        print(f"{'scan_type':<10}{'baseline (s)':>14}{'current (s)':>14}{'saved':>10}")
+        for scan_type in ("diff", "full"):
+            before = statistics.median(time_startup(organization_url, scan_type, BASELINE_CHILD, baseline_dir) for _ in range(args.runs))
+            after = statistics.median(time_startup(organization_url, scan_type, CURRENT_CHILD, SRC_DIR) for _ in range(args.runs))
+            print(f"{scan_type:<10}{before:>14.3f}{after:>14.3f}{1 - after / before:>10.0%}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
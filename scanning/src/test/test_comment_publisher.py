@@ -0,0 +1,204 @@
+"""
+CommentPublisher against a fake GitClient and a fake clock: retries, Retry-After and rate limiting.
+
+    cd scanning && python -m pytest src/test
+"""
+import http.server
+import os
+import sys
+import threading
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from azure.devops.v7_0.git.git_client import GitClient
+from msrest.universal_http.requests import RequestsHTTPSender
+
+import util.azure as azure
+import util.comment_publisher as comment_publisher
+from util.comment_publisher import CommentPublisher, TokenBucket
+
+class FakeClock:
+    """Monotonic clock that only moves when something sleeps on it."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+class ServiceError(Exception):
+    def __init__(self, status_code=None, retry_after=None, message="request failed"):
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=status_code, headers={'Retry-After': retry_after} if retry_after else {})
+
+class FakeGitClient:
+    """Stands in for the azure-devops GitClient, failing each thread with the errors given for it first."""
+    def __init__(self, clock, failures=None):
+        self.clock = clock
+        self.failures = {key: list(errors) for key, errors in (failures or {}).items()}
+        self.calls = []
+        self.posted = []
+
+    def create_thread(self, thread, repository_id, pull_request_id, project=None):
+        self.calls.append((self.clock(), thread))
+        errors = self.failures.get(thread)
+        if errors:
+            raise errors.pop(0)
+        self.posted.append((self.clock(), thread))
+
+def publisher(git_client, clock, **kwargs):
+    kwargs.setdefault("max_workers", 1)
+    kwargs.setdefault("rate_limit", 0)
+    return CommentPublisher(git_client, "repo-id", "project", sleep=clock.sleep, clock=clock, **kwargs)
+
+def comments(*keys):
+    # the fake client doesn't look inside the thread, so the key stands in for it
+    return [(key, key) for key in keys]
+
+@pytest.mark.parametrize("status_code", sorted(comment_publisher.RETRYABLE_STATUS_CODES))
+def test_retryable_status_codes_are_retried(status_code):
+    clock = FakeClock()
+    client = FakeGitClient(clock, {"a": [ServiceError(status_code), ServiceError(status_code)]})
+    existing_keys = set()
+
+    summary = publisher(client, clock, backoff_base=1.0).publish(1, comments("a"), existing_keys)
+
+    assert (summary.posted, summary.failed, summary.retries) == (1, 0, 2)
+    assert existing_keys == {"a"}
+    assert len(client.calls) == 3
+    # backoff with jitter, between half and all of 1s and then 2s
+    assert 0.5 <= clock.sleeps[0] <= 1.0 and 1.0 <= clock.sleeps[1] <= 2.0
+
+@pytest.mark.parametrize("status_code", [400, 401, 403, 404, 409, None])
+def test_other_failures_are_not_retried(status_code):
+    clock = FakeClock()
+    client = FakeGitClient(clock, {"a": [ServiceError(status_code)]})
+
+    summary = publisher(client, clock).publish(1, comments("a", "b"), set())
+
+    assert (summary.posted, summary.failed, summary.retries) == (1, 1, 0)
+    assert [key for key, _ in summary.failures] == ["a"]
+    assert clock.sleeps == []
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    client = FakeGitClient(clock, {"a": [ServiceError(503)] * 10})
+
+    summary = publisher(client, clock, max_retries=3, backoff_base=0.1).publish(1, comments("a"), set())
+
+    assert (summary.posted, summary.failed, summary.retries) == (0, 1, 3)
+    assert len(client.calls) == 4
+
+def test_status_code_from_error_message():
+    # the azure-devops client's errors only carry the status in their message
+    clock = FakeClock()
+    client = FakeGitClient(clock, {"a": [Exception("The request returned a 502 status code.")]})
+
+    summary = publisher(client, clock, backoff_base=0.1).publish(1, comments("a"), set())
+
+    assert (summary.posted, summary.retries) == (1, 1)
+
+def test_retry_after_seconds_is_waited_instead_of_backoff():
+    clock = FakeClock()
+    client = FakeGitClient(clock, {"a": [ServiceError(503, retry_after="7")]})
+
+    summary = publisher(client, clock, backoff_base=100.0).publish(1, comments("a"), set())
+
+    assert summary.posted == 1
+    assert clock.sleeps == [7.0]
+    assert client.posted == [(7.0, "a")]
+
+def test_retry_after_http_date():
+    assert 25 <= comment_publisher.parse_retry_after(formatdate(comment_publisher.time.time() + 30, usegmt=True)) <= 30
+    assert comment_publisher.parse_retry_after(formatdate(0, usegmt=True)) == 0.0
+    assert comment_publisher.parse_retry_after("soon") is None
+
+def test_retry_after_from_tracked_response():
+    # errors raised without a response fall back to what the response hook saw on this thread
+    clock = FakeClock()
+
+    class TrackingClient(FakeGitClient):
+        def create_thread(self, thread, repository_id, pull_request_id, project=None):
+            if not self.calls:
+                self.calls.append((self.clock(), thread))
+                comment_publisher.track_responses(SimpleNamespace(status_code=429, headers={'Retry-After': '4'}))
+                raise Exception("throttled")
+            super().create_thread(thread, repository_id, pull_request_id, project)
+
+    client = TrackingClient(clock)
+    summary = publisher(client, clock, rate_limit=10).publish(1, comments("a"), set())
+
+    assert (summary.posted, summary.retries) == (1, 1)
+    assert client.posted[0][0] >= 4.0
+
+def test_throttling_pauses_every_worker():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=100, clock=clock, sleep=clock.sleep)
+    bucket.pause(3)
+
+    bucket.acquire()
+
+    assert clock.now == pytest.approx(3)
+
+def test_posts_are_paced_by_the_token_bucket():
+    clock = FakeClock()
+    client = FakeGitClient(clock)
+
+    summary = publisher(client, clock, rate_limit=2).publish(1, comments(*"abcdef"), set())
+
+    assert summary.posted == 6
+    # a burst of 2, then one every half second
+    assert [time for time, _ in client.posted] == pytest.approx([0, 0, 0.5, 1.0, 1.5, 2.0])
+
+def test_existing_and_duplicate_keys_are_skipped():
+    clock = FakeClock()
+    client = FakeGitClient(clock)
+    existing_keys = {"a"}
+
+    summary = publisher(client, clock, max_workers=4).publish(1, comments("a", "b", "b", "c"), existing_keys)
+
+    assert (summary.posted, summary.skipped) == (2, 2)
+    assert sorted(thread for _, thread in client.posted) == ["b", "c"]
+    assert existing_keys == {"a", "b", "c"}
+
+class ServiceUnavailableHandler(http.server.BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def test_comment_client_leaves_retries_to_the_publisher():
+    # msrest would otherwise retry server errors up to 3 times for every attempt of the publisher
+    assert GitClient(base_url="http://localhost").config.retry_policy().is_retry("GET", 503)
+
+    git_client = GitClient(base_url="http://localhost")
+    azure.disable_retries(git_client)
+
+    assert not git_client.config.retry_policy().is_retry("GET", 503)
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), ServiceUnavailableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        response = RequestsHTTPSender(git_client.config).session.get(f"http://127.0.0.1:{server.server_port}/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 503
+    assert ServiceUnavailableHandler.requests == 1
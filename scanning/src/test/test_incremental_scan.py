@@ -0,0 +1,98 @@
+"""
+Merging an incremental scan's results with the findings carried forward from the previous scan.
+
+    cd scanning && python -m pytest src/test
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.incremental_scan as incremental
+import util.scan_profile as scan_profile
+
+def finding(fingerprint, path):
+    return {"check_id": "rule", "path": path, "extra": {"fingerprint": fingerprint}}
+
+def write(tmp_path, name, document):
+    path = tmp_path / name
+    path.write_text(json.dumps(document), encoding="utf-8")
+    return str(path)
+
+def merge(tmp_path, carried, new, deleted=()):
+    output = str(tmp_path / "semgrep-results.json")
+    count = incremental.merge_results(output, write(tmp_path, "carried.json", carried), write(tmp_path, "new.json", new), deleted)
+    with open(output, encoding="utf-8") as f:
+        return count, json.load(f)
+
+CARRIED = {
+    "results": [finding("f1", "a.py"), finding("f2", "gone.py"), finding("f3", "b.py")],
+    "errors": [{"message": "old error"}],
+    "paths": {
+        "scanned": ["a.py", "b.py", "gone.py"],
+        "skipped": [{"path": "huge.js", "reason": "exceeded_size_limit"}, {"path": "gone.min.js", "reason": "exceeded_size_limit"}],
+    },
+    "version": "1.89.0",
+}
+NEW = {
+    "results": [finding("f3", "b.py"), finding("f4", "c.py")],
+    "errors": [{"message": "new error"}],
+    "paths": {"scanned": ["b.py", "c.py"], "skipped": [{"path": "d.py", "reason": "too_many_matches"}]},
+    "time": {"rules": [{"id": "rule"}], "targets": [{"path": "/src/c.py", "num_bytes": 10, "run_time": 1.5, "match_times": [1.5]}]},
+    "skipped_rules": [{"rule_id": "slow"}],
+    "engine_requested": "OSS",
+    "version": "1.90.0",
+}
+
+def test_findings_of_deleted_files_are_dropped_and_duplicates_merged(tmp_path):
+    count, merged = merge(tmp_path, CARRIED, NEW, deleted=["gone.py", "gone.min.js"])
+
+    assert count == 3
+    assert [result["extra"]["fingerprint"] for result in merged["results"]] == ["f3", "f4", "f1"]
+
+def test_paths_combine_both_scans_without_deleted_files(tmp_path):
+    _, merged = merge(tmp_path, CARRIED, NEW, deleted=["gone.py", "gone.min.js"])
+
+    assert merged["paths"]["scanned"] == ["a.py", "b.py", "c.py"]
+    assert merged["paths"]["skipped"] == [
+        {"path": "huge.js", "reason": "exceeded_size_limit"},
+        {"path": "d.py", "reason": "too_many_matches"},
+    ]
+
+def test_file_scanned_now_is_no_longer_skipped(tmp_path):
+    carried = {**CARRIED, "paths": {"scanned": ["a.py"], "skipped": [{"path": "c.py", "reason": "exceeded_size_limit"}]}}
+
+    _, merged = merge(tmp_path, carried, NEW)
+
+    assert "c.py" not in [entry["path"] for entry in merged["paths"].get("skipped", [])]
+
+def test_other_sections_come_from_the_new_scan(tmp_path):
+    _, merged = merge(tmp_path, CARRIED, NEW)
+
+    assert merged["errors"] == [{"message": "new error"}]
+    for name in ("time", "skipped_rules", "engine_requested", "version"):
+        assert merged[name] == NEW[name]
+
+def test_merged_results_can_be_profiled(tmp_path):
+    merge(tmp_path, CARRIED, NEW)
+
+    rule_seconds, targets = scan_profile.read_timings([str(tmp_path / "semgrep-results.json")])
+
+    assert rule_seconds == {"rule": 1.5}
+    assert [(target.path, target.seconds) for target in targets] == [("c.py", 1.5)]
+
+def test_new_scan_without_errors_section(tmp_path):
+    new = {"results": [], "paths": {"scanned": []}}
+
+    count, merged = merge(tmp_path, CARRIED, new, deleted=["gone.py"])
+
+    assert count == 2
+    assert merged["errors"] == []
+    assert "version" not in merged
+
+def test_diff_manifests():
+    changes = incremental.diff_manifests({"a.py": "1", "b.py": "2", "c.py": "3"}, {"a.py": "1", "b.py": "9", "d.py": "4"})
+
+    assert (changes.changed, changes.deleted) == (["b.py", "d.py"], ["c.py"])
+    assert incremental.diff_manifests({"a.py": "1"}, {"a.py": "1"}).empty
@@ -0,0 +1,103 @@
+"""
+The diff scan result cache: its key, expiry and least recently used eviction.
+
+    cd scanning && python -m pytest src/test
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.scan_cache as scan_cache
+from util.scan_cache import ScanCache
+
+KEY_ARGS = dict(
+    repository_id="repo", pull_request_id=12, head_commit="head", baseline_commit="base",
+    semgrep_command=["semgrep", "ci", "--json"], rules_version="7",
+)
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scan_cache.time, "time", clock)
+    return clock
+
+def results(tmp_path, name, size=100):
+    path = tmp_path / name
+    path.write_text("x" * size)
+    return str(path)
+
+def test_key_changes_with_every_part():
+    key = scan_cache.cache_key(**KEY_ARGS)
+    assert key == scan_cache.cache_key(**KEY_ARGS)
+    for name, value in [
+        ("repository_id", "other"), ("pull_request_id", 13), ("head_commit", "other"), ("baseline_commit", "other"),
+        ("semgrep_command", ["semgrep", "ci"]), ("rules_version", "8"),
+    ]:
+        assert scan_cache.cache_key(**{**KEY_ARGS, name: value}) != key, name
+
+@pytest.mark.parametrize("rules_version, is_set", [("7", True), ("2024-06-01", True), ("", False), (None, False), ("$(SEMGREP_RULES_VERSION)", False)])
+def test_rules_version_must_be_set(rules_version, is_set):
+    assert scan_cache.is_rules_version_set(rules_version) == is_set
+
+def test_restores_stored_results_and_exit_code(tmp_path, clock):
+    cache = ScanCache(str(tmp_path / "cache"))
+    restored = str(tmp_path / "restored.json")
+
+    assert cache.restore("k1", restored) is None
+    cache.store("k1", results(tmp_path, "scan.json"), 1)
+
+    assert cache.restore("k1", restored) == 1
+    with open(restored) as f:
+        assert f.read() == "x" * 100
+    assert cache.metrics() == {"misses": 1, "hits": 1}
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ScanCache(str(tmp_path / "cache"), ttl=60)
+    cache.store("k1", results(tmp_path, "scan.json"), 0)
+
+    clock.now += 59
+    assert cache.restore("k1", str(tmp_path / "restored.json")) == 0
+    clock.now += 2
+    assert cache.restore("k1", str(tmp_path / "restored.json")) is None
+    assert "k1" not in cache.entries()
+    assert cache.metrics()["expired"] == 1
+
+def test_ttl_of_zero_never_expires(tmp_path, clock):
+    cache = ScanCache(str(tmp_path / "cache"), ttl=0)
+    cache.store("k1", results(tmp_path, "scan.json"), 0)
+
+    clock.now += 10 * 86400
+    assert cache.restore("k1", str(tmp_path / "restored.json")) == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ScanCache(str(tmp_path / "cache"), max_size_mb=1)
+    size = 400 * 1024
+    for key in ("k1", "k2"):
+        cache.store(key, results(tmp_path, f"{key}.json", size), 0)
+        clock.now += 1
+    # using k1 makes k2 the least recently used
+    cache.restore("k1", str(tmp_path / "restored.json"))
+    clock.now += 1
+
+    cache.store("k3", results(tmp_path, "k3.json", size), 0)
+
+    assert sorted(cache.entries()) == ["k1", "k3"]
+    assert cache.metrics()["evictions"] == 1
+
+def test_unreadable_entry_is_a_miss(tmp_path, clock):
+    cache = ScanCache(str(tmp_path / "cache"))
+    cache.store("k1", results(tmp_path, "scan.json"), 0)
+    with open(os.path.join(cache.entry_directory("k1"), scan_cache.ENTRY_FILE), "w") as f:
+        f.write("{not json")
+
+    assert cache.restore("k1", str(tmp_path / "restored.json")) is None
@@ -0,0 +1,104 @@
+"""
+Picking a scan's jobs and max memory from the repository's scan history.
+
+    cd scanning && python -m pytest src/test
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.scan_history as scan_history
+from util.scan_history import FILES_PER_JOB, OOM_EXIT_CODE, ScanHistory, ScanRecord, tune
+from util.scan_process import TIMEOUT_EXIT_CODE
+
+def record(kind=scan_history.FULL, peak_memory_mb=2000.0, jobs=4, containers=1, exit_code=0, timed_out=False, bytes=1_000_000, started_at=1.0):
+    return ScanRecord(
+        repository_id="repo", kind=kind, started_at=started_at, files=10_000, bytes=bytes, duration=600.0,
+        peak_memory_mb=peak_memory_mb, exit_code=exit_code, timed_out=timed_out, jobs=jobs, max_memory=0,
+        cores=16, memory_mb=32_000, containers=containers,
+    )
+
+# 500 MB per job in the record above, and room for 25 of them in 80% of 16000 MB
+TUNE_ARGS = dict(files=10_000, bytes=1_000_000, cores=8, memory_mb=16_000)
+
+def test_nothing_to_go_on():
+    assert tune([], **TUNE_ARGS) is None
+    assert tune([record(peak_memory_mb=None)], **TUNE_ARGS) is None
+    assert tune([record(kind=scan_history.INCREMENTAL), record(kind=scan_history.REUSED, peak_memory_mb=None)], **TUNE_ARGS) is None
+
+def test_limited_by_cores():
+    tuning = tune([record()], **TUNE_ARGS)
+
+    assert tuning.jobs == 8
+    assert tuning.max_memory == int(16_000 * 0.8 // 8)
+
+def test_limited_by_memory():
+    tuning = tune([record(peak_memory_mb=12_000, jobs=4)], **TUNE_ARGS)
+
+    # 3000 MB per job fits 4 times in 12800 MB
+    assert tuning.jobs == 4
+
+def test_limited_by_files_per_job():
+    tuning = tune([record()], **{**TUNE_ARGS, "files": FILES_PER_JOB * 3 + 10})
+
+    assert tuning.jobs == 3
+
+def test_memory_per_job_grows_with_the_repository():
+    tuning = tune([record(peak_memory_mb=4000, jobs=4)], **{**TUNE_ARGS, "bytes": 3_000_000})
+
+    # 1000 MB per job measured, 3000 MB at three times the size
+    assert tuning.jobs == 4
+
+def test_highest_peak_of_the_recent_full_scans_counts():
+    records = [record(kind=scan_history.INCREMENTAL, peak_memory_mb=100_000), record(peak_memory_mb=2000), record(kind=scan_history.SHARDED, peak_memory_mb=16_000, jobs=2, containers=2)]
+
+    tuning = tune(records, **TUNE_ARGS)
+
+    # the sharded scan ran 4 jobs in total, 4000 MB each, the incremental scan is left out
+    assert tuning.jobs == 3
+
+def test_jobs_halved_after_running_out_of_memory():
+    tuning = tune([record(jobs=6, exit_code=OOM_EXIT_CODE)], **TUNE_ARGS)
+
+    assert tuning.jobs == 3
+    assert "halved" in tuning.reason
+
+def test_one_more_job_after_a_timeout():
+    tuning = tune([record(jobs=3, timed_out=True, exit_code=TIMEOUT_EXIT_CODE)], **{**TUNE_ARGS, "files": FILES_PER_JOB * 2})
+
+    # the files only call for 2 jobs, the timeout raises it past the last scan's 3
+    assert tuning.jobs == 4
+    assert "timed out" in tuning.reason
+
+def test_timeout_raise_is_limited_by_cores():
+    tuning = tune([record(jobs=8, timed_out=True, exit_code=TIMEOUT_EXIT_CODE)], **TUNE_ARGS)
+
+    assert tuning.jobs == 8
+
+def test_configured_jobs_only_pick_max_memory():
+    tuning = tune([record()], **TUNE_ARGS, jobs=5)
+
+    assert (tuning.jobs, tuning.max_memory) == (5, int(16_000 * 0.8 // 5))
+
+def test_containers_share_cores_and_memory():
+    tuning = tune([record()], **TUNE_ARGS, containers=2)
+
+    assert tuning.jobs == 4
+    assert tuning.max_memory == int(16_000 * 0.8 / 2 // 4)
+
+def test_history_recent_is_newest_first_and_migrates_old_files(tmp_path):
+    directory = str(tmp_path)
+    conn = sqlite3.connect(os.path.join(directory, scan_history.HISTORY_FILE))
+    # a history written before scans recorded their containers
+    conn.executescript(scan_history.SCHEMA.replace(",\n    containers INTEGER NOT NULL DEFAULT 1", ""))
+    conn.close()
+
+    history = ScanHistory(directory)
+    history.record(record(started_at=1.0, peak_memory_mb=1.0))
+    history.record(record(started_at=2.0, peak_memory_mb=2.0, containers=3))
+
+    assert [(scan.peak_memory_mb, scan.containers) for scan in history.recent("repo")] == [(2.0, 3), (1.0, 1)]
+    assert history.recent("other") == []
+    history.close()
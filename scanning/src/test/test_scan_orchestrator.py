@@ -0,0 +1,88 @@
+"""
+What the scan orchestrator reserves for a job and passes on to it.
+
+    cd scanning && python -m pytest src/test
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scan_orchestrator
+from util.scan_history import ScanHistory, ScanRecord
+from util.scan_queue import Job
+
+def args(tmp_path, **overrides):
+    values = dict(
+        queue=str(tmp_path / "scan-queue.db"), history=str(tmp_path / "history"), output_root=str(tmp_path / "scans"),
+        job_cores=2, job_memory=4096, memory_headroom=0.25,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+def record(repository_id, peak_memory_mb, started_at=1.0):
+    return ScanRecord(
+        repository_id=repository_id, kind="full", started_at=started_at, files=100, bytes=10_000, duration=60.0,
+        peak_memory_mb=peak_memory_mb, exit_code=0, timed_out=False, jobs=2, max_memory=0, cores=8, memory_mb=16_000,
+    )
+
+@pytest.fixture
+def history(tmp_path):
+    history = ScanHistory(str(tmp_path / "history"))
+    yield history
+    history.close()
+
+def test_reservation_is_the_highest_recent_peak_plus_headroom(tmp_path, history):
+    history.record(record("r1", 1000.0, started_at=1.0))
+    history.record(record("r1", 1600.0, started_at=2.0))
+    history.record(record("r1", None, started_at=3.0))
+
+    assert scan_orchestrator.job_memory_mb(Job(1, "r1", {}), history, args(tmp_path)) == pytest.approx(2000.0)
+    assert scan_orchestrator.job_memory_mb(Job(2, "r2", {}), history, args(tmp_path)) == 4096
+
+def test_unmeasured_job_runs_with_its_reservation_as_jobs_and_max_memory(tmp_path):
+    job = Job(1, "r1", {"repository_id": "r1", "repository_name": "one"})
+
+    env = scan_orchestrator.job_env(job, args(tmp_path), cores=2, memory_mb=4096, measured=False)
+
+    assert (env["JOBS"], env["MAX_MEMORY"]) == ("2", "2048")
+    assert (env["SCAN_CORES"], env["SCAN_MEMORY_MB"]) == ("2", "4096")
+    assert env["SCAN_HISTORY_DIRECTORY"] == os.path.abspath(str(tmp_path / "history"))
+    assert env["OUTPUT_DIRECTORY"] == os.path.abspath(str(tmp_path / "scans" / "one"))
+
+def test_unmeasured_sharded_job_splits_max_memory_over_its_shards(tmp_path):
+    job = Job(1, "r1", {"repository_id": "r1", "jobs": 4, "shards": 2, "shard_without_upload": True})
+
+    env = scan_orchestrator.job_env(job, args(tmp_path), cores=4, memory_mb=8000, measured=False)
+
+    assert (env["JOBS"], env["MAX_MEMORY"]) == ("4", "1000")
+
+def test_measured_job_tunes_itself_within_its_reservation(tmp_path, monkeypatch):
+    monkeypatch.delenv("JOBS", raising=False)
+    monkeypatch.delenv("MAX_MEMORY", raising=False)
+    job = Job(1, "r1", {"repository_id": "r1"})
+
+    env = scan_orchestrator.job_env(job, args(tmp_path), cores=2, memory_mb=2000.0, measured=True)
+
+    assert "JOBS" not in env and "MAX_MEMORY" not in env
+    assert (env["SCAN_CORES"], env["SCAN_MEMORY_MB"]) == ("2", "2000")
+
+def test_configured_jobs_and_max_memory_are_kept(tmp_path):
+    job = Job(1, "r1", {"repository_id": "r1", "jobs": 3, "max_memory": 1500})
+
+    env = scan_orchestrator.job_env(job, args(tmp_path), cores=3, memory_mb=4096, measured=False)
+
+    assert (env["JOBS"], env["MAX_MEMORY"]) == ("3", "1500")
+
+def test_build_ids_differ_between_queues(tmp_path):
+    job = Job(7, "r1", {"repository_id": "r1"})
+
+    first = scan_orchestrator.job_env(job, args(tmp_path), 2, 4096, False)["BUILD_BUILDID"]
+    second = scan_orchestrator.job_env(job, args(tmp_path, queue=str(tmp_path / "other.db")), 2, 4096, False)["BUILD_BUILDID"]
+
+    assert first.startswith("queue-") and first.endswith("-7")
+    assert first != second
+    assert first == scan_orchestrator.job_env(job, args(tmp_path), 2, 4096, False)["BUILD_BUILDID"]
@@ -0,0 +1,94 @@
+"""
+Running the scan container: its output, exit code and the wall-clock and idle-output timeouts.
+
+    cd scanning && python -m pytest src/test
+"""
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.scan_process as scan_process
+import util.semgrep_scan as semgrep_scan
+from util.scan_process import TIMEOUT_EXIT_CODE, ScanProcessResult, run_scan_process
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+def test_output_is_logged_and_the_exit_code_kept(tmp_path):
+    log_path = str(tmp_path / "scan.log")
+
+    result = run_scan_process(python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"), log_path, echo=False)
+
+    assert (result.returncode, result.timed_out) == (3, None)
+    assert result.bytes_logged == 8
+    assert result.time_to_first_output is not None
+    with open(log_path, 'rb') as f:
+        assert sorted(f.read().split()) == [b"err", b"out"]
+
+def test_no_output(tmp_path):
+    result = run_scan_process(python("pass"), echo=False)
+
+    assert (result.returncode, result.bytes_logged, result.time_to_first_output) == (0, 0, None)
+
+def test_idle_process_is_stopped(tmp_path):
+    result = run_scan_process(python("import time; print('started', flush=True); time.sleep(30)"), idle_timeout=0.5, echo=False)
+
+    assert (result.returncode, result.timed_out) == (TIMEOUT_EXIT_CODE, "idle-output")
+    assert result.bytes_logged == len("started\n")
+    assert result.duration < 10
+
+def test_output_resets_the_idle_timeout():
+    code = "import time\nfor _ in range(6):\n    print('.', flush=True)\n    time.sleep(0.2)"
+
+    result = run_scan_process(python(code), idle_timeout=1, echo=False)
+
+    assert (result.returncode, result.timed_out) == (0, None)
+
+def test_busy_process_is_stopped_at_the_wall_clock_timeout():
+    code = "import time\nwhile True:\n    print('.', flush=True)\n    time.sleep(0.1)"
+
+    result = run_scan_process(python(code), timeout=0.5, idle_timeout=5, echo=False)
+
+    assert (result.returncode, result.timed_out) == (TIMEOUT_EXIT_CODE, "wall-clock")
+    assert result.duration < 10
+
+def test_timed_out_container_is_stopped_through_docker(monkeypatch):
+    stopped = []
+    monkeypatch.setattr(scan_process.subprocess, "run", lambda argv, **kwargs: stopped.append(argv))
+
+    result = run_scan_process(python("import time; time.sleep(30)"), idle_timeout=0.3, container_name="semgrep-1-abc", echo=False)
+
+    assert result.timed_out == "idle-output"
+    assert stopped == [["docker", "stop", "--time", str(scan_process.DOCKER_STOP_GRACE_PERIOD), "semgrep-1-abc"]]
+
+def test_echoed_output_comes_after_earlier_prints():
+    # the scan output goes straight to stdout's binary buffer, so text still pending in a block buffered stdout
+    # (as set up here) would come out after it
+    code = "\n".join([
+        "import io, sys",
+        "sys.stdout = io.TextIOWrapper(io.BufferedWriter(io.FileIO(1, 'w', closefd=False)))",
+        f"sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})",
+        "from util.scan_process import run_scan_process",
+        "print('before')",
+        f"run_scan_process([{sys.executable!r}, '-c', 'print(\"scan\")'])",
+    ])
+
+    output = subprocess.run(python(code), stdout=subprocess.PIPE, check=True).stdout
+
+    assert output.split() == [b"before", b"scan"]
+
+def test_run_command_returns_the_result_and_skips_unset_variables(tmp_path, monkeypatch):
+    calls = []
+    result = ScanProcessResult(returncode=1, duration=1.0, time_to_first_output=None, bytes_logged=0)
+    monkeypatch.setattr(semgrep_scan, "run_scan_process", lambda argv, **kwargs: calls.append((argv, kwargs)) or result)
+    config = SimpleNamespace(build_buildid="7", scan_target_path="/src", output_directory=str(tmp_path), scan_timeout=0, scan_idle_timeout=0)
+
+    assert semgrep_scan.run_command(["semgrep", "ci"], {"SEMGREP_PR_ID": None, "SEMGREP_BRANCH": "main"}, config) is result
+
+    argv, kwargs = calls[0]
+    assert "SEMGREP_BRANCH" in argv and "SEMGREP_PR_ID" not in argv
+    assert kwargs["env"]["SEMGREP_BRANCH"] == "main"
+    assert kwargs["env"].get("SEMGREP_PR_ID") != "None"
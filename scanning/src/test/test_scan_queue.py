@@ -0,0 +1,87 @@
+"""
+The scan orchestrator's job queue: enqueueing, starting, requeueing and resuming jobs.
+
+    cd scanning && python -m pytest src/test
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.scan_queue import DONE, FAILED, PENDING, RUNNING, ScanQueue
+
+CONFIGS = [{"repository_id": "r1", "jobs": 2}, {"repository_id": "r2"}, {"repository_id": "r3"}]
+
+def states(queue, batch):
+    return dict(queue.conn.execute("SELECT repository_id, state FROM jobs WHERE batch = ?", (batch,)).fetchall())
+
+def test_enqueue_only_adds_missing_repositories(tmp_path):
+    queue = ScanQueue(str(tmp_path / "queue.db"))
+
+    assert queue.enqueue("batch", CONFIGS[:2]) == 2
+    assert queue.enqueue("batch", CONFIGS) == 1
+    # another batch queues the same repositories again
+    assert queue.enqueue("other", CONFIGS) == 3
+
+    pending = queue.pending("batch")
+    assert [job.repository_id for job in pending] == ["r1", "r2", "r3"]
+    assert pending[0].config == {"repository_id": "r1", "jobs": 2}
+    queue.close()
+
+def test_finished_jobs_are_not_run_again(tmp_path):
+    queue = ScanQueue(str(tmp_path / "queue.db"))
+    queue.enqueue("batch", CONFIGS)
+    first, second, third = queue.pending("batch")
+
+    queue.start(first)
+    queue.start(second)
+    queue.finish(first, 0, True, peak_memory_mb=512.0)
+    queue.finish(second, 2, False)
+
+    assert [job.repository_id for job in queue.pending("batch")] == ["r3"]
+    assert states(queue, "batch") == {"r1": DONE, "r2": FAILED, "r3": PENDING}
+    assert queue.summary("batch") == {DONE: 1, FAILED: 1, PENDING: 1}
+    row = queue.conn.execute("SELECT exit_code, peak_memory_mb, attempts FROM jobs WHERE id = ?", (first.id,)).fetchone()
+    assert row == (0, 512.0, 1)
+
+    # enqueueing the batch again after it finished adds nothing
+    assert queue.enqueue("batch", CONFIGS) == 0
+    queue.close()
+
+def test_requeued_job_runs_again(tmp_path):
+    queue = ScanQueue(str(tmp_path / "queue.db"))
+    queue.enqueue("batch", CONFIGS[:1])
+    job = queue.pending("batch")[0]
+
+    queue.start(job)
+    assert queue.pending("batch") == []
+    queue.requeue(job)
+
+    requeued = queue.pending("batch")
+    assert [requeued_job.id for requeued_job in requeued] == [job.id]
+    assert requeued[0].attempts == 1
+    queue.close()
+
+def test_resume_puts_interrupted_jobs_back_in_the_queue(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = ScanQueue(path)
+    queue.enqueue("batch", CONFIGS)
+    queue.enqueue("other", CONFIGS[:1])
+    first, second, _ = queue.pending("batch")
+    queue.start(first)
+    queue.start(second)
+    queue.finish(second, 1, True)
+    queue.start(queue.pending("other")[0])
+    # the orchestrator was killed, its connection is gone
+    queue.close()
+
+    queue = ScanQueue(path)
+    assert states(queue, "batch")["r1"] == RUNNING
+
+    assert queue.resume("batch") == 1
+    assert [job.repository_id for job in queue.pending("batch")] == ["r1", "r3"]
+    assert states(queue, "batch")["r2"] == DONE
+    # only the resumed batch's jobs are touched
+    assert states(queue, "other") == {"r1": RUNNING}
+    assert queue.resume("batch") == 0
+    queue.close()
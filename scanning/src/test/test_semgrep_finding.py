@@ -0,0 +1,82 @@
+"""
+The Finding model against the helpers reading the raw semgrep json, on the sample findings in test/data.
+
+    cd scanning && python -m pytest src/test
+"""
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.semgrep_finding as futil
+from util.semgrep_finding import Finding
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+REPO = {"name": "org/repo", "url": "https://example.com/org/repo", "branch": "main"}
+
+# only read from supply chain findings, a code finding's raw json doesn't have them and its Finding has None
+SCA_HELPERS = [futil.sca_package, futil.sca_semver_range, futil.sca_cve]
+
+HELPERS = [
+    futil.finding_to_cwe_brief, futil.is_sca, futil.is_sca_reachable, futil.is_secrets, futil.semgrep_url, futil.reference_links, futil.semgrep_policy,
+    futil.confidence, futil.severity, futil.message, futil.start_line, futil.start_line_col, futil.end_line,
+    futil.end_line_col, futil.path, futil.fingerprint, futil.rule_id, futil.rule_id_brief, futil.is_commentable,
+    lambda finding: futil.group_key(finding, REPO),
+    futil.finding_to_issue_summary,
+    lambda finding: futil.finding_to_issue_summary(finding, include_product_tag=True),
+    lambda finding: futil.finding_to_issue_description(finding, REPO),
+]
+
+def sample_findings():
+    params = []
+    for name in ("cookie.json", "python-jose.json"):
+        with open(os.path.join(DATA_DIRECTORY, name)) as f:
+            for index, result in enumerate(json.load(f)["results"]):
+                params.append(pytest.param(result, id=f"{name}[{index}]"))
+    with open(os.path.join(DATA_DIRECTORY, "finding.json")) as f:
+        params.append(pytest.param(json.load(f), id="finding.json"))
+    return params
+
+def outcome(helper, finding):
+    try:
+        return helper(finding)
+    except (KeyError, IndexError, TypeError) as e:
+        return type(e)
+
+@pytest.mark.parametrize("result", sample_findings())
+@pytest.mark.parametrize("helper", HELPERS)
+def test_finding_matches_the_raw_json(helper, result):
+    assert outcome(helper, Finding.from_json(result)) == outcome(helper, result)
+
+@pytest.mark.parametrize("result", sample_findings())
+@pytest.mark.parametrize("helper", SCA_HELPERS)
+def test_supply_chain_fields(helper, result):
+    finding = Finding.from_json(result)
+
+    if futil.is_sca(result):
+        assert helper(finding) == helper(result)
+    else:
+        assert helper(finding) is None
+
+def test_samples_cover_code_and_supply_chain():
+    findings = [Finding.from_json(param.values[0]) for param in sample_findings()]
+
+    assert {finding.product for finding in findings} == {futil.PRODUCT_CODE, futil.PRODUCT_SCA}
+    assert [finding.severity for finding in findings] == ["Medium", "High", "Medium", "Medium"]
+
+def test_unmapped_severity_raises():
+    with open(os.path.join(DATA_DIRECTORY, "cookie.json")) as f:
+        result = copy.deepcopy(json.load(f)["results"][0])
+    result["extra"]["severity"] = "UNKNOWN"
+
+    finding = Finding.from_json(result)
+
+    assert finding.severity is None
+    with pytest.raises(KeyError):
+        futil.severity(finding)
+    with pytest.raises(KeyError):
+        futil.severity(result)
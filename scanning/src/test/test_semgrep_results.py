@@ -0,0 +1,60 @@
+"""
+Incremental reading of semgrep's json output against json.load, down to one character per read.
+
+    cd scanning && python -m pytest src/test
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.semgrep_results as semgrep_results
+
+FINDING = {
+    "check_id": "python.lang.security.audit.eval-detected.eval-detected",
+    "path": "/src/app.py",
+    "start": {"line": 12, "col": 5, "offset": 301},
+    "end": {"line": 12, "col": 33, "offset": 329},
+    "extra": {
+        "message": "Detected the use of eval(). Escape `\\` and \"quotes\" before {formatting} [it].",
+        "metadata": {"cwe": ["CWE-95"], "confidence": "LOW"},
+        "severity": "WARNING",
+        "fingerprint": "3e5b0c_0",
+        "lines": "    return eval(expression)\n",
+        "is_ignored": False,
+    },
+}
+
+def results_file(tmp_path):
+    output = {
+        "version": "1.2.3",
+        "results": [FINDING, {"check_id": "numbers", "values": [0, -1, 12.5, -0.25, 1e3, 2.5E-7, 10e+2, 123456789012], "flags": [True, False, None]}],
+        "errors": [{"level": "warn", "message": "a \"quoted\" [bracket] {brace}"}],
+        "time": {"targets": [{"path": "/src/a.py", "run_time": 0.125, "num_bytes": 2048, "match_times": [1.5e-3, 0.25]}]},
+        "paths": {"scanned": ["a.py", "b/c.py"]},
+        "skipped_rules": [],
+    }
+    path = tmp_path / "semgrep-results.json"
+    # indent and compact separators put numbers both right before whitespace and right before `,` `]` `}`
+    path.write_text(json.dumps(output, indent=2) + "\n", encoding="utf-8")
+    compact = tmp_path / "semgrep-results-compact.json"
+    compact.write_text(json.dumps(output, separators=(",", ":")), encoding="utf-8")
+    return output, [path, compact]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, semgrep_results.CHUNK_SIZE])
+def test_results_and_sections_match_json_load(tmp_path, chunk_size):
+    output, paths = results_file(tmp_path)
+    for path in paths:
+        assert list(semgrep_results.iter_results(path, chunk_size)) == output["results"]
+        sections = semgrep_results.read_sections(path, ("errors", "time", "paths", "version"), chunk_size)
+        assert sections == {name: output[name] for name in ("errors", "time", "paths", "version")}
+
+def test_number_split_across_reads(tmp_path):
+    # with one character per read the buffer ends after `1`, `1.`, `1.5`, `1.5e` ... of each number
+    path = tmp_path / "semgrep-results.json"
+    path.write_text('{"results": [1.5e-3, 42, -7.25], "time": 100.5}', encoding="utf-8")
+    assert list(semgrep_results.iter_results(path, chunk_size=1)) == [1.5e-3, 42, -7.25]
+    assert semgrep_results.read_sections(path, ("time",), chunk_size=1) == {"time": 100.5}
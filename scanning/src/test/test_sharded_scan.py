@@ -0,0 +1,140 @@
+"""
+Shard planning and the merge of shard results.
+
+    cd scanning && python -m pytest src/test
+"""
+import fnmatch
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import util.sharded_scan as sharded
+
+def shard_weights(shards, files):
+    total_files, total_bytes = len(files), sum(files.values())
+    return [shard.files / total_files + shard.bytes / total_bytes for shard in shards]
+
+def test_every_file_is_in_exactly_one_shard():
+    files = {f"{directory}/{index}.py": 100 for directory in "abcdef" for index in range(10)}
+    files["setup.py"] = 100
+
+    shards = sharded.plan_shards(files, 3)
+
+    assert len(shards) == 3
+    owners = {path: [shard for shard in shards if any(path == unit or path.startswith(unit + "/") for unit in shard.paths)] for path in files}
+    assert all(len(owner) == 1 for owner in owners.values())
+    assert sum(shard.files for shard in shards) == len(files)
+    assert sum(shard.bytes for shard in shards) == sum(files.values())
+
+def test_equal_directories_are_packed_evenly():
+    files = {f"{directory}/{index}.py": 100 for directory in "abcd" for index in range(10)}
+
+    shards = sharded.plan_shards(files, 2)
+
+    assert sorted(len(shard.paths) for shard in shards) == [2, 2]
+    assert [shard.files for shard in shards] == [20, 20]
+
+def test_heaviest_units_go_to_the_lightest_shard():
+    # weights 6, 5, 4, 3, 2: greedy packing gives {6, 3, 2} and {5, 4}
+    files = {f"{directory}/{index}.py": 100 for directory, count in zip("abcde", (6, 5, 4, 3, 2)) for index in range(count)}
+
+    shards = sharded.plan_shards(files, 2)
+
+    assert sorted(sorted(shard.paths) for shard in shards) == [["a", "d", "e"], ["b", "c"]]
+
+def test_directories_heavier_than_a_shard_are_split():
+    files = {f"big/{sub}/{index}.py": 100 for sub in "xyz" for index in range(10)}
+    files.update({f"small/{index}.py": 100 for index in range(5)})
+
+    shards = sharded.plan_shards(files, 3)
+
+    units = sorted(path for shard in shards for path in shard.paths)
+    assert units == ["big/x", "big/y", "big/z", "small"]
+    assert max(shard_weights(shards, files)) < 2 / 3 + 0.3
+
+def test_large_files_weigh_more_than_their_count():
+    files = {"huge.min.js": 10_000_000}
+    files.update({f"src/{index}.py": 100 for index in range(50)})
+
+    shards = sharded.plan_shards(files, 2)
+
+    assert sorted(sorted(shard.paths) for shard in shards) == [["huge.min.js"], ["src"]]
+
+def test_fewer_shards_than_asked_when_there_are_fewer_units():
+    assert [shard.paths for shard in sharded.plan_shards({"a.py": 10}, 4)] == [["a.py"]]
+    assert sharded.plan_shards({}, 4) == []
+
+def test_include_args_are_anchored_and_escaped():
+    shard = sharded.Shard(paths=["src", "weird/file[1]*?.py"])
+
+    args = shard.include_args()
+
+    assert args == ["--include", "/src", "--include", "/weird/file[[]1][*][?].py"]
+    pattern = args[3]
+    assert fnmatch.fnmatchcase("/weird/file[1]*?.py", pattern)
+    assert not fnmatch.fnmatchcase("/weird/file1xy.py", pattern)
+
+def finding(fingerprint, path):
+    return {"check_id": "rule", "path": path, "extra": {"fingerprint": fingerprint}}
+
+def write_shard(tmp_path, name, results, scanned, skipped=(), errors=()):
+    path = tmp_path / name
+    path.write_text(json.dumps({
+        "results": results,
+        "errors": list(errors),
+        "paths": {"scanned": scanned, "skipped": list(skipped)},
+        "version": "1.90.0",
+    }), encoding="utf-8")
+    return str(path)
+
+def test_merge_removes_duplicate_findings_and_keeps_errors(tmp_path):
+    shard_0 = write_shard(tmp_path, "shard-0.json", [finding("f1", "a.py"), finding("f2", "a.py")], ["a.py"], errors=[{"message": "e0"}])
+    shard_1 = write_shard(tmp_path, "shard-1.json", [finding("f2", "a.py"), finding("f3", "b.py")], ["b.py"], errors=[{"message": "e1"}])
+    output = str(tmp_path / "semgrep-results.json")
+
+    count = sharded.merge_results(output, [shard_0, shard_1])
+
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert count == 3
+    assert [result["extra"]["fingerprint"] for result in merged["results"]] == ["f1", "f2", "f3"]
+    assert merged["errors"] == [{"message": "e0"}, {"message": "e1"}]
+    assert merged["paths"]["scanned"] == ["a.py", "b.py"]
+    assert merged["version"] == "1.90.0"
+
+def test_merge_only_lists_files_no_shard_scanned_as_skipped(tmp_path):
+    mismatch = sharded.INCLUDE_MISMATCH_REASON
+    shard_0 = write_shard(tmp_path, "shard-0.json", [], ["a.py"], skipped=[
+        {"path": "b.py", "reason": mismatch},
+        {"path": "huge.js", "reason": "exceeded_size_limit"},
+    ])
+    shard_1 = write_shard(tmp_path, "shard-1.json", [], ["b.py"], skipped=[
+        {"path": "a.py", "reason": mismatch},
+        {"path": "huge.js", "reason": mismatch},
+        {"path": "vendor/x.js", "reason": "semgrepignore_patterns_match"},
+    ])
+    output = str(tmp_path / "semgrep-results.json")
+
+    sharded.merge_results(output, [shard_1, shard_0])
+
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert merged["paths"]["skipped"] == [
+        {"path": "huge.js", "reason": "exceeded_size_limit"},
+        {"path": "vendor/x.js", "reason": "semgrepignore_patterns_match"},
+    ]
+
+@pytest.mark.parametrize("exit_codes, expected", [
+    ([0, 0], 0),
+    ([0, 1], 1),
+    ([1, 0, 1], 1),
+    ([0, 2, 1], 2),
+    ([137, 1, 2], 137),
+    ([], 0),
+])
+def test_combined_exit_code(exit_codes, expected):
+    assert sharded.combined_exit_code(exit_codes) == expected
@@ -1,38 +1,72 @@
+import functools
 import re
 import json
 
 from azure.devops.connection import Connection
+from azure.devops.exceptions import AzureDevOpsClientRequestError
 from azure.devops.v7_0.git.git_client import GitClient
 from azure.devops.v7_0.git.models import GitPullRequestSearchCriteria, GitPullRequestStatus, Comment, CommentThread, CommentThreadContext, CommentPosition
 from msrest.authentication import BasicAuthentication
 
-from config.settings import AzureDevOpsConfig
+from config.settings import get_azure_devops_config
+from util.comment_publisher import CommentPublisher, track_responses
 import util.semgrep_finding as futil
 
-azure_devops_config = AzureDevOpsConfig()
-build_pipeline_url = f"{azure_devops_config.organization_url}/{azure_devops_config.build_pipeline_project_name}/_build/results?buildId={azure_devops_config.build_buildid}"
+COMMENT_JSON_PATTERN = re.compile(r"<!--(\{.*?\})-->")
 
-credentials = BasicAuthentication('', azure_devops_config.azure_token)
-connection = Connection(base_url=azure_devops_config.organization_url, creds=credentials)
-git_client: GitClient = connection.clients.get_git_client()
+# group keys already posted to each PR, loaded from the PR's comment threads once per run
+pr_comment_keys = {}
+
+def get_credentials():
+    return BasicAuthentication('', get_azure_devops_config().azure_token)
+
+@functools.cache
+def get_git_client() -> GitClient:
+    # building the client looks up the organization's resource areas over the network, so it's only
+    # built the first time it's needed, and scans that never talk to Azure DevOps don't build it at all
+    connection = Connection(base_url=get_azure_devops_config().organization_url, creds=get_credentials())
+    git_client = connection.clients.get_git_client()
+    git_client.config.hooks.append(track_responses)
+    return git_client
+
+@functools.cache
+def get_comment_git_client() -> GitClient:
+    # CommentPublisher retries failed posts itself, honoring Retry-After and its rate limit, so the client it posts with
+    # has msrest's own retries turned off rather than retrying each of the publisher's attempts again. it's a client of
+    # its own since msrest applies the retry policy to every session it creates from the client's config
+    git_client = GitClient(base_url=get_git_client().config.base_url, creds=get_credentials())
+    disable_retries(git_client)
+    git_client.config.hooks.append(track_responses)
+    return git_client
+
+def disable_retries(client):
+    """Makes every request of an azure-devops client a single attempt, responses are returned whatever their status."""
+    retry_policy = client.config.retry_policy
+    retry_policy.retries = 0
+    # server errors are handed back as responses rather than retried, or failing as retries exhausted
+    retry_policy.policy.status_forcelist = []
+
+def build_pipeline_url():
+    azure_devops_config = get_azure_devops_config()
+    return f"{azure_devops_config.organization_url}/{azure_devops_config.build_pipeline_project_name}/_build/results?buildId={azure_devops_config.build_buildid}"
 
 def add_pr_status(pull_request_id, status):
     if status == "pending":
-        return git_client.create_pull_request_status(
+        return get_git_client().create_pull_request_status(
             status=scan_pending_status(),
-            repository_id=azure_devops_config.repository_id,
+            repository_id=get_azure_devops_config().repository_id,
             pull_request_id=pull_request_id
         )
     elif status == "completed":
-        return git_client.create_pull_request_status(
+        return get_git_client().create_pull_request_status(
             status=scan_success_status(),
-            repository_id=azure_devops_config.repository_id,
+            repository_id=get_azure_devops_config().repository_id,
             pull_request_id=pull_request_id
         )
     elif status == "failed":
-        return git_client.create_pull_request_status(
+        return get_git_client().create_pull_request_status(
             status=scan_fail_status(),
-            repository_id=azure_devops_config.repository_id,
+            repository_id=get_azure_devops_config().repository_id,
             pull_request_id=pull_request_id
         )
 
@@ -43,7 +77,7 @@ def scan_pending_status():
     return GitPullRequestStatus(
         state="pending",  # or "failed", "pending"
         description="Semgrep scan is in progress.",
-        target_url=build_pipeline_url,  # URL to the details of the build or status
+        target_url=build_pipeline_url(),  # URL to the details of the build or status
         context={
             "name": "build",  # Context of the status (e.g., build, CI, approval)
             "genre": "continuous-integration"
@@ -54,7 +88,7 @@ def scan_success_status():
     return GitPullRequestStatus(
         state="succeeded",  # or "failed", "succeeded"
         description="Semgrep completed successfully. No blocking findings.",
-        target_url=build_pipeline_url,  # URL to the details of the build or status
+        target_url=build_pipeline_url(),  # URL to the details of the build or status
         context={
             "name": "build",  # Context of the status (e.g., build, CI, approval)
             "genre": "continuous-integration"
@@ -65,7 +99,7 @@ def scan_fail_status():
     return GitPullRequestStatus(
         state="failed",  # or "failed", "succeeded"
         description="Semgrep returned blocking findings. Please review and fix the issues.",
-        target_url=build_pipeline_url,  # URL to the details of the build or status
+        target_url=build_pipeline_url(),  # URL to the details of the build or status
         context={
             "name": "build",  # Context of the status (e.g., build, CI, approval)
             "genre": "continuous-integration"
@@ -73,31 +107,63 @@ def scan_fail_status():
     )
 
 def get_pr(pull_request_id: int, source_ref_name=None, target_ref_name=None):
-    pull_requests = get_prs(source_ref_name, target_ref_name)
+    # the PR is only interesting to us while it's still active
+    try:
+        pr = get_git_client().get_pull_request(
+            get_azure_devops_config().repository_id,
+            pull_request_id,
+            project=get_azure_devops_config().repository_project_name
+        )
+        if pr is not None and is_matching_pr(pr, source_ref_name, target_ref_name):
+            return pr
+        return None
+    except AzureDevOpsClientRequestError as e:
+        print(f"Unable to look up PR #{pull_request_id} directly, falling back to searching the repository's active PRs: {e}")
+
+    pull_requests = get_prs(source_ref_name, target_ref_name, repository_id=get_azure_devops_config().repository_id)
     for pr in pull_requests:
         if pr.pull_request_id == pull_request_id:
             return pr
 
     return None
+
+def is_matching_pr(pr, source_ref_name=None, target_ref_name=None):
+    if pr.status != "active":
+        return False
+    if source_ref_name is not None and pr.source_ref_name != source_ref_name:
+        return False
+    if target_ref_name is not None and pr.target_ref_name != target_ref_name:
+        return False
+    return True
         
-def get_prs(source_ref_name=None, target_ref_name=None):
+def get_prs(source_ref_name=None, target_ref_name=None, repository_id=None, status="active"):
     # Prepare search criteria for pull requests
     search_criteria = GitPullRequestSearchCriteria(
+        repository_id=repository_id,
         source_ref_name=source_ref_name,
         target_ref_name=target_ref_name,
+        status=status,
     )
 
+    # search a single repository when we know which one we're after, otherwise list across the project
+    if repository_id is not None:
+        return get_git_client().get_pull_requests(
+            repository_id,
+            search_criteria,
+            project=get_azure_devops_config().repository_project_name
+        )
+
     # List pull requests
-    return git_client.get_pull_requests_by_project(
-        project=azure_devops_config.repository_project_name,
+    return get_git_client().get_pull_requests_by_project(
+        project=get_azure_devops_config().repository_project_name,
         search_criteria=search_criteria
     )
 
 def get_comment_threads(pull_request_id):
-    return git_client.get_threads(
-        azure_devops_config.repository_id,
+    return get_git_client().get_threads(
+        get_azure_devops_config().repository_id,
         pull_request_id,
-        project=azure_devops_config.repository_project_name
+        project=get_azure_devops_config().repository_project_name
     )
 
 def add_comment(pull_request_id, finding):
@@ -110,17 +176,29 @@ def add_comment(pull_request_id, finding):
         status=1 # Active
     )
 
-    git_client.create_thread(
+    get_git_client().create_thread(
         thread,
-        azure_devops_config.repository_id,
+        get_azure_devops_config().repository_id,
         pull_request_id,
-        project=azure_devops_config.repository_project_name
+        project=get_azure_devops_config().repository_project_name
     )
 
 def add_inline_comment(pull_request_id, finding):
+    get_git_client().create_thread(
+        inline_comment_thread(finding),
+        get_azure_devops_config().repository_id,
+        pull_request_id,
+        project=get_azure_devops_config().repository_project_name
+    )
+
+    # keep the index in sync so later findings with the same key aren't posted twice
+    if pull_request_id in pr_comment_keys:
+        pr_comment_keys[pull_request_id].add(finding_group_key(finding))
+
+def inline_comment_thread(finding):
     comment = comment_from_finding(finding)
 
-    thread = CommentThread(
+    return CommentThread(
         comments=[Comment(
             content=comment['message'],
             comment_type="text"
@@ -139,15 +217,23 @@ def add_inline_comment(pull_request_id, finding):
         )
     )
 
-    git_client.create_thread(
-        thread,
-        azure_devops_config.repository_id,
-        pull_request_id,
-        project=azure_devops_config.repository_project_name
+def publish_inline_comments(pull_request_id, findings):
+    publisher = CommentPublisher(
+        get_comment_git_client(),
+        get_azure_devops_config().repository_id,
+        get_azure_devops_config().repository_project_name,
+        max_workers=get_azure_devops_config().pr_comment_concurrency,
+        rate_limit=get_azure_devops_config().pr_comment_rate_limit,
+        max_retries=get_azure_devops_config().pr_comment_max_retries
     )
+    comments = ((finding_group_key(finding), inline_comment_thread(finding)) for finding in findings)
+    return publisher.publish(pull_request_id, comments, get_pr_existing_keys(pull_request_id))
+
+def finding_group_key(finding):
+    return futil.group_key(finding, {"name": get_azure_devops_config().build_repository_name})
 
 def comment_hidden_group_key(finding):
-    group_key = futil.group_key(finding, {"name": azure_devops_config.build_repository_name})
+    group_key = finding_group_key(finding)
     hidden_data = json.dumps({"group_key": group_key})
     return f"\n\n<!--{hidden_data}-->"
 
@@ -187,8 +273,7 @@ def comment_from_finding(finding):
 
 def parse_comment_json(comment):
     try:
-        pattern = r"<!--(\{.*?\})-->"
-        match = re.search(pattern, comment.content)
+        match = COMMENT_JSON_PATTERN.search(comment.content)
     
         if match:
             json_str = match.group(1)
@@ -202,19 +287,24 @@ def parse_comment_json(comment):
         print(f"    - Comment: {comment}")
         return {}
     
-def get_pr_existing_keys(pr):
+def load_pr_existing_keys(pr):
     threads = get_comment_threads(pr)
-    keys = []
+    keys = set()
 
     for thread in threads:
         for comment in thread.comments:
             parsed_content = parse_comment_json(comment)
             if 'group_key' in parsed_content:
-                keys.append(parsed_content.get('group_key'))
+                keys.add(parsed_content.get('group_key'))
     
     return keys
 
+def get_pr_existing_keys(pr):
+    # threads are only fetched and parsed the first time a PR is looked up during a run
+    if pr not in pr_comment_keys:
+        pr_comment_keys[pr] = load_pr_existing_keys(pr)
+
+    return pr_comment_keys[pr]
+
 def has_existing_comment(pr, finding):
-    group_key = futil.group_key(finding, {"name": azure_devops_config.build_repository_name})
-    existing_keys = get_pr_existing_keys(pr)
-    return group_key in existing_keys
\ No newline at end of file
+    return finding_group_key(finding) in get_pr_existing_keys(pr)
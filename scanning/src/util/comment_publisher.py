@@ -0,0 +1,189 @@
+"""
+Posts PR comment threads concurrently, within a rate limit, retrying throttled and transient failures.
+
+The publisher only depends on the `create_thread` method of the azure-devops `GitClient`, so any object
+exposing the same method can stand in for it.
+"""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+STATUS_CODE_PATTERN = re.compile(r"returned a (\d{3}) status code")
+
+# status and Retry-After of the last response seen by each thread, see track_responses
+_last_response = threading.local()
+
+def track_responses(response, *args, **kwargs):
+    """
+    requests response hook. The azure-devops client raises errors without the response attached, so this
+    remembers the status code and Retry-After header of the calling thread's last response.
+    Register it with `git_client.config.hooks.append(track_responses)`.
+    """
+    _last_response.status_code = response.status_code
+    _last_response.retry_after = response.headers.get('Retry-After')
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average with bursts of up to `capacity`.
+    A rate of 0 or less disables limiting.
+    """
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = self.clock()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, seconds):
+        # the server asked us to slow down, so hold back every worker and not just the throttled one
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+@dataclass
+class PublishSummary:
+    posted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    retries: int = 0
+    failures: list = field(default_factory=list)
+
+    def log(self, pull_request_id):
+        print(f"PR #{pull_request_id} comment summary: {self.posted} posted, {self.skipped} skipped (already commented), {self.failed} failed, {self.retries} retries")
+        for key, error in self.failures:
+            print(f"    - failed to post comment for {key}: {error}")
+
+class CommentPublisher:
+    def __init__(self, git_client, repository_id, project, max_workers=4, rate_limit=5.0, max_retries=5,
+                 backoff_base=1.0, backoff_max=60.0, sleep=time.sleep, clock=time.monotonic):
+        self.git_client = git_client
+        self.repository_id = repository_id
+        self.project = project
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate_limit, clock=clock, sleep=sleep)
+        self.lock = threading.Lock()
+
+    def publish(self, pull_request_id, comments, existing_keys):
+        """
+        Posts each (group_key, CommentThread) in `comments` whose key isn't in `existing_keys`.
+        Keys of successfully posted threads are added to `existing_keys`.
+        """
+        summary = PublishSummary()
+        queued_keys = set()
+        # bound the number of queued threads so a huge result set isn't turned into futures all at once
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def post(key, thread):
+            try:
+                self._post_with_retry(pull_request_id, key, thread, existing_keys, summary)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pr-comments") as executor:
+            for key, thread in comments:
+                if key in existing_keys or key in queued_keys:
+                    summary.skipped += 1
+                    continue
+
+                queued_keys.add(key)
+                in_flight.acquire()
+                executor.submit(post, key, thread)
+
+        summary.log(pull_request_id)
+        return summary
+
+    def _post_with_retry(self, pull_request_id, key, thread, existing_keys, summary):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                _last_response.status_code = None
+                _last_response.retry_after = None
+                self.git_client.create_thread(thread, self.repository_id, pull_request_id, project=self.project)
+                with self.lock:
+                    existing_keys.add(key)
+                    summary.posted += 1
+                print(f"Posted to PR #{pull_request_id} comment for new finding: {key}")
+                return
+            except Exception as e:
+                status_code, retry_after = failure_details(e)
+                if status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    with self.lock:
+                        summary.failed += 1
+                        summary.failures.append((key, e))
+                    return
+
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if status_code == 429:
+                    self.bucket.pause(delay)
+                print(f"Posting comment for {key} returned {status_code}, retrying in {delay:.1f}s")
+                with self.lock:
+                    summary.retries += 1
+                attempt += 1
+                self.sleep(delay)
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+def failure_details(error):
+    """
+    Returns the (status code, Retry-After seconds) for a failed request, either of which may be None.
+    Looks at the error's own attributes and response first, then at the last response tracked for this thread.
+    """
+    response = getattr(error, 'response', None)
+    status_code = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = getattr(error, 'retry_after', None) or headers.get('Retry-After')
+
+    if status_code is None:
+        status_code = getattr(_last_response, 'status_code', None)
+        retry_after = retry_after or getattr(_last_response, 'retry_after', None)
+    if status_code is None:
+        match = STATUS_CODE_PATTERN.search(str(error))
+        status_code = int(match.group(1)) if match else None
+
+    return status_code, parse_retry_after(retry_after)
+
+def parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    # Retry-After may also be an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
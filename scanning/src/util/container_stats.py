@@ -0,0 +1,85 @@
+"""
+Peak memory of running semgrep containers, sampled with `docker stats`.
+
+Containers are named `semgrep-<build id>-<random>` (see run_command), so the containers of one scan share their name
+up to the random suffix. A sharded scan runs several containers at once, so each sample adds up the memory of every
+container of a scan, and only the highest total seen per scan is kept. Sampling runs in a background thread.
+"""
+import re
+import subprocess
+import threading
+
+MEMORY_PATTERN = re.compile(r"([\d.]+)\s*([a-zA-Z]*)")
+MEMORY_UNITS_MB = {
+    "b": 1 / (1024 * 1024),
+    "kb": 1000 / (1024 * 1024), "kib": 1 / 1024,
+    "mb": 1000 * 1000 / (1024 * 1024), "mib": 1,
+    "gb": 1000 * 1000 * 1000 / (1024 * 1024), "gib": 1024,
+    "tb": 1000 ** 4 / (1024 * 1024), "tib": 1024 * 1024,
+}
+
+def parse_memory_mb(value):
+    """Parses a docker stats memory value like `1.5GiB` into MB, None if it can't be parsed."""
+    match = MEMORY_PATTERN.match(value.strip())
+    if not match:
+        return None
+    unit = MEMORY_UNITS_MB.get(match.group(2).lower() or "b")
+    return float(match.group(1)) * unit if unit is not None else None
+
+def sample(name_prefix="semgrep-"):
+    """Returns {container name: memory in MB} of the running containers whose name starts with `name_prefix`."""
+    try:
+        output = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{.Name}}\t{{.MemUsage}}"],
+            check=True, capture_output=True, text=True, timeout=30
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+
+    usage = {}
+    for line in output.splitlines():
+        name, _, memory = line.partition("\t")
+        memory_mb = parse_memory_mb(memory.split("/")[0])
+        if name.startswith(name_prefix) and memory_mb is not None:
+            usage[name] = memory_mb
+    return usage
+
+def scan_name(container_name):
+    # the part of the name all containers of a scan share, `semgrep-<build id>-`
+    return container_name.rsplit("-", 1)[0] + "-"
+
+class MemorySampler:
+    def __init__(self, interval=5, name_prefix="semgrep-"):
+        self.interval = interval
+        self.name_prefix = name_prefix
+        self.peaks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="container-stats", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            totals = {}
+            for name, memory_mb in sample(self.name_prefix).items():
+                totals[scan_name(name)] = totals.get(scan_name(name), 0) + memory_mb
+            with self.lock:
+                for name, memory_mb in totals.items():
+                    self.peaks[name] = max(memory_mb, self.peaks.get(name, 0))
+            self.stopped.wait(self.interval)
+
+    def peak(self, name_prefix):
+        """
+        Highest total memory in MB the containers of one scan used at the same time, for the scans whose containers'
+        names start with `name_prefix`. None if none were seen.
+        """
+        with self.lock:
+            peaks = [memory_mb for name, memory_mb in self.peaks.items() if name.startswith(name_prefix)]
+        return max(peaks) if peaks else None
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
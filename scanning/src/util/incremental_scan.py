@@ -0,0 +1,200 @@
+"""
+State and result handling for incremental full scans.
+
+After a successful full scan we record the scanned commit and a manifest of per-file content hashes, and keep a copy
+of its results. Later scans compare the current tree against that manifest: when nothing changed the previous
+results are reused as is, otherwise semgrep runs as a diff-aware scan against the recorded commit and its findings are
+merged with the findings carried forward from the previous results.
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+
+import util.semgrep_results as semgrep_results
+
+STATE_FILE = "semgrep-incremental-state.json"
+BASELINE_RESULTS_FILE = "semgrep-incremental-results.json"
+HASH_CHUNK_SIZE = 1 << 20
+
+@dataclass
+class IncrementalState:
+    commit: str = None
+    manifest: dict = field(default_factory=dict)
+    exit_code: int = 0
+    incremental_runs: int = 0
+
+@dataclass
+class ManifestChanges:
+    changed: list
+    deleted: list
+
+    @property
+    def empty(self):
+        return not self.changed and not self.deleted
+
+def load_state(state_directory):
+    state_path = os.path.join(state_directory, STATE_FILE)
+    if not os.path.exists(state_path) or not os.path.exists(os.path.join(state_directory, BASELINE_RESULTS_FILE)):
+        return None
+
+    try:
+        with open(state_path) as f:
+            return IncrementalState(**json.load(f))
+    except (ValueError, TypeError) as e:
+        print(f"Ignoring unreadable incremental scan state {state_path}: {e}")
+        return None
+
+def save_state(state_directory, state, results_path):
+    os.makedirs(state_directory, exist_ok=True)
+    baseline_results_path = os.path.join(state_directory, BASELINE_RESULTS_FILE)
+    if os.path.abspath(results_path) != os.path.abspath(baseline_results_path):
+        shutil.copyfile(results_path, baseline_results_path)
+
+    # write then rename so an interrupted run never leaves a half written state behind
+    state_path = os.path.join(state_directory, STATE_FILE)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state.__dict__, f)
+    os.replace(state_path + ".tmp", state_path)
+
+def baseline_results_path(state_directory):
+    return os.path.join(state_directory, BASELINE_RESULTS_FILE)
+
+def build_manifest(scan_target_path):
+    """
+    Returns {relative path: content hash} for every file in the scan target.
+    Tracked files use the blob ids git already has in its index, anything else is hashed.
+    """
+    manifest = git_manifest(scan_target_path)
+    if manifest is not None:
+        return manifest
+
+    manifest = {}
+    for root, dirs, files in os.walk(scan_target_path):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.isfile(file_path):
+                manifest[os.path.relpath(file_path, scan_target_path).replace(os.sep, "/")] = hash_file(file_path)
+    return manifest
+
+def git_manifest(scan_target_path):
+    try:
+        output = git(scan_target_path, "ls-files", "--stage", "-z")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    manifest = {}
+    for entry in output.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        manifest[path] = info.split(" ")[1]
+
+    # files git doesn't track still get scanned, so they still need hashing
+    others = git(scan_target_path, "ls-files", "--others", "--exclude-standard", "-z")
+    for path in others.split("\0"):
+        if path:
+            manifest[path] = hash_file(os.path.join(scan_target_path, path))
+
+    return manifest
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def diff_manifests(previous, current):
+    changed = sorted(path for path, digest in current.items() if previous.get(path) != digest)
+    deleted = sorted(path for path in previous if path not in current)
+    return ManifestChanges(changed=changed, deleted=deleted)
+
+def git(scan_target_path, *args):
+    return subprocess.run(
+        ["git", "-C", scan_target_path, *args],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+
+def head_commit(scan_target_path):
+    try:
+        return git(scan_target_path, "rev-parse", "HEAD").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def ensure_commit_available(scan_target_path, commit):
+    """
+    Diff-aware scans need the baseline commit and a merge base with HEAD in the local clone.
+    Fetches the commit if the (usually shallow) clone doesn't have it, returns whether it can be used.
+    """
+    try:
+        git(scan_target_path, "cat-file", "-e", f"{commit}^{{commit}}")
+    except subprocess.CalledProcessError:
+        try:
+            git(scan_target_path, "fetch", "--no-tags", "--depth=1", "origin", commit)
+        except subprocess.CalledProcessError as e:
+            print(f"Unable to fetch baseline commit {commit}: {e.stderr.strip()}")
+            return False
+
+    try:
+        git(scan_target_path, "merge-base", commit, "HEAD")
+        return True
+    except subprocess.CalledProcessError:
+        print(f"No merge base between baseline commit {commit} and HEAD, the clone is too shallow.")
+        return False
+
+def merge_results(output_path, carried_path, new_path, deleted_paths):
+    """
+    Writes the merged results of an incremental scan to `output_path`. Findings from the previous results are carried
+    forward unless their file was deleted, findings from the new diff-aware scan are added, and findings are
+    de-duplicated by fingerprint. `paths.scanned` and `paths.skipped` come from both scans, with deleted files left out
+    and a file only skipped if it wasn't scanned. Every other section (`errors`, `time`, `skipped_rules`, `version`, ...)
+    is the new scan's.
+    """
+    deleted_paths = set(deleted_paths)
+    seen = set()
+    new_sections = semgrep_results.read_sections(new_path, None)
+    carried_sections = semgrep_results.read_sections(carried_path, ("paths",))
+    merged_path = output_path + ".tmp"
+
+    with open(merged_path, "w", encoding="utf-8") as out:
+        out.write('{"results": [')
+        count = 0
+        results = (
+            result for source in (
+                semgrep_results.iter_results(new_path),
+                (result for result in semgrep_results.iter_results(carried_path) if result.get("path") not in deleted_paths),
+            ) for result in source
+        )
+        for result in results:
+            key = result.get("extra", {}).get("fingerprint") or json.dumps(result, sort_keys=True)
+            if key in seen:
+                continue
+            seen.add(key)
+            out.write(("," if count else "") + json.dumps(result))
+            count += 1
+
+        new_paths = new_sections.pop("paths", {})
+        carried_paths = carried_sections.get("paths", {})
+        scanned = set(new_paths.get("scanned", []))
+        scanned.update(path for path in carried_paths.get("scanned", []) if path not in deleted_paths)
+        # the new scan's reason wins for a file both scans skipped
+        skipped = {entry.get("path"): entry for entry in carried_paths.get("skipped", []) + new_paths.get("skipped", [])}
+        paths = {"scanned": sorted(scanned)}
+        paths["skipped"] = [entry for path, entry in skipped.items() if path not in scanned and path not in deleted_paths]
+        if not paths["skipped"]:
+            del paths["skipped"]
+
+        new_sections.setdefault("errors", [])
+        out.write('], "paths": ' + json.dumps(paths))
+        for name, section in new_sections.items():
+            out.write(f', {json.dumps(name)}: ' + json.dumps(section))
+        out.write("}")
+
+    os.replace(merged_path, output_path)
+    return count
@@ -0,0 +1,156 @@
+"""
+Content-addressed cache of diff scan results.
+
+A diff scan's results only depend on the commit scanned, the baseline it's compared against, the flags semgrep runs
+with and the rules it runs. Each successful scan's results and exit code are stored under a hash of those and the pull
+request, so a rerun or a re-queued build of the same pull request restores them instead of running the container. A
+restored scan never reaches semgrep.dev, which is why results are only reused for the pull request that uploaded them.
+
+The rules come from the semgrep.dev policy when the scan runs and can't be fingerprinted beforehand, so the rules part
+of the key is a version the pipeline sets (bump it after changing the policy). Without one the cache isn't used at all,
+and entries also expire after a TTL so policy changes nobody bumped the version for are picked up eventually. The cache is kept under a size limit by evicting the least recently used
+entries, and hit/miss counts are kept alongside the entries.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+ENTRY_FILE = "entry.json"
+RESULTS_FILE = "semgrep-results.json"
+METRICS_FILE = "metrics.json"
+# bump when the layout of an entry changes so old entries are never restored
+CACHE_FORMAT_VERSION = 1
+
+def is_rules_version_set(rules_version):
+    # a pipeline variable that isn't defined is passed on as its own `$(NAME)` macro text
+    return bool(rules_version) and not rules_version.startswith("$(")
+
+@dataclass
+class CacheEntry:
+    exit_code: int
+    created_at: float
+    last_used_at: float
+    size: int
+
+def cache_key(repository_id, pull_request_id, head_commit, baseline_commit, semgrep_command, rules_version):
+    key = json.dumps({
+        "format": CACHE_FORMAT_VERSION,
+        "repository": repository_id,
+        "pull_request": pull_request_id,
+        "head": head_commit,
+        "baseline": baseline_commit,
+        "command": semgrep_command,
+        "rules": rules_version,
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class ScanCache:
+    def __init__(self, directory, max_size_mb=512, ttl=86400):
+        self.directory = directory
+        self.max_size = max_size_mb * 1024 * 1024
+        self.ttl = ttl
+
+    def entry_directory(self, key):
+        return os.path.join(self.directory, key)
+
+    def load_entry(self, key):
+        entry_path = os.path.join(self.entry_directory(key), ENTRY_FILE)
+        if not os.path.exists(entry_path) or not os.path.exists(os.path.join(self.entry_directory(key), RESULTS_FILE)):
+            return None
+        try:
+            with open(entry_path) as f:
+                return CacheEntry(**json.load(f))
+        except (ValueError, TypeError) as e:
+            print(f"Ignoring unreadable scan cache entry {entry_path}: {e}")
+            return None
+
+    def save_entry(self, key, entry):
+        # write then rename so an interrupted run never leaves a half written entry behind
+        entry_path = os.path.join(self.entry_directory(key), ENTRY_FILE)
+        with open(entry_path + ".tmp", "w") as f:
+            json.dump(entry.__dict__, f)
+        os.replace(entry_path + ".tmp", entry_path)
+
+    def restore(self, key, results_path):
+        """Copies the cached results for `key` to `results_path` and returns the scan's exit code, or None on a miss."""
+        entry = self.load_entry(key)
+        now = time.time()
+        if entry is not None and self.ttl > 0 and now - entry.created_at > self.ttl:
+            print(f"Scan cache entry {key[:12]} expired {int(now - entry.created_at - self.ttl)}s ago.")
+            self.remove(key)
+            self.count("expired")
+            entry = None
+
+        if entry is None:
+            self.count("misses")
+            return None
+
+        shutil.copyfile(os.path.join(self.entry_directory(key), RESULTS_FILE), results_path)
+        entry.last_used_at = now
+        self.save_entry(key, entry)
+        self.count("hits")
+        return entry.exit_code
+
+    def store(self, key, results_path, exit_code):
+        entry_directory = self.entry_directory(key)
+        os.makedirs(entry_directory, exist_ok=True)
+        shutil.copyfile(results_path, os.path.join(entry_directory, RESULTS_FILE) + ".tmp")
+        os.replace(os.path.join(entry_directory, RESULTS_FILE) + ".tmp", os.path.join(entry_directory, RESULTS_FILE))
+
+        now = time.time()
+        self.save_entry(key, CacheEntry(exit_code=exit_code, created_at=now, last_used_at=now, size=os.path.getsize(results_path)))
+        self.evict()
+
+    def remove(self, key):
+        shutil.rmtree(self.entry_directory(key), ignore_errors=True)
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return {}
+        entries = {}
+        for key in os.listdir(self.directory):
+            if os.path.isdir(self.entry_directory(key)):
+                entry = self.load_entry(key)
+                if entry is not None:
+                    entries[key] = entry
+        return entries
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in its size limit."""
+        entries = self.entries()
+        total = sum(entry.size for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].last_used_at):
+            if total <= self.max_size:
+                break
+            self.remove(key)
+            total -= entry.size
+            self.count("evictions")
+
+    def metrics(self):
+        try:
+            with open(os.path.join(self.directory, METRICS_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def count(self, name):
+        metrics = self.metrics()
+        metrics[name] = metrics.get(name, 0) + 1
+        os.makedirs(self.directory, exist_ok=True)
+        metrics_path = os.path.join(self.directory, METRICS_FILE)
+        with open(metrics_path + ".tmp", "w") as f:
+            json.dump(metrics, f)
+        os.replace(metrics_path + ".tmp", metrics_path)
+
+    def log_metrics(self):
+        metrics = self.metrics()
+        hits, misses = metrics.get("hits", 0), metrics.get("misses", 0)
+        hit_rate = hits / (hits + misses) if hits + misses else 0
+        entries = self.entries()
+        print(
+            f"Scan cache: {hits} hits, {misses} misses ({hit_rate:.0%} hit rate), {metrics.get('expired', 0)} expired, "
+            f"{metrics.get('evictions', 0)} evicted, {len(entries)} entries using {sum(entry.size for entry in entries.values()) / (1024 * 1024):.1f} MB"
+        )
@@ -0,0 +1,157 @@
+"""
+History of each repository's full scans, and the --jobs/--max-memory it picks for the next one.
+
+Every full scan records the size of the scan target (files and bytes), how long it took, the peak memory its
+containers used together, whether it timed out and the jobs and containers it ran with. A later scan of the same repository estimates the memory
+one job needs from those peaks, grown with the repository, and picks the most jobs that fit in the agent's memory,
+limited by its cores and by how many files there are to share out. Each job's --max-memory is its share of that
+memory. A scan killed for running out of memory halves the jobs of the next one.
+
+Incremental scans only scan what changed, so their peaks aren't used to size the next scan. A scan that timed out
+gets one more job next time, as far as memory and cores allow.
+"""
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional
+
+HISTORY_FILE = "scan-history.db"
+# docker reports a container killed by the OOM killer with the SIGKILL exit code
+OOM_EXIT_CODE = 137
+# share of the agent's available memory the scan's jobs may use together
+MEMORY_BUDGET_SHARE = 0.8
+# fewer files than this per job and the extra jobs only add memory
+FILES_PER_JOB = 200
+RECENT_SCANS = 5
+
+# the kinds of scans that are recorded, the kind that actually ran rather than the one that was configured
+FULL = "full"
+SHARDED = "sharded"
+INCREMENTAL = "incremental"
+# no files changed since the last incremental state, its results were reused without running semgrep
+REUSED = "reused"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repository_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    peak_memory_mb REAL,
+    exit_code INTEGER NOT NULL,
+    timed_out INTEGER NOT NULL,
+    jobs INTEGER NOT NULL,
+    max_memory INTEGER NOT NULL,
+    cores INTEGER NOT NULL,
+    memory_mb REAL NOT NULL,
+    containers INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS scans_repository ON scans (repository_id, started_at);
+"""
+
+@dataclass
+class ScanRecord:
+    repository_id: str
+    kind: str
+    started_at: float
+    files: int
+    bytes: int
+    duration: float
+    peak_memory_mb: Optional[float]
+    exit_code: int
+    timed_out: bool
+    jobs: int
+    max_memory: int
+    cores: int
+    memory_mb: float
+    containers: int = 1
+
+    @property
+    def effective_jobs(self):
+        # jobs of each container, without --jobs semgrep runs a job per core
+        return self.jobs if self.jobs > 0 else self.cores
+
+@dataclass
+class Tuning:
+    jobs: int
+    max_memory: int
+    reason: str
+
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024)
+
+class ScanHistory:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, HISTORY_FILE))
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            # histories written before scans recorded their containers
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(scans)")]
+            if "containers" not in columns:
+                self.conn.execute("ALTER TABLE scans ADD COLUMN containers INTEGER NOT NULL DEFAULT 1")
+
+    def record(self, record):
+        fields = list(record.__dict__)
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO scans ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})",
+                [getattr(record, field) for field in fields]
+            )
+
+    def recent(self, repository_id, limit=RECENT_SCANS):
+        """The repository's last `limit` scans, newest first."""
+        fields = list(ScanRecord.__dataclass_fields__)
+        rows = self.conn.execute(
+            f"SELECT {', '.join(fields)} FROM scans WHERE repository_id = ? ORDER BY started_at DESC LIMIT ?",
+            (repository_id, limit)
+        ).fetchall()
+        return [ScanRecord(**dict(zip(fields, row))) for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+def tune(records, files, bytes, cores, memory_mb, jobs=None, containers=1):
+    """
+    Picks jobs and max memory for a scan of `files` files and `bytes` bytes, None without a measured scan to go on.
+
+    :param jobs: jobs the scan runs with when they're already set, only max memory is picked then.
+    :param containers: containers scanning at the same time, which share the agent's cores and memory.
+    """
+    measured = [record for record in records if record.kind in (FULL, SHARDED) and record.peak_memory_mb]
+    if not measured:
+        return None
+
+    # memory per job of each measured scan, grown by how much larger the repository is now. the peak is the total
+    # of all the scan's containers, each running its own jobs
+    job_memory_mb = max(
+        record.peak_memory_mb / (record.effective_jobs * record.containers) * max(1, bytes / max(1, record.bytes))
+        for record in measured
+    )
+    budget_mb = memory_mb * MEMORY_BUDGET_SHARE / containers
+    reason = f"{job_memory_mb:.0f} MB per job over the last {len(measured)} measured scans"
+    if jobs is not None:
+        return Tuning(jobs=jobs, max_memory=int(budget_mb // jobs), reason=reason)
+
+    most_jobs = min(max(1, cores // containers), int(budget_mb // job_memory_mb))
+    jobs = min(most_jobs, max(1, files // FILES_PER_JOB))
+    last = records[0]
+    if last.exit_code == OOM_EXIT_CODE:
+        jobs = min(jobs, last.effective_jobs // 2)
+        reason += f", halved after the last scan ran out of memory with {last.effective_jobs} jobs"
+    elif last.timed_out and min(most_jobs, last.effective_jobs + 1) > jobs:
+        jobs = min(most_jobs, last.effective_jobs + 1)
+        reason += f", raised after the last scan timed out with {last.effective_jobs} jobs"
+
+    jobs = max(1, jobs)
+    return Tuning(jobs=jobs, max_memory=int(budget_mb // jobs), reason=reason)
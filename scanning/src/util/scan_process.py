@@ -0,0 +1,123 @@
+"""
+Runs the semgrep container and streams its output to stdout and a log file.
+
+Output is read in large chunks as it becomes available rather than line by line, and the run can be bounded by a
+wall-clock timeout and an idle-output timeout. When either fires the container is stopped through docker so it
+doesn't outlive the pipeline step.
+"""
+import os
+import selectors
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+CHUNK_SIZE = 64 * 1024
+TIMEOUT_EXIT_CODE = 124
+DOCKER_STOP_GRACE_PERIOD = 10
+
+@dataclass
+class ScanProcessResult:
+    returncode: int
+    duration: float
+    time_to_first_output: Optional[float]
+    bytes_logged: int
+    timed_out: Optional[str] = None
+
+    def log(self):
+        first_output = f"{self.time_to_first_output:.1f}s" if self.time_to_first_output is not None else "n/a"
+        print(f"Semgrep exited with code {self.returncode} after {self.duration:.1f}s "
+              f"(first output after {first_output}, {self.bytes_logged} bytes logged)")
+        if self.timed_out:
+            print(f"Semgrep was stopped after hitting the {self.timed_out} timeout.")
+
+def run_scan_process(argv, log_path=None, env=None, timeout=0, idle_timeout=0, container_name=None, echo=True):
+    """
+    Runs `argv` and returns a ScanProcessResult.
+
+    :param log_path: file the combined stdout/stderr is written to, if set.
+    :param timeout: seconds the whole run may take, 0 to disable.
+    :param idle_timeout: seconds the process may go without writing any output, 0 to disable.
+    :param container_name: name given to `docker run --name`, used to stop the container on timeout.
+    """
+    started_at = time.monotonic()
+    last_output_at = started_at
+    first_output_at = None
+    bytes_logged = 0
+    timed_out = None
+
+    log_file = open(log_path, 'wb') if log_path else None
+    # the output is written to the underlying buffer, so whatever was printed before has to go out first
+    sys.stdout.flush()
+    stdout = sys.stdout.buffer
+    process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+    fd = process.stdout.fileno()
+    selector = selectors.DefaultSelector()
+    selector.register(fd, selectors.EVENT_READ)
+
+    try:
+        while True:
+            now = time.monotonic()
+            deadlines = []
+            if timeout > 0:
+                deadlines.append(('wall-clock', started_at + timeout))
+            if idle_timeout > 0:
+                deadlines.append(('idle-output', last_output_at + idle_timeout))
+
+            expired = [name for name, deadline in deadlines if now >= deadline]
+            if expired:
+                timed_out = expired[0]
+                stop_process(process, container_name)
+                break
+
+            wait = min([deadline - now for _, deadline in deadlines], default=None)
+            if not selector.select(wait):
+                continue
+
+            data = os.read(fd, CHUNK_SIZE)
+            if not data:
+                break
+
+            last_output_at = time.monotonic()
+            if first_output_at is None:
+                first_output_at = last_output_at
+            bytes_logged += len(data)
+            if log_file:
+                log_file.write(data)
+            if echo:
+                stdout.write(data)
+                stdout.flush()
+    finally:
+        selector.close()
+        process.stdout.close()
+        if log_file:
+            log_file.close()
+
+    returncode = process.wait()
+    if timed_out:
+        returncode = TIMEOUT_EXIT_CODE
+
+    return ScanProcessResult(
+        returncode=returncode,
+        duration=time.monotonic() - started_at,
+        time_to_first_output=first_output_at - started_at if first_output_at is not None else None,
+        bytes_logged=bytes_logged,
+        timed_out=timed_out
+    )
+
+def stop_process(process, container_name=None):
+    # killing the docker cli doesn't stop the container it started, so ask docker to stop it first
+    if container_name:
+        subprocess.run(
+            ["docker", "stop", "--time", str(DOCKER_STOP_GRACE_PERIOD), container_name],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=DOCKER_STOP_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            process.kill()
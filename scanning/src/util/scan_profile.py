@@ -0,0 +1,173 @@
+"""
+Timing profile of a full scan, from the `time` section semgrep adds to its json output when run with --time.
+
+The section lists the rules that ran and, for every target, its size and the time each rule took to parse and match it.
+The profile ranks the rules, files and languages the scan spent the most time on, and suggests .semgrepignore
+entries for generated, minified and vendored files that are slow or large, which rarely hold findings worth the time.
+"""
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+
+import util.semgrep_results as semgrep_results
+
+PROFILE_FILE = "semgrep-profile.md"
+# targets are mounted at /src in the container
+CONTAINER_SCAN_TARGET = "/src/"
+TOP_COUNT = 20
+# a line this long on average means the file was minified
+MINIFIED_LINE_LENGTH = 500
+MINIFIED_SAMPLE_SIZE = 64 * 1024
+
+LANGUAGES = {
+    ".py": "Python", ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".java": "Java", ".kt": "Kotlin", ".scala": "Scala", ".go": "Go",
+    ".cs": "C#", ".c": "C", ".h": "C", ".cpp": "C++", ".cc": "C++", ".hpp": "C++", ".rb": "Ruby", ".php": "PHP",
+    ".rs": "Rust", ".swift": "Swift", ".sh": "Bash", ".tf": "Terraform", ".json": "JSON", ".yaml": "YAML",
+    ".yml": "YAML", ".xml": "XML", ".html": "HTML", ".sql": "SQL", ".dockerfile": "Dockerfile",
+}
+# whole directories of code that isn't the repository's own
+DIRECTORY_REASONS = {
+    "vendor": "vendored", "third_party": "vendored", "thirdparty": "vendored", "node_modules": "vendored",
+    "bower_components": "vendored", "dist": "generated", "build": "generated",
+}
+GENERATED_PATTERNS = [re.compile(pattern) for pattern in (
+    r"\.min\.(js|css)$", r"[.-]bundle\.js$", r"_pb2(_grpc)?\.py$", r"\.pb\.go$", r"\.g\.(cs|dart)$", r"\.designer\.cs$",
+    r"\.generated\.", r"(^|/)generated/", r"\.js\.map$", r"(^|/)package-lock\.json$", r"(^|/)yarn\.lock$",
+)]
+
+@dataclass
+class TargetTiming:
+    path: str
+    bytes: int
+    seconds: float
+
+@dataclass
+class IgnoreCandidate:
+    pattern: str
+    reason: str
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+def read_timings(results_paths):
+    """Returns ({rule id: seconds}, [TargetTiming]) combined over the `time` sections of `results_paths`."""
+    rule_seconds = defaultdict(float)
+    targets = {}
+    for results_path in results_paths:
+        timing = semgrep_results.read_sections(results_path, ("time",)).get("time") or {}
+        rule_ids = [rule.get("id", "") for rule in timing.get("rules", [])]
+        for target in timing.get("targets", []):
+            per_rule = [
+                sum(times) for times in zip(target.get("match_times", []), target.get("parse_times") or [0] * len(rule_ids))
+            ]
+            for rule_id, seconds in zip(rule_ids, per_rule):
+                rule_seconds[rule_id] += seconds
+
+            path = target["path"]
+            path = path[len(CONTAINER_SCAN_TARGET):] if path.startswith(CONTAINER_SCAN_TARGET) else path
+            seconds = target.get("run_time") or sum(per_rule)
+            previous = targets.get(path)
+            targets[path] = TargetTiming(path, target.get("num_bytes", 0), seconds + (previous.seconds if previous else 0))
+    return dict(rule_seconds), list(targets.values())
+
+def language_of(path):
+    name = os.path.basename(path).lower()
+    if name == "dockerfile":
+        return "Dockerfile"
+    return LANGUAGES.get(os.path.splitext(name)[1], "Other")
+
+def is_minified(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            sample = f.read(MINIFIED_SAMPLE_SIZE)
+    except OSError:
+        return False
+    return len(sample) / (sample.count(b"\n") + 1) > MINIFIED_LINE_LENGTH
+
+def ignore_candidates(targets, scan_target_path, min_seconds, min_bytes):
+    """
+    Generated, minified and vendored files that took at least `min_seconds` to scan or are at least `min_bytes` large.
+    Files under a vendored or build output directory are suggested as the whole directory.
+    """
+    candidates = {}
+    for target in targets:
+        if target.seconds < min_seconds and target.bytes < min_bytes:
+            continue
+
+        parts = target.path.split("/")
+        directory = next((index for index, part in enumerate(parts[:-1]) if part in DIRECTORY_REASONS), None)
+        if directory is not None:
+            pattern, reason = "/".join(parts[:directory + 1]) + "/", DIRECTORY_REASONS[parts[directory]]
+        elif any(generated.search(target.path) for generated in GENERATED_PATTERNS):
+            pattern, reason = target.path, "generated"
+        elif is_minified(os.path.join(scan_target_path, target.path)):
+            pattern, reason = target.path, "minified"
+        else:
+            continue
+
+        candidate = candidates.setdefault(pattern, IgnoreCandidate(pattern, reason))
+        candidate.files += 1
+        candidate.bytes += target.bytes
+        candidate.seconds += target.seconds
+    return sorted(candidates.values(), key=lambda candidate: candidate.seconds, reverse=True)
+
+def write_report(report_path, rule_seconds, targets, candidates, top=TOP_COUNT):
+    total_seconds = sum(target.seconds for target in targets) or 1
+    language_seconds = defaultdict(float)
+    language_files = defaultdict(int)
+    for target in targets:
+        language_seconds[language_of(target.path)] += target.seconds
+        language_files[language_of(target.path)] += 1
+
+    lines = [
+        "# Semgrep Scan Profile",
+        "",
+        f"{len(targets)} files and {len(rule_seconds)} rules, {total_seconds:.1f}s of scan time across all jobs.",
+        "",
+        "## Slowest Rules",
+        "",
+        "| Rule | Seconds | Share |",
+        "| --- | ---: | ---: |",
+    ]
+    for rule_id, seconds in sorted(rule_seconds.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"| {rule_id} | {seconds:.2f} | {seconds / total_seconds:.1%} |")
+
+    lines += ["", "## Slowest Files", "", "| File | Bytes | Seconds | Share |", "| --- | ---: | ---: | ---: |"]
+    for target in sorted(targets, key=lambda target: target.seconds, reverse=True)[:top]:
+        lines.append(f"| {target.path} | {target.bytes} | {target.seconds:.2f} | {target.seconds / total_seconds:.1%} |")
+
+    lines += ["", "## Languages", "", "| Language | Files | Seconds | Share |", "| --- | ---: | ---: | ---: |"]
+    for language, seconds in sorted(language_seconds.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"| {language} | {language_files[language]} | {seconds:.2f} | {seconds / total_seconds:.1%} |")
+
+    lines += ["", "## .semgrepignore Candidates", ""]
+    if candidates:
+        # comments only start at the beginning of a line in .semgrepignore, so each goes above its pattern
+        lines.append("```")
+        for candidate in candidates:
+            lines += [f"# {candidate.reason}, {candidate.files} files, {candidate.bytes} bytes, {candidate.seconds:.1f}s", candidate.pattern]
+        lines.append("```")
+    else:
+        lines.append("No generated, minified or vendored files over the thresholds.")
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def profile_scan(results_paths, scan_target_path, report_path, min_seconds, min_bytes):
+    """Writes the profile of the scan that wrote `results_paths` to `report_path` and logs its headline numbers."""
+    rule_seconds, targets = read_timings(results_paths)
+    if not targets:
+        print("The scan results have no timing data, no profile was written.")
+        return
+    candidates = ignore_candidates(targets, scan_target_path, min_seconds, min_bytes)
+    write_report(report_path, rule_seconds, targets, candidates)
+
+    print(f"Scan profile written to {report_path}.")
+    for rule_id, seconds in sorted(rule_seconds.items(), key=lambda item: item[1], reverse=True)[:5]:
+        print(f"  - rule {rule_id}: {seconds:.1f}s")
+    for target in sorted(targets, key=lambda target: target.seconds, reverse=True)[:5]:
+        print(f"  - file {target.path}: {target.seconds:.1f}s")
+    if candidates:
+        print(f"  {len(candidates)} .semgrepignore candidates could save {sum(candidate.seconds for candidate in candidates):.1f}s.")
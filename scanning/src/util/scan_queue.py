@@ -0,0 +1,94 @@
+"""
+Persistent SQLite queue of full scan jobs.
+
+Jobs belong to a batch and a repository is queued at most once per batch, so enqueueing the same batch again after an
+interruption only adds what's missing. Jobs that were running when the batch was interrupted are put back in the
+queue when it resumes, finished jobs are never run again.
+"""
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    repository_id TEXT NOT NULL,
+    config TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    exit_code INTEGER,
+    peak_memory_mb REAL,
+    started_at REAL,
+    finished_at REAL,
+    UNIQUE (batch, repository_id)
+);
+"""
+
+@dataclass
+class Job:
+    id: int
+    repository_id: str
+    config: dict
+    attempts: int = 0
+
+class ScanQueue:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def enqueue(self, batch, configs):
+        """Queues a job per repository config that isn't in the batch yet. Returns the number queued."""
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (batch, repository_id, config) VALUES (?, ?, ?)",
+                [(batch, config["repository_id"], json.dumps(config)) for config in configs]
+            )
+        return cursor.rowcount
+
+    def resume(self, batch):
+        """Puts jobs left running by an interrupted run back in the queue. Returns how many were."""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE jobs SET state = ? WHERE batch = ? AND state = ?", (PENDING, batch, RUNNING))
+        return cursor.rowcount
+
+    def pending(self, batch):
+        rows = self.conn.execute(
+            "SELECT id, repository_id, config, attempts FROM jobs WHERE batch = ? AND state = ? ORDER BY id",
+            (batch, PENDING)
+        ).fetchall()
+        return [Job(id, repository_id, json.loads(config), attempts) for id, repository_id, config, attempts in rows]
+
+    def start(self, job):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job.id)
+            )
+
+    def requeue(self, job):
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET state = ? WHERE id = ?", (PENDING, job.id))
+
+    def finish(self, job, exit_code, succeeded, peak_memory_mb=None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, exit_code = ?, peak_memory_mb = ?, finished_at = ? WHERE id = ?",
+                (DONE if succeeded else FAILED, exit_code, peak_memory_mb, time.time(), job.id)
+            )
+
+    def summary(self, batch):
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs WHERE batch = ? GROUP BY state", (batch,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
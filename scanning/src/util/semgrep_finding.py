@@ -3,6 +3,7 @@ This a utility file that contains formatting functions for a Semgrep finding.
 """
 
 def finding_to_issue_summary(finding, include_product_tag = False):
+    finding = as_finding(finding)
     cwe_brief = finding_to_cwe_brief(finding)
     id_brief = rule_id_brief(finding)
     response = ""
@@ -33,6 +34,7 @@ def finding_to_issue_summary(finding, include_product_tag = False):
     return response
 
 def finding_to_issue_description(finding, repo):
+    finding = as_finding(finding)
     return (f"{message(finding)}\r\n"
             f"h3. Metadata\r\n\r\n"
             f"Severity: {severity(finding)}\r\n"
@@ -47,15 +49,139 @@ def finding_to_issue_description(finding, repo):
 
 ##############################
 
-def finding_to_cwe_brief(finding):
-    if (finding['extra']['metadata'].get('cwe','') == ''):
+CODE_SEVERITY_MAPPING = {
+    'info': 'Low',
+    'warning': 'Medium',
+    'error': 'High'
+}
+
+SCA_SEVERITY_MAPPING = {
+    'low': 'Low',
+    'moderate': 'Medium',
+    'high': 'High',
+    'critical': 'Critical'
+}
+
+PRODUCT_CODE = 'code'
+PRODUCT_SCA = 'sca'
+PRODUCT_SECRETS = 'secrets'
+
+class Finding:
+    """
+    A Semgrep finding with everything the helpers below need computed once from the semgrep json.
+    Only the fields we use are kept, the raw nested dict is not. `severity` is None when semgrep's severity isn't
+    one of the mapped ones, where the severity() helper raises KeyError.
+    """
+    __slots__ = (
+        'check_id', 'path', 'start_line', 'start_col', 'end_line', 'end_col',
+        'message', 'fingerprint', 'product', 'severity', 'confidence', 'cwe_brief',
+        'rule_url', 'references', 'policy', 'commentable', 'sca_kind', 'sca_package',
+        'sca_semver_range', 'sca_cve', 'validation_state',
+    )
+
+    def __init__(self, check_id, path, start_line, start_col, end_line, end_col, message, fingerprint,
+                 product, severity, confidence, cwe_brief, rule_url, references, policy, commentable,
+                 sca_kind=None, sca_package=None, sca_semver_range=None, sca_cve=None, validation_state=None):
+        self.check_id = check_id
+        self.path = path
+        self.start_line = start_line
+        self.start_col = start_col
+        self.end_line = end_line
+        self.end_col = end_col
+        self.message = message
+        self.fingerprint = fingerprint
+        self.product = product
+        self.severity = severity
+        self.confidence = confidence
+        self.cwe_brief = cwe_brief
+        self.rule_url = rule_url
+        self.references = references
+        self.policy = policy
+        self.commentable = commentable
+        self.sca_kind = sca_kind
+        self.sca_package = sca_package
+        self.sca_semver_range = sca_semver_range
+        self.sca_cve = sca_cve
+        self.validation_state = validation_state
+
+    @classmethod
+    def from_json(cls, finding):
+        extra = finding['extra']
+        metadata = extra.get('metadata') or {}
+        check_id = finding['check_id']
+        actions = metadata.get('dev.semgrep.actions') or []
+        sca = check_id.startswith('ssc')
+
+        if sca:
+            product = PRODUCT_SCA
+            sca_info = extra.get('sca_info') or {}
+            dependency_pattern = (sca_info.get('dependency_match') or {}).get('dependency_pattern') or {}
+            severity = SCA_SEVERITY_MAPPING.get(str(metadata.get('sca-severity', '')).lower())
+            rule_url = metadata.get('semgrep.url')
+            commentable = bool(sca_info.get('reachable'))  # if ssc reachable
+        else:
+            product = PRODUCT_SECRETS if metadata.get('product', '') == 'secrets' else PRODUCT_CODE
+            sca_info = {}
+            dependency_pattern = {}
+            severity = CODE_SEVERITY_MAPPING.get(str(extra.get('severity', '')).lower())
+            rule_url = ((metadata.get('semgrep.dev') or {}).get('rule') or {}).get('url')
+            commentable = 'monitor' not in actions  # code or secrets finding configured to comment / block
+
+        return cls(
+            check_id=check_id,
+            path=f"{finding['path']}",
+            start_line=finding['start']['line'],
+            start_col=finding['start']['col'],
+            end_line=finding['end']['line'],
+            end_col=finding['end']['col'],
+            message=extra.get('message'),
+            fingerprint=extra.get('fingerprint'),
+            product=product,
+            severity=severity,
+            confidence=metadata.get('confidence') or "Low",
+            cwe_brief=_cwe_brief(metadata.get('cwe', '')),
+            rule_url=rule_url,
+            references=tuple(metadata.get('references') or ()),
+            policy=actions[0] if actions else None,
+            commentable=commentable,
+            sca_kind=metadata.get('sca-kind') if sca else None,
+            sca_package=dependency_pattern.get('package'),
+            sca_semver_range=dependency_pattern.get('semver_range'),
+            sca_cve=metadata.get('cve') if sca else None,
+            validation_state=extra.get('validation_state'),
+        )
+
+    def group_key(self, repo_name):
+        if self.product == PRODUCT_SCA:
+            return f"{repo_name}/{self.check_id}" # only alert 1x / repo /ssc rule
+        else:
+            return self.fingerprint
+
+    def __repr__(self):
+        return f"Finding({self.check_id!r}, {self.path!r}:{self.start_line})"
+
+def _cwe_brief(cwe):
+    if isinstance(cwe, list):
+        cwe = cwe[0] if cwe else ''
+    if cwe == '':
         return ''
-    elif (isinstance(finding['extra']['metadata']['cwe'], list)):
-        return finding['extra']['metadata']['cwe'][0].split(': ')[1]
-    else:
-        return finding['extra']['metadata']['cwe'].split(': ')[1]
+    parts = cwe.split(': ')
+    return parts[1] if len(parts) > 1 else ''
+
+def as_finding(finding):
+    """
+    Accepts either a Finding or a raw semgrep json finding. Used by the helpers that read several fields, the
+    single field helpers below read a raw finding's field directly instead of building a whole Finding for it.
+    """
+    return finding if isinstance(finding, Finding) else Finding.from_json(finding)
+
+def finding_to_cwe_brief(finding):
+    if isinstance(finding, Finding):
+        return finding.cwe_brief
+    return _cwe_brief(finding['extra']['metadata'].get('cwe', ''))
 
 def finding_to_issue_description_reference_links(finding):
+    finding = as_finding(finding)
     references = ""
     references += f"\n - [Semgrep Rule|{semgrep_url(finding)}]"
     for ref in reference_links(finding):
@@ -63,97 +189,134 @@ def finding_to_issue_description_reference_links(finding):
     return f"{references}\n"
 
 def is_sca_reachable(finding):
+    if isinstance(finding, Finding):
+        return finding.product == PRODUCT_SCA and finding.sca_kind == 'reachable'
     return is_sca(finding) and finding['extra']['metadata']['sca-kind'] == 'reachable'
 
 def is_sca(finding):
+    if isinstance(finding, Finding):
+        return finding.product == PRODUCT_SCA
     return finding['check_id'].startswith('ssc')
 
 def is_secrets(finding):
+    if isinstance(finding, Finding):
+        return finding.product == PRODUCT_SECRETS
     return finding['extra']['metadata'].get('product','') == 'secrets'
 
 def is_secrets_validated(finding):
+    if isinstance(finding, Finding):
+        return finding.product == PRODUCT_SECRETS and finding.validation_state == 'CONFIRMED_VALID'
     return is_secrets(finding) and finding['extra']['validation_state'] == 'CONFIRMED_VALID'
 
 def sca_package(finding):
+    if isinstance(finding, Finding):
+        return finding.sca_package
     return finding['extra']['sca_info']['dependency_match']['dependency_pattern']['package']
 
 def sca_semver_range(finding):
+    if isinstance(finding, Finding):
+        return finding.sca_semver_range
     return finding['extra']['sca_info']['dependency_match']['dependency_pattern']['semver_range']
 
 def sca_cve(finding):
+    if isinstance(finding, Finding):
+        return finding.sca_cve
     return finding['extra']['metadata']['cve']
 
 def semgrep_url(finding):
+    if isinstance(finding, Finding):
+        return finding.rule_url
     if (is_sca(finding)):
         return finding['extra']['metadata']['semgrep.url']
     else:
         return finding['extra']['metadata']['semgrep.dev']["rule"]["url"]
 
 def reference_links(finding):
+    if isinstance(finding, Finding):
+        return list(finding.references)
     return finding['extra']['metadata'].get('references') or []
 
 def semgrep_policy(finding):
-    return finding['extra']['metadata']['dev.semgrep.actions'][0] if finding['extra']['metadata']['dev.semgrep.actions'] else None 
+    if isinstance(finding, Finding):
+        return finding.policy
+    return finding['extra']['metadata']['dev.semgrep.actions'][0] if finding['extra']['metadata']['dev.semgrep.actions'] else None
 
 def confidence(finding):
+    if isinstance(finding, Finding):
+        return finding.confidence
     return finding['extra']['metadata'].get('confidence') or "Low"
 
 
 def severity(finding):
-    code_severity_mapping = {
-        'info': 'Low',
-        'warning': 'Medium',
-        'error': 'High'
-    }
-
-    sca_severity_mapping = {
-        'low': 'Low',
-        'moderate': 'Medium',
-        'high': 'High',
-        'critical': 'Critical'
-    }
-
+    """
+    The finding's severity as Low/Medium/High/Critical. Raises KeyError for a severity that isn't mapped, the
+    Finding of such a finding has a severity of None.
+    """
+    if isinstance(finding, Finding):
+        if finding.severity is None:
+            raise KeyError(f"unmapped severity for {finding.check_id}")
+        return finding.severity
     if (is_sca(finding)):
-        return sca_severity_mapping[finding['extra']['metadata']['sca-severity'].lower()]
+        return SCA_SEVERITY_MAPPING[finding['extra']['metadata']['sca-severity'].lower()]
     else:
-        return code_severity_mapping[finding['extra']['severity'].lower()]
+        return CODE_SEVERITY_MAPPING[finding['extra']['severity'].lower()]
 
 
 def message(finding):
+    if isinstance(finding, Finding):
+        return finding.message
     return finding['extra']['message']
 
 def start_line(finding):
+    if isinstance(finding, Finding):
+        return finding.start_line
     return finding['start']['line']
 
 def start_line_col(finding):
+    if isinstance(finding, Finding):
+        return finding.start_col
     return finding['start']['col']
 
 def end_line(finding):
+    if isinstance(finding, Finding):
+        return finding.end_line
     return finding['end']['line']
 
 def end_line_col(finding):
+    if isinstance(finding, Finding):
+        return finding.end_col
     return finding['end']['col']
 
 def path(finding):
+    if isinstance(finding, Finding):
+        return finding.path
     return f"{finding['path']}"
 
 def fingerprint(finding):
+    if isinstance(finding, Finding):
+        return finding.fingerprint
     return finding['extra']['fingerprint']
 
 def group_key(finding, repo):
+    if isinstance(finding, Finding):
+        return finding.group_key(repo['name'])
     if is_sca(finding):
         return f"{repo['name']}/{rule_id(finding)}" # only alert 1x / repo /ssc rule
     else:
         return finding['extra']['fingerprint']
 
 def rule_id(finding):
+    if isinstance(finding, Finding):
+        return finding.check_id
     return finding['check_id']
 
 def rule_id_brief(finding):
     return rule_id(finding).split('.')[-1]
 
 def is_commentable(finding):
+    if isinstance(finding, Finding):
+        return finding.commentable
     if (finding['check_id'].startswith('ssc')):
         return finding['extra']['sca_info']['reachable'] # if ssc reachable
     else:
-        return ('monitor' not in finding['extra']['metadata']['dev.semgrep.actions']) # code or secrets finding configured to comment / block
\ No newline at end of file
+        return ('monitor' not in finding['extra']['metadata']['dev.semgrep.actions']) # code or secrets finding configured to comment / block
@@ -0,0 +1,163 @@
+"""
+Incremental reader for semgrep's json output.
+
+Entries of `results` are decoded and yielded one at a time, and the other top level sections (`errors`, `paths`, ...)
+are skipped without being decoded unless they're asked for, so memory use doesn't grow with the size of the file.
+"""
+import json
+import re
+
+from util.semgrep_finding import Finding
+
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_NUMBER = re.compile(r'[-+.eE0-9]*')
+
+def iter_results(path, chunk_size=CHUNK_SIZE):
+    """Yields each finding in the `results` array of a semgrep json output file."""
+    yield from _scan(path, (), {}, chunk_size)
+
+def iter_findings(path, chunk_size=CHUNK_SIZE):
+    """Yields each finding in the `results` array as a Finding."""
+    for result in iter_results(path, chunk_size):
+        yield Finding.from_json(result)
+
+def read_sections(path, names=('errors', 'paths'), chunk_size=CHUNK_SIZE):
+    """
+    Returns a dict of the requested top level sections of a semgrep json output file, or of all of them when `names` is
+    None. `results` is skipped.
+    """
+    sections = {}
+    for _ in _scan(path, names, sections, chunk_size, include_results=False):
+        pass
+    return sections
+
+def _scan(path, names, sections, chunk_size, include_results=True):
+    with open(path, encoding='utf-8') as f:
+        reader = _Reader(f, chunk_size)
+        for key in reader.members():
+            if key == 'results':
+                if include_results:
+                    yield from reader.items()
+                else:
+                    reader.skip()
+            elif names is None or key in names:
+                sections[key] = reader.value()
+            else:
+                reader.skip()
+
+class _Reader:
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # drop everything already consumed and read the next chunk. the read size grows with the
+        # buffer so a single large value is re-decoded a logarithmic number of times, not linear
+        if self.eof:
+            return False
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of semgrep results file")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in semgrep results file but found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number or literal reaching the end of the buffer may continue in the next chunk. a number can also
+            # decode short of it, `1` out of a buffer ending in `1.` or `1e`, so its characters are what counts
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                end_of_value = _NUMBER.match(self.buffer, self.pos).end()
+            else:
+                end_of_value = end
+            if end_of_value < len(self.buffer) or not self.fill():
+                self.pos = end
+                return value
+
+    def skip(self):
+        if self.peek() not in '[{':
+            self.value()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError("Unexpected end of semgrep results file")
+                continue
+
+            char = match.group()
+            self.pos = match.end()
+            if char == '"':
+                self.skip_string()
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def skip_string(self):
+        # self.pos is just past the opening quote
+        while True:
+            match = _STRING_REST.match(self.buffer, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return
+            if not self.fill():
+                raise ValueError("Unterminated string in semgrep results file")
+
+    def members(self):
+        # yields the keys of the top level object. the caller consumes each value before resuming
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
@@ -1,101 +1,369 @@
-import subprocess
+import functools
+import glob
 import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from config.settings import DEFAULT_JOB_COUNT, DEFAULT_MAX_MEMORY, SemgrepDiffScanConfig, SemgrepFullScanConfig
-
-semgrep_diff_scan_config = SemgrepDiffScanConfig()
-semgrep_full_scan_config = SemgrepFullScanConfig()
-def run_command(command):
-    # Start the subprocess
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    
-    # Read one line at a time as it becomes available
-    while True:
-        output = process.stdout.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            print(output.strip())
-    
-    # Wait for the subprocess to finish and get the exit code
-    rc = process.poll()
-    return rc
+from config.settings import DEFAULT_JOB_COUNT, DEFAULT_MAX_MEMORY, get_diff_scan_config, get_full_scan_config
+from util.container_stats import MemorySampler
+from util.scan_process import TIMEOUT_EXIT_CODE, run_scan_process
+import util.incremental_scan as incremental
+import util.scan_cache as scan_cache
+import util.scan_history as scan_history
+import util.scan_profile as scan_profile
+import util.sharded_scan as sharded
+
+SEMGREP_IMAGE = "semgrep/semgrep"
+SCAN_LOG_FILE = "semgrep-scan.log"
+RESULTS_FILE = "semgrep-results.json"
+SHARD_DIRECTORY = "semgrep-shards"
+
+def run_command(argv, env, config, docker_args=(), log_file=SCAN_LOG_FILE, echo=True):
+    """Runs `argv` in the semgrep container and returns its ScanProcessResult. Variables in `env` that are None aren't set."""
+    env = {name: value for name, value in env.items() if value is not None}
+    # the container gets a unique name so it can be stopped if the scan times out
+    container_name = f"semgrep-{config.build_buildid}-{uuid.uuid4().hex[:8]}"
+    docker_argv = ["docker", "run", "--rm", "--name", container_name] + list(docker_args)
+    docker_argv += ["-v", f"{config.scan_target_path}:/src", "-v", f"{config.output_directory}:/output"]
+    # only variable names go on the command line, the values (including the app token) are passed through the environment
+    for name in env:
+        docker_argv += ["-e", name]
+    docker_argv += [SEMGREP_IMAGE] + argv
+
+    result = run_scan_process(
+        docker_argv,
+        log_path=os.path.join(config.output_directory, log_file),
+        env={**os.environ, **{name: str(value) for name, value in env.items()}},
+        timeout=config.scan_timeout,
+        idle_timeout=config.scan_idle_timeout,
+        container_name=container_name,
+        echo=echo
+    )
+    result.log()
+    return result
 
 def diff_scan():
+    semgrep_diff_scan_config = get_diff_scan_config()
     print(f"Running DIFF scan for changes on branch {semgrep_diff_scan_config.source_ref_name} at commit {semgrep_diff_scan_config.last_merge_commit_id} from commit {semgrep_diff_scan_config.last_merge_target_commit_id}.")
     print(f"New findings configured to comment/block will post to PRs:")
     print(f"  - {semgrep_diff_scan_config.pull_request_id}")
-    docker_command = """
-        docker run \\
-            -v "{scan_target_path}:/src" \\
-            -v "{output_directory}:/output" \\
-            -e "SEMGREP_APP_TOKEN={semgrep_app_token}" \\
-            -e "SEMGREP_REPO_DISPLAY_NAME={semgrep_repo_display_name}" \\
-            -e "SEMGREP_PR_ID={semgrep_pr_id}" \\
-            -e "SEMGREP_BASELINE_REF={semgrep_baseline_ref}" \\
-            -e "SEMGREP_BRANCH={source_branch}" \\
-            -e "SEMGREP_REPO_URL={repo_url}" \\
-            -e "BUILD_BUILDID={build_id}" \\
-            -e "SEMGREP_COMMIT={semgrep_commit}" \\
-            -i semgrep/semgrep semgrep ci --json -o /output/semgrep-results.json --verbose
-        """.format(
-            scan_target_path = semgrep_diff_scan_config.scan_target_path,
-            output_directory = semgrep_diff_scan_config.output_directory,
-            semgrep_app_token = semgrep_diff_scan_config.semgrep_app_token,
-            semgrep_repo_display_name = semgrep_diff_scan_config.repository_display_Name,
-            semgrep_pr_id = semgrep_diff_scan_config.pull_request_id,
-            semgrep_baseline_ref = semgrep_diff_scan_config.last_merge_target_commit_id,
-            source_branch = semgrep_diff_scan_config.source_ref_name.split('/')[-1],
-            repo_url = semgrep_diff_scan_config.repository_web_url,
-            build_id = semgrep_diff_scan_config.build_buildid,
-            semgrep_commit = semgrep_diff_scan_config.last_merge_commit_id
-        )
-    
-    semgrep_return_code = run_command(docker_command)
+    env = {
+        "SEMGREP_APP_TOKEN": semgrep_diff_scan_config.semgrep_app_token,
+        "SEMGREP_REPO_DISPLAY_NAME": semgrep_diff_scan_config.repository_display_Name,
+        "SEMGREP_PR_ID": semgrep_diff_scan_config.pull_request_id,
+        "SEMGREP_BASELINE_REF": semgrep_diff_scan_config.last_merge_target_commit_id,
+        "SEMGREP_BRANCH": semgrep_diff_scan_config.source_ref_name.split('/')[-1],
+        "SEMGREP_REPO_URL": semgrep_diff_scan_config.repository_web_url,
+        "BUILD_BUILDID": semgrep_diff_scan_config.build_buildid,
+        "SEMGREP_COMMIT": semgrep_diff_scan_config.last_merge_commit_id,
+    }
+    semgrep_command = ["semgrep", "ci", "--json", "-o", "/output/semgrep-results.json", "--verbose"]
+
+    cache = _get_scan_cache(semgrep_diff_scan_config)
+    if cache is None:
+        return run_command(semgrep_command, env, semgrep_diff_scan_config).returncode
+
+    results_path = os.path.join(semgrep_diff_scan_config.output_directory, RESULTS_FILE)
+    key = scan_cache.cache_key(
+        semgrep_diff_scan_config.repository_id,
+        semgrep_diff_scan_config.pull_request_id,
+        semgrep_diff_scan_config.last_merge_commit_id,
+        semgrep_diff_scan_config.last_merge_target_commit_id,
+        semgrep_command,
+        semgrep_diff_scan_config.scan_cache_rules_version
+    )
+    semgrep_return_code = cache.restore(key, results_path)
+    if semgrep_return_code is not None:
+        print(f"Reusing cached results of an identical scan ({key[:12]}) with exit code {semgrep_return_code}.")
+    else:
+        semgrep_return_code = run_command(semgrep_command, env, semgrep_diff_scan_config).returncode
+        if _is_successful_scan(semgrep_return_code, results_path):
+            cache.store(key, results_path, semgrep_return_code)
+    cache.log_metrics()
     return semgrep_return_code
 
+def _get_scan_cache(config):
+    # both commits are needed to know two scans are the same
+    if not config.scan_cache_directory or not config.last_merge_commit_id or not config.last_merge_target_commit_id:
+        return None
+    # results of old rules would be reused until they expire, so no rules version means no caching
+    if not scan_cache.is_rules_version_set(config.scan_cache_rules_version):
+        print(f"Not using the scan cache, SCAN_CACHE_RULES_VERSION isn't set.")
+        return None
+    return scan_cache.ScanCache(config.scan_cache_directory, config.scan_cache_max_size_mb, config.scan_cache_ttl)
+
 def full_scan():
+    history = _get_scan_history()
+    semgrep_return_code = _run_full_scan()[0] if history is None else _run_recorded_full_scan(history)
+    if get_full_scan_config().profile:
+        _profile_full_scan()
+    return semgrep_return_code
+
+def _run_recorded_full_scan(history):
+    config = get_full_scan_config()
+    files, bytes = _get_scan_target_size()
+    jobs, max_memory = _get_scan_tuning()
+    # every container of this run is named after the build, shards included
+    sampler = MemorySampler(name_prefix=f"semgrep-{config.build_buildid}-").start()
+    started_at = time.time()
+    try:
+        semgrep_return_code, kind = _run_full_scan()
+    finally:
+        sampler.stop()
+
+    history.record(scan_history.ScanRecord(
+        repository_id=config.repository_id,
+        kind=kind,
+        started_at=started_at,
+        files=files,
+        bytes=bytes,
+        duration=time.time() - started_at,
+        peak_memory_mb=sampler.peak(f"semgrep-{config.build_buildid}-"),
+        exit_code=semgrep_return_code,
+        timed_out=semgrep_return_code == TIMEOUT_EXIT_CODE,
+        jobs=jobs,
+        max_memory=max_memory,
+        cores=_get_scan_cores(),
+        memory_mb=_get_scan_memory_mb(),
+        containers=_get_container_count()
+    ))
+    history.close()
+    return semgrep_return_code
+
+def _run_full_scan():
+    """Runs the configured full scan, returns its exit code and the kind of scan that ran (see scan_history)."""
+    semgrep_full_scan_config = get_full_scan_config()
+    if semgrep_full_scan_config.incremental:
+        if semgrep_full_scan_config.shards > 1:
+            print(f"Ignoring SHARDS={semgrep_full_scan_config.shards}, incremental full scans aren't sharded.")
+        return incremental_full_scan()
+    if semgrep_full_scan_config.shards > 1 and not semgrep_full_scan_config.shard_without_upload:
+        print(f"Not sharding the scan, sharded results can't be uploaded to semgrep.dev. Set SHARD_WITHOUT_UPLOAD to shard without uploading.")
+    if _is_sharded():
+        return sharded_full_scan()
+
     print(f"Running FULL scan.")
-    docker_command = """
-        docker run \\
-            -v "{scan_target_path}:/src" \\
-            -v "{output_directory}:/output" \\
-            -e "SEMGREP_APP_TOKEN={semgrep_app_token}" \\
-            -e "SEMGREP_REPO_DISPLAY_NAME={semgrep_repo_display_name}" \\
-            -e "SEMGREP_REPO_URL={repo_url}" \\
-            -i semgrep/semgrep {semgrep_command}
-        """.format(
-            scan_target_path = semgrep_full_scan_config.scan_target_path,
-            output_directory = semgrep_full_scan_config.output_directory,
-            semgrep_app_token=semgrep_full_scan_config.semgrep_app_token,
-            semgrep_repo_display_name=semgrep_full_scan_config.repository_display_Name,
-            repo_url = semgrep_full_scan_config.repository_web_url,
-            semgrep_command = _get_full_scan_command()
+    semgrep_return_code = run_command(_get_full_scan_command(), _get_full_scan_env(), semgrep_full_scan_config).returncode
+    return semgrep_return_code, scan_history.FULL
+
+def incremental_full_scan():
+    config = get_full_scan_config()
+    state_directory = config.incremental_state_directory or config.output_directory
+    results_path = os.path.join(config.output_directory, RESULTS_FILE)
+    state = incremental.load_state(state_directory)
+    commit = incremental.head_commit(config.scan_target_path)
+    manifest = incremental.build_manifest(config.scan_target_path)
+
+    if state is None or commit is None:
+        print(f"Running FULL scan. No previous incremental scan state found in {state_directory}.")
+        return _full_scan_and_record(state_directory, commit, manifest, results_path), scan_history.FULL
+    if state.incremental_runs >= config.incremental_full_scan_interval:
+        print(f"Running FULL scan. {state.incremental_runs} incremental scans have run since the last full scan.")
+        return _full_scan_and_record(state_directory, commit, manifest, results_path), scan_history.FULL
+
+    changes = incremental.diff_manifests(state.manifest, manifest)
+    if changes.empty:
+        print(f"No files changed since the last full scan at commit {state.commit}. Reusing its results.")
+        shutil.copyfile(incremental.baseline_results_path(state_directory), results_path)
+        return state.exit_code, scan_history.REUSED
+
+    if len(changes.changed) > config.incremental_max_changed_ratio * max(1, len(manifest)):
+        print(f"Running FULL scan. {len(changes.changed)} of {len(manifest)} files changed since the last full scan.")
+        return _full_scan_and_record(state_directory, commit, manifest, results_path), scan_history.FULL
+    if not incremental.ensure_commit_available(config.scan_target_path, state.commit):
+        print(f"Running FULL scan. Baseline commit {state.commit} can't be used for a diff-aware scan.")
+        return _full_scan_and_record(state_directory, commit, manifest, results_path), scan_history.FULL
+
+    print(f"Running INCREMENTAL full scan of {len(changes.changed)} changed and {len(changes.deleted)} deleted files since commit {state.commit}.")
+    # semgrep ci only uploads the new findings of a diff-aware scan, and semgrep.dev doesn't take it as the branch's full
+    # state, so findings fixed since the baseline stay open there (and in the reports) until the next regular full scan
+    env = _get_full_scan_env()
+    env["SEMGREP_BASELINE_REF"] = state.commit
+    env["SEMGREP_COMMIT"] = commit
+    semgrep_return_code = run_command(_get_full_scan_command(), env, config).returncode
+    if not _is_successful_scan(semgrep_return_code, results_path):
+        return semgrep_return_code, scan_history.INCREMENTAL
+
+    # semgrep only reports findings new since the baseline, so the previous findings are carried forward
+    # for every file that still exists. findings fixed in changed files are dropped on the next full scan
+    count = incremental.merge_results(results_path, incremental.baseline_results_path(state_directory), results_path, changes.deleted)
+    print(f"Merged results contain {count} findings.")
+    # semgrep's exit code only covers the new findings, blocking findings carried forward still block
+    semgrep_return_code = max(semgrep_return_code, state.exit_code)
+    incremental.save_state(
+        state_directory,
+        incremental.IncrementalState(commit=commit, manifest=manifest, exit_code=semgrep_return_code, incremental_runs=state.incremental_runs + 1),
+        results_path
+    )
+    return semgrep_return_code, scan_history.INCREMENTAL
+
+def sharded_full_scan():
+    config = get_full_scan_config()
+    shards = _get_shard_plan()
+    if len(shards) < 2:
+        print(f"Running FULL scan. The scan target is too small to split into shards.")
+        return run_command(_get_full_scan_command(), _get_full_scan_env(), config).returncode, scan_history.FULL
+
+    # partial results uploaded by each shard would mark every finding outside that shard as fixed on semgrep.dev,
+    # so shards run with --dry-run and the merged results are only published as the pipeline artifact. that's why
+    # sharding has to be asked for with shard_without_upload
+    print(f"Running SHARDED full scan in {len(shards)} containers, results are not uploaded to semgrep.dev.")
+    for index, shard in enumerate(shards):
+        print(f"  - shard {index}: {shard.files} files, {shard.bytes} bytes in {len(shard.paths)} paths")
+    os.makedirs(os.path.join(config.output_directory, SHARD_DIRECTORY), exist_ok=True)
+    docker_args = ["--memory", f"{config.shard_memory_limit}m"] if config.shard_memory_limit > 0 else []
+
+    def scan_shard(index, shard):
+        command = _get_full_scan_command(f"/output/{SHARD_DIRECTORY}/shard-{index}.json") + ["--dry-run"] + shard.include_args()
+        # shard output only goes to each shard's log, echoing it would interleave the shards
+        return run_command(command, _get_full_scan_env(), config, docker_args, os.path.join(SHARD_DIRECTORY, f"shard-{index}.log"), echo=False)
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        shard_results = list(pool.map(scan_shard, range(len(shards)), shards))
+    for index, result in enumerate(shard_results):
+        if result.timed_out:
+            print(f"Shard {index} was stopped after hitting the {result.timed_out} timeout.")
+
+    results_paths = [os.path.join(config.output_directory, SHARD_DIRECTORY, f"shard-{index}.json") for index in range(len(shards))]
+    missing = [index for index, path in enumerate(results_paths) if not os.path.exists(path)]
+    if missing:
+        print(f"Shards {', '.join(map(str, missing))} wrote no results, see their logs in {SHARD_DIRECTORY}.")
+    count = sharded.merge_results(
+        os.path.join(config.output_directory, RESULTS_FILE),
+        [path for path in results_paths if os.path.exists(path)]
+    )
+    print(f"Merged results of {len(shards) - len(missing)} shards contain {count} findings.")
+    return sharded.combined_exit_code([result.returncode for result in shard_results]), scan_history.SHARDED
+
+def _full_scan_and_record(state_directory, commit, manifest, results_path):
+    semgrep_full_scan_config = get_full_scan_config()
+    semgrep_return_code = run_command(_get_full_scan_command(), _get_full_scan_env(), semgrep_full_scan_config).returncode
+    if commit is not None and _is_successful_scan(semgrep_return_code, results_path):
+        incremental.save_state(
+            state_directory,
+            incremental.IncrementalState(commit=commit, manifest=manifest, exit_code=semgrep_return_code),
+            results_path
         )
-    
-    semgrep_return_code = run_command(docker_command)
     return semgrep_return_code
 
-def _get_full_scan_command():
-    semgrep_command = "semgrep ci --json -o /output/semgrep-results.json"
-    if (semgrep_full_scan_config.jobs != DEFAULT_JOB_COUNT):
-        semgrep_command += f" --jobs {semgrep_full_scan_config.jobs}"
-    if (semgrep_full_scan_config.max_memory != DEFAULT_MAX_MEMORY):
-        semgrep_command += f" --max-memory {semgrep_full_scan_config.max_memory}"
+def _profile_full_scan():
+    config = get_full_scan_config()
+    # sharded results are merged without the shards' timing data, so the shards are profiled together instead
+    shard_results_paths = sorted(glob.glob(os.path.join(config.output_directory, SHARD_DIRECTORY, "shard-*.json")))
+    results_paths = shard_results_paths if _is_sharded() and shard_results_paths else [os.path.join(config.output_directory, RESULTS_FILE)]
+    results_paths = [path for path in results_paths if os.path.exists(path)]
+    if not results_paths:
+        print(f"No scan results to profile.")
+        return
+    scan_profile.profile_scan(
+        results_paths,
+        config.scan_target_path,
+        os.path.join(config.output_directory, scan_profile.PROFILE_FILE),
+        config.profile_ignore_min_seconds,
+        config.profile_ignore_min_bytes
+    )
+
+def _is_successful_scan(semgrep_return_code, results_path):
+    # 0 means no blocking findings and 1 means blocking findings were found, anything else is an error
+    return semgrep_return_code in (0, 1) and os.path.exists(results_path)
+
+def _get_scan_history():
+    config = get_full_scan_config()
+    return scan_history.ScanHistory(config.scan_history_directory) if config.scan_history_directory else None
+
+@functools.cache
+def _get_scan_target_files():
+    return sharded.list_files(get_full_scan_config().scan_target_path)
+
+def _get_scan_target_size():
+    files = _get_scan_target_files()
+    return len(files), sum(files.values())
+
+@functools.cache
+def _get_shard_plan():
+    return sharded.plan_shards(_get_scan_target_files(), get_full_scan_config().shards)
+
+def _is_sharded():
+    config = get_full_scan_config()
+    return not config.incremental and config.shards > 1 and config.shard_without_upload
+
+def _get_container_count():
+    # containers the scan runs at the same time, a sharded scan of a small target runs in one container
+    if not _is_sharded():
+        return 1
+    return max(1, len(_get_shard_plan()))
+
+def _get_scan_cores():
+    return get_full_scan_config().scan_cores or os.cpu_count() or 1
+
+def _get_scan_memory_mb():
+    # the orchestrator gives each scan the memory it reserved for it, other scans may use the whole machine's
+    return get_full_scan_config().scan_memory_mb or scan_history.available_memory_mb()
+
+@functools.cache
+def _get_scan_tuning():
+    """The jobs and max memory this run's containers get: the configured ones, else the ones picked from the scan history."""
+    config = get_full_scan_config()
+    jobs, max_memory = config.jobs, config.max_memory
+    if jobs != DEFAULT_JOB_COUNT and _get_container_count() > 1:
+        # the configured jobs are the whole scan's, split across the shards that run at the same time
+        jobs = max(1, jobs // _get_container_count())
+    if not config.scan_history_directory or (jobs != DEFAULT_JOB_COUNT and max_memory != DEFAULT_MAX_MEMORY):
+        return jobs, max_memory
+
+    history = _get_scan_history()
+    files, bytes = _get_scan_target_size()
+    tuning = scan_history.tune(
+        history.recent(config.repository_id), files, bytes,
+        cores=_get_scan_cores(),
+        memory_mb=_get_scan_memory_mb(),
+        jobs=jobs if jobs != DEFAULT_JOB_COUNT else None,
+        containers=_get_container_count()
+    )
+    history.close()
+    if tuning is None:
+        print(f"No measured scans of {config.repository_name} in the scan history yet, using semgrep's default jobs and max memory.")
+        return jobs, max_memory
+
+    jobs = tuning.jobs if jobs == DEFAULT_JOB_COUNT else jobs
+    max_memory = tuning.max_memory if max_memory == DEFAULT_MAX_MEMORY else max_memory
+    print(f"Scanning {files} files ({bytes} bytes) with {jobs} jobs and {max_memory} MB max memory ({tuning.reason}).")
+    return jobs, max_memory
+
+def _get_full_scan_env():
+    semgrep_full_scan_config = get_full_scan_config()
+    return {
+        "SEMGREP_APP_TOKEN": semgrep_full_scan_config.semgrep_app_token,
+        "SEMGREP_REPO_DISPLAY_NAME": semgrep_full_scan_config.repository_display_Name,
+        "SEMGREP_REPO_URL": semgrep_full_scan_config.repository_web_url,
+    }
+
+def _get_full_scan_command(output_path="/output/semgrep-results.json"):
+    semgrep_full_scan_config = get_full_scan_config()
+    semgrep_command = ["semgrep", "ci", "--json", "-o", output_path]
+    jobs, max_memory = _get_scan_tuning()
+    if (jobs != DEFAULT_JOB_COUNT):
+        semgrep_command += ["--jobs", str(jobs)]
+    if (max_memory != DEFAULT_MAX_MEMORY):
+        semgrep_command += ["--max-memory", str(max_memory)]
     if (semgrep_full_scan_config.debug):
-        semgrep_command += " --debug"
+        semgrep_command.append("--debug")
     if (semgrep_full_scan_config.verbose):
-        semgrep_command += " --verbose"
+        semgrep_command.append("--verbose")
+    if (semgrep_full_scan_config.profile):
+        semgrep_command.append("--time")
 
     all_skus = (semgrep_full_scan_config.semgrep_code
                 and semgrep_full_scan_config.semgrep_secrets
                 and semgrep_full_scan_config.semgrep_supply_chain)
     if not all_skus:
         if semgrep_full_scan_config.semgrep_code:
-            semgrep_command += " --code"
+            semgrep_command.append("--code")
         if semgrep_full_scan_config.semgrep_supply_chain:
-            semgrep_command += " --supply-chain"
+            semgrep_command.append("--supply-chain")
         if semgrep_full_scan_config.semgrep_secrets:
-            semgrep_command += " --secrets"
+            semgrep_command.append("--secrets")
 
-    return semgrep_command
\ No newline at end of file
+    return semgrep_command
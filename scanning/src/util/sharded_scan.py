@@ -0,0 +1,157 @@
+"""
+Planning and merging of sharded full scans, for repositories too large to scan in one semgrep container.
+
+The scan target is split into shards of about equal weight, where a path's weight is its share of the repository's
+files plus its share of the repository's bytes. Top-level entries are the units to shard, any directory heavier than
+one shard's share is split into its children, and the units are bin-packed heaviest first onto the lightest shard.
+Each shard is scanned in its own container, restricted to its paths with --include, and the shards' results are merged
+into one results file with findings de-duplicated by fingerprint.
+"""
+import json
+import os
+import re
+import subprocess
+from dataclasses import dataclass, field
+
+import util.incremental_scan as incremental
+import util.semgrep_results as semgrep_results
+
+# the reason semgrep gives for the files a shard's --include leaves out, which the other shards scan
+INCLUDE_MISMATCH_REASON = "cli_include_flags_do_not_match"
+
+@dataclass
+class Shard:
+    paths: list = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0
+
+    def include_args(self):
+        # patterns starting with a slash are anchored to the root of the scan target
+        args = []
+        for path in sorted(self.paths):
+            args += ["--include", "/" + escape_pattern(path)]
+        return args
+
+def escape_pattern(path):
+    """Escapes the glob characters in `path` so an --include pattern only matches the path itself."""
+    return re.sub(r"([*?[])", r"[\1]", path)
+
+def list_files(scan_target_path):
+    """Returns {relative path: size in bytes} for every file semgrep would look at in the scan target."""
+    try:
+        output = incremental.git(scan_target_path, "ls-files", "--cached", "--others", "--exclude-standard", "-z")
+        paths = [path for path in output.split("\0") if path]
+    except (OSError, subprocess.CalledProcessError):
+        paths = []
+        for root, dirs, files in os.walk(scan_target_path):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            paths += [os.path.relpath(os.path.join(root, name), scan_target_path).replace(os.sep, "/") for name in files]
+
+    sizes = {}
+    for path in paths:
+        file_path = os.path.join(scan_target_path, path)
+        if os.path.isfile(file_path):
+            sizes[path] = os.path.getsize(file_path)
+    return sizes
+
+def plan_shards(files, shard_count):
+    """Splits `files` ({path: size}) into at most `shard_count` shards of about equal weight."""
+    total_files = max(1, len(files))
+    total_bytes = max(1, sum(files.values()))
+
+    # file count and bytes of every directory, and the entries directly inside it
+    stats = {}
+    children = {}
+    for path, size in files.items():
+        parts = path.split("/")
+        for depth in range(1, len(parts) + 1):
+            entry = "/".join(parts[:depth])
+            files_in_entry, bytes_in_entry = stats.get(entry, (0, 0))
+            stats[entry] = (files_in_entry + 1, bytes_in_entry + size)
+            children.setdefault("/".join(parts[:depth - 1]), set()).add(entry)
+
+    def weight(entry):
+        files_in_entry, bytes_in_entry = stats[entry]
+        return files_in_entry / total_files + bytes_in_entry / total_bytes
+
+    # the total weight is 2, split anything heavier than one shard's share that can be split
+    target = 2 / shard_count
+    units = sorted(children.get("", ()))
+    while True:
+        too_heavy = [unit for unit in units if weight(unit) > target and unit in children]
+        if not too_heavy:
+            break
+        for unit in too_heavy:
+            units.remove(unit)
+            units += sorted(children[unit])
+
+    shards = [Shard() for _ in range(shard_count)]
+    for unit in sorted(units, key=weight, reverse=True):
+        shard = min(shards, key=lambda shard: shard.files / total_files + shard.bytes / total_bytes)
+        shard.paths.append(unit)
+        shard.files += stats[unit][0]
+        shard.bytes += stats[unit][1]
+    return [shard for shard in shards if shard.paths]
+
+def merge_results(output_path, shard_results_paths):
+    """
+    Writes the merged results of every shard to `output_path`, findings de-duplicated by fingerprint. `errors` of all
+    shards are kept and `paths.scanned` is combined. `paths.skipped` only keeps the files no shard scanned, once each.
+    Returns the number of findings written.
+    """
+    seen = set()
+    errors = []
+    scanned = set()
+    skipped = []
+    version = None
+    merged_path = output_path + ".tmp"
+
+    with open(merged_path, "w", encoding="utf-8") as out:
+        out.write('{"results": [')
+        count = 0
+        for shard_results_path in shard_results_paths:
+            for result in semgrep_results.iter_results(shard_results_path):
+                key = result.get("extra", {}).get("fingerprint") or json.dumps(result, sort_keys=True)
+                if key in seen:
+                    continue
+                seen.add(key)
+                out.write(("," if count else "") + json.dumps(result))
+                count += 1
+
+            sections = semgrep_results.read_sections(shard_results_path, ("errors", "paths", "version"))
+            errors += sections.get("errors", [])
+            scanned.update(sections.get("paths", {}).get("scanned", []))
+            skipped += sections.get("paths", {}).get("skipped", [])
+            version = version or sections.get("version")
+
+        out.write('], "errors": ' + json.dumps(errors))
+        paths = {"scanned": sorted(scanned)}
+        skipped = skipped_paths(skipped, scanned)
+        if skipped:
+            paths["skipped"] = skipped
+        out.write(', "paths": ' + json.dumps(paths))
+        if version is not None:
+            out.write(', "version": ' + json.dumps(version))
+        out.write("}")
+
+    os.replace(merged_path, output_path)
+    return count
+
+def skipped_paths(skipped, scanned):
+    # every shard skips the files outside its --include, so a file skipped by one shard may have been scanned by
+    # another, and a file no shard scanned is listed by every shard. its own shard's reason is the one that counts
+    by_path = {}
+    for entry in skipped:
+        path = entry.get("path")
+        if path in scanned:
+            continue
+        if path not in by_path or by_path[path].get("reason") == INCLUDE_MISMATCH_REASON:
+            by_path[path] = entry
+    return list(by_path.values())
+
+def combined_exit_code(exit_codes):
+    # any failed shard fails the scan, otherwise blocking findings in any shard block
+    failed = [code for code in exit_codes if code not in (0, 1)]
+    if failed:
+        return failed[0]
+    return max(exit_codes, default=0)